@@ -0,0 +1,80 @@
+"""
+Benchmarks, run against the database in the settings (not a new test database) after
+generating a zoo in it:
+python manage.py generate_zoo
+pytest benchmarks
+
+Whatever a benchmark writes is rolled back
+"""
+
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from zoo_checks.management.commands.generate_zoo import PREFIX, USERNAME
+from zoo_checks.models import Enclosure, User
+
+
+@pytest.fixture(scope="session")
+def django_db_setup():
+    """use the generated zoo in the configured database"""
+
+
+@pytest.fixture
+def zoo_user(db):
+    try:
+        return User.objects.get(username=USERNAME)
+    except User.DoesNotExist:
+        pytest.skip("No generated zoo, run `python manage.py generate_zoo` first")
+
+
+@pytest.fixture
+def zoo_enclosures(zoo_user):
+    """the generated enclosures, the most animals first"""
+    return list(
+        Enclosure.annotate_totals(
+            Enclosure.objects.filter(name__startswith=PREFIX)
+        ).order_by("-active_animals", "name")
+    )
+
+
+@pytest.fixture
+def zoo_client(client, zoo_user):
+    client.force_login(zoo_user)
+    return client
+
+
+@pytest.fixture
+def bench(benchmark):
+    """
+    Benchmarks a function for a number of rounds, rolling back what each round writes,
+    and records the number of queries it runs in the benchmark's extra info
+    Returns what the function returns
+    """
+
+    def _bench(func, *args, rounds=10, **kwargs):
+        savepoints = []
+
+        def setup():
+            savepoints.append(transaction.savepoint())
+
+        def teardown(*args, **kwargs):
+            transaction.savepoint_rollback(savepoints.pop())
+
+        setup()
+        with CaptureQueriesContext(connection) as queries:
+            func(*args, **kwargs)
+        teardown()
+        benchmark.extra_info["queries"] = len(queries)
+
+        return benchmark.pedantic(
+            func,
+            args=args,
+            kwargs=kwargs,
+            setup=setup,
+            teardown=teardown,
+            rounds=rounds,
+            warmup_rounds=1,
+        )
+
+    return _bench
@@ -0,0 +1,39 @@
+import pytest
+from django.utils import timezone
+
+from zoo_checks.export import export_queryset, export_rows
+from zoo_checks.jobs import run_export
+from zoo_checks.models import Job
+
+
+@pytest.mark.parametrize("file_format", ["xlsx", "csv", "parquet"])
+def test_export(bench, zoo_user, zoo_enclosures, file_format):
+    """a year of 10 enclosures"""
+    end_date = timezone.localdate()
+    start_date = end_date - timezone.timedelta(days=365)
+    job = Job.enqueue(
+        zoo_user,
+        Job.EXPORT,
+        enclosures=[enc.id for enc in zoo_enclosures[:10]],
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+        file_format=file_format,
+    )
+
+    bench(run_export, job, rounds=3)
+    assert job.status == Job.DONE
+
+
+def test_export_rows(bench, zoo_enclosures):
+    """the rows of a year of 10 enclosures, as projected and sorted in the database
+    (w/o writing a file)"""
+    end_date = timezone.localdate()
+    start_date = end_date - timezone.timedelta(days=365)
+
+    def read_rows():
+        _, rows = export_rows(
+            export_queryset(zoo_enclosures[:10], start_date, end_date)
+        )
+        return sum(1 for _ in rows)
+
+    assert bench(read_rows, rounds=3) > 0
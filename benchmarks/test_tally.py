@@ -0,0 +1,34 @@
+from django.urls import reverse
+
+from tests.conftest import formsets_post_data
+
+
+def test_home(bench, zoo_client, zoo_enclosures):
+    resp = bench(zoo_client.get, reverse("home"))
+    assert resp.status_code == 200
+
+
+def test_count_get(bench, zoo_client, zoo_enclosures):
+    resp = bench(zoo_client.get, reverse("count", args=[zoo_enclosures[0].slug]))
+    assert resp.status_code == 200
+
+
+def test_count_post(bench, zoo_client, zoo_enclosures):
+    url = reverse("count", args=[zoo_enclosures[0].slug])
+    resp = zoo_client.get(url)
+    formsets = [resp.context[f"{f}_formset"] for f in ("species", "groups", "animals")]
+    data = formsets_post_data(*formsets)
+
+    # every animal, group and species counted
+    for prefix, field, value in (
+        ("animals_formset", "condition", "BA"),
+        ("groups_formset", "count_seen", 1),
+        ("species_formset", "count", 1),
+    ):
+        for i in range(int(data[f"{prefix}-TOTAL_FORMS"])):
+            data[f"{prefix}-{i}-{field}"] = value
+    for i in range(int(data["groups_formset-TOTAL_FORMS"])):
+        data[f"groups_formset-{i}-count_bar"] = 0
+
+    resp = bench(zoo_client.post, url, data)
+    assert resp.status_code == 302
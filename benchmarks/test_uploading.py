@@ -0,0 +1,72 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from zoo_checks.ingest import TRACKS_REQ_COLS, handle_upload, ingest_changesets
+from zoo_checks.models import Animal, Group
+
+
+@pytest.fixture
+def upload_file(zoo_enclosures):
+    """an upload of the animals and groups in 50 enclosures with some changes:
+    every 10th animal's sex and a new animal in each enclosure"""
+    enclosures = zoo_enclosures[:50]
+    rows = []
+    for animal in Animal.objects.filter(enclosure__in=enclosures).select_related(
+        "species", "enclosure"
+    ):
+        rows.append((animal, 1, 0, 0))
+    for group in Group.objects.filter(enclosure__in=enclosures).select_related(
+        "species", "enclosure"
+    ):
+        rows.append(
+            (
+                group,
+                group.population_male,
+                group.population_female,
+                group.population_unknown,
+            )
+        )
+
+    records = []
+    for i, (obj, male, female, unknown) in enumerate(rows):
+        species = obj.species
+        is_animal = isinstance(obj, Animal)
+        records.append(
+            {
+                "Enclosure": obj.enclosure.name,
+                "Accession": obj.accession_number,
+                "Common": species.common_name,
+                "Class": species.class_name,
+                "Order": species.order_name,
+                "Family": species.family_name,
+                "GSS": species.genus_name,
+                "Species": species.species_name,
+                "Sex": ("F" if obj.sex == "M" else "M")
+                if is_animal and i % 10 == 0
+                else (obj.sex if is_animal else None),
+                "Tag /Band": obj.identifier if is_animal else None,
+                "Internal  House  Name": obj.name if is_animal else None,
+                "Population _Male": male,
+                "Population _Female": female,
+                "Population _Unknown": unknown,
+            }
+        )
+    for i, enclosure in enumerate(enclosures):
+        new = dict(records[0], Enclosure=enclosure.name, Accession=f"{600000 + i}")
+        records.append(new)
+
+    f = BytesIO()
+    pd.DataFrame(records, columns=TRACKS_REQ_COLS).to_excel(f, index=False)
+    return f.getvalue()
+
+
+def test_handle_upload(bench, upload_file):
+    changesets = bench(lambda: handle_upload(BytesIO(upload_file)), rounds=3)
+    assert changesets["animals"]
+
+
+def test_ingest_changesets(bench, upload_file):
+    changesets = handle_upload(BytesIO(upload_file))
+    bench(ingest_changesets, changesets, rounds=3)
@@ -2,7 +2,21 @@
 
 set -euo pipefail
 
+# the web workers and job runner share the cache (see CACHES in settings)
+export CACHE_BACKEND="${CACHE_BACKEND:-db}"
+
 python manage.py migrate --noinput
+python manage.py createcachetable
+
+# runs the queued exports and uploads, outside of the web workers
+# restarted whenever it exits (e.g. killed for running out of memory), the job it was
+# running is requeued (see Job.recover_stale)
+(
+    while true; do
+        python manage.py run_jobs || echo "run_jobs exited ($?), restarting" >&2
+        sleep 5
+    done
+) &
 
 exec gunicorn \
     --worker-tmp-dir /dev/shm \
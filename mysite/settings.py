@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 import dj_database_url
 from dotenv import load_dotenv
@@ -34,8 +35,21 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    # the files background jobs make (exports), until they expire
+    # the web process serves the files the job runner writes, so they need to share it
+    # (e.g. an object storage backend when they're on different machines)
+    "exports": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": os.getenv("EXPORT_ROOT", os.path.join(BASE_DIR, "exports"))
+        },
+    },
 }
 
+# exports of up to this many days of enclosures (days x enclosures) are sent in the
+# response, bigger ones are run as background jobs (see the run_jobs command)
+EXPORT_SYNC_MAX_DAYS = int(os.getenv("EXPORT_SYNC_MAX_DAYS", "366"))
+
 # to prevent unneeded migrations (django 3.2)
 # https://docs.djangoproject.com/en/3.2/releases/3.2/#customizing-type-of-auto-created-primary-keys
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
@@ -118,6 +132,8 @@ MIDDLEWARE = [
     # Simplified static file serving.
     # https://warehouse.python.org/project/whitenoise/
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    # after static files, to time all of the app's queries
+    "zoo_checks.middleware.QueryTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -128,6 +144,11 @@ MIDDLEWARE = [
     "allauth.account.middleware.AccountMiddleware",
 ]
 
+# requests slower than this are logged as warnings (see QueryTimingMiddleware)
+QUERY_TIMING_SLOW_MS = float(os.getenv("QUERY_TIMING_SLOW_MS", "1000"))
+# fraction of the other requests that are logged
+QUERY_TIMING_LOG_SAMPLE_RATE = float(os.getenv("QUERY_TIMING_LOG_SAMPLE_RATE", "0.1"))
+
 # add django-debug-toolbar if installed
 try:
     import debug_toolbar  # noqa: F401
@@ -179,6 +200,28 @@ else:
         }
     }
 
+# Caches the home page cards (see zoo_checks/cache.py)
+# Local memory is per process, so deployments with several workers (or a job runner,
+# whose changes drop cached data) should share a "db" (run `createcachetable`) or
+# "file" cache
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "zootable"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.path.join(tempfile.gettempdir(), "zootable_cache"),
+    ),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "zootable_cache"),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")]
+CACHES = {
+    "default": {
+        "BACKEND": _cache_backend,
+        "LOCATION": os.getenv("CACHE_LOCATION", _cache_location),
+        # a card for each enclosure
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -1,3 +1,5 @@
+import tempfile
+
 from .settings import *
 
 # Override STATICFILES_STORAGE setting
@@ -7,6 +9,10 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
     },
+    "exports": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": tempfile.mkdtemp(prefix="zootable_exports_")},
+    },
 }
 
 # faster password hashing for test
@@ -14,3 +20,14 @@ STORAGES = {
 PASSWORD_HASHERS = [
     "django.contrib.auth.hashers.MD5PasswordHasher",
 ]
+
+# don't sample request timings into the logs tests check
+QUERY_TIMING_LOG_SAMPLE_RATE = 0
+
+# each test process has its own cache, cleared between tests (see tests/conftest.py)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
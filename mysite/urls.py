@@ -36,6 +36,26 @@ urlpatterns = [
         views.count,
         name="count",
     ),
+    path(
+        "count/<slug:enclosure_slug>/<int:year>/<int:month>/<int:day>/<kind>/<int:pk>/",
+        views.count_row,
+        name="count_row",
+    ),
+    path(
+        "api/enclosures/<slug:enclosure_slug>/roster/",
+        views.api_roster,
+        name="api_roster",
+    ),
+    path(
+        "api/enclosures/<slug:enclosure_slug>/counts/",
+        views.api_counts,
+        name="api_counts",
+    ),
+    path(
+        "api/enclosures/<slug:enclosure_slug>/counts/<int:year>/<int:month>/<int:day>/",
+        views.api_counts,
+        name="api_counts",
+    ),
     path(
         "tally_date_handler/<slug:enclosure_slug>",
         views.tally_date_handler,
@@ -66,6 +86,8 @@ urlpatterns = [
     path("upload/", views.ingest_form, name="ingest_form"),
     path("confirm_upload/", views.confirm_upload, name="confirm_upload"),
     path("export/", views.export, name="export"),
+    path("jobs/<int:job_id>/", views.job, name="job"),
+    path("jobs/<int:job_id>/download/", views.job_download, name="job_download"),
     # for django browser reload
     path("__reload__/", include("django_browser_reload.urls")),
 ]
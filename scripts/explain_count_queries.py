@@ -0,0 +1,192 @@
+"""Prints EXPLAIN ANALYZE plans and timings for the tally/home page count queries
+(latest count per subject per day), to check they use the count indexes
+
+Optionally seeds a multi-year dataset first. Only run it against a scratch database!
+Callable:
+python scripts/explain_count_queries.py --seed-years 3 --seed-enclosures 20
+"""
+
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+from zoo_checks.helpers import today_time
+from zoo_checks.models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    Group,
+    GroupCount,
+    Species,
+    SpeciesCount,
+)
+
+SEED_PREFIX = "explain"
+
+
+def seed(years, num_enclosures, num_animals=30, num_groups=5, num_species=10):
+    """daily counts of every animal/group/species in each enclosure for N years"""
+    user, _ = get_user_model().objects.get_or_create(username=f"{SEED_PREFIX}-user")
+    species = [
+        Species.objects.get_or_create(
+            common_name=f"{SEED_PREFIX}-species-{s}",
+            defaults={
+                "class_name": "class",
+                "order_name": "order",
+                "family_name": "family",
+                "genus_name": "genus",
+                "species_name": f"species{s}",
+            },
+        )[0]
+        for s in range(num_species)
+    ]
+
+    # accession numbers are 6 characters, seeded ones start with a 9
+    accession = 900000
+    days = [today_time() - timezone.timedelta(days=d) for d in range(years * 365)]
+    for e in range(num_enclosures):
+        enclosure, _ = Enclosure.objects.get_or_create(name=f"{SEED_PREFIX}-enc-{e}")
+        animals, groups = [], []
+        for a in range(num_animals):
+            accession += 1
+            animals.append(
+                Animal.objects.get_or_create(
+                    accession_number=str(accession),
+                    defaults={
+                        "name": f"animal {a}",
+                        "identifier": "",
+                        "species": species[a % num_species],
+                        "enclosure": enclosure,
+                    },
+                )[0]
+            )
+        for g in range(num_groups):
+            accession += 1
+            groups.append(
+                Group.objects.get_or_create(
+                    accession_number=str(accession),
+                    defaults={
+                        "species": species[g % num_species],
+                        "enclosure": enclosure,
+                        "population_male": 2,
+                        "population_female": 2,
+                        "population_unknown": 2,
+                        "population_total": 6,
+                    },
+                )[0]
+            )
+
+        for day in days:
+            # counts happen during the day
+            dt = day + timezone.timedelta(hours=10)
+            common = {
+                "user": user,
+                "enclosure": enclosure,
+                "datetimecounted": dt,
+                "datecounted": day.date(),
+            }
+            AnimalCount.objects.bulk_create(
+                [AnimalCount(animal=a, condition="SE", **common) for a in animals],
+                ignore_conflicts=True,
+            )
+            GroupCount.objects.bulk_create(
+                [
+                    GroupCount(group=g, count_total=6, count_seen=5, **common)
+                    for g in groups
+                ],
+                ignore_conflicts=True,
+            )
+            SpeciesCount.objects.bulk_create(
+                [SpeciesCount(species=s, count=3, **common) for s in species],
+                ignore_conflicts=True,
+            )
+        print(f"Seeded {enclosure} with {len(days)} days of counts")
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def explain(label, func, repeat=5):
+    """times func (best of repeat) and explains every query it runs"""
+    queries = []
+
+    def capture(execute, sql, params, many, context):
+        queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    print(f"=== {label}: {min(timings) * 1000:.2f} ms (best of {repeat})")
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+            print("\n".join(row[0] for row in cursor.fetchall()))
+            print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain the count queries")
+    parser.add_argument(
+        "--enclosure", help="slug of the enclosure to query (default: largest)"
+    )
+    parser.add_argument("--seed-years", type=int, default=0)
+    parser.add_argument("--seed-enclosures", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.seed_years:
+        seed(args.seed_years, args.seed_enclosures)
+
+    if args.enclosure:
+        enclosure = Enclosure.objects.get(slug=args.enclosure)
+    else:
+        enclosure = Enclosure.annotate_totals(Enclosure.objects.all()).latest(
+            "active_animals"
+        )
+
+    animals = list(enclosure.animals.filter(active=True))
+    groups = list(enclosure.groups.filter(active=True))
+    species = list(enclosure.species())
+    print(
+        f"{enclosure}: {len(animals)} animals, {len(groups)} groups, "
+        f"{len(species)} species, {AnimalCount.objects.count()} animal counts in db\n"
+    )
+
+    explain(
+        "AnimalCount.counts_on_day",
+        lambda: list(AnimalCount.counts_on_day(animals)),
+    )
+    explain("GroupCount.counts_on_day", lambda: list(GroupCount.counts_on_day(groups)))
+    explain(
+        "SpeciesCount.counts_on_day",
+        lambda: list(SpeciesCount.counts_on_day(species, enclosure)),
+    )
+    explain("AnimalCount.prior_counts", lambda: AnimalCount.prior_counts(animals))
+    explain("GroupCount.prior_counts", lambda: GroupCount.prior_counts(groups))
+    explain(
+        "SpeciesCount.prior_counts",
+        lambda: SpeciesCount.prior_counts(species, enclosure),
+    )
+    explain(
+        "Enclosure.all_counts",
+        lambda: [list(qs) for qs in Enclosure.all_counts([enclosure])],
+    )
+
+
+if __name__ == "__main__":
+    main()
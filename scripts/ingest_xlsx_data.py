@@ -7,6 +7,7 @@ import argparse
 import os
 
 import django
+from django.db import transaction
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
 django.setup()
@@ -27,12 +28,13 @@ def main():
     args = parser.parse_args()
 
     df = read_xlsx_data(args.csvfile)
-    create_enclosures(df)
-    create_species(df)
+    with transaction.atomic():
+        create_enclosures(df)
+        create_species(df)
 
-    animals, groups = find_animals_groups(df)
-    create_animals(animals)
-    create_groups(groups)
+        animals, groups = find_animals_groups(df)
+        create_animals(animals)
+        create_groups(groups)
 
     print(f"Processed {args.csvfile}")
 
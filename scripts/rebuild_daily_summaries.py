@@ -0,0 +1,38 @@
+"""Rebuilds the enclosure daily summaries (home page cards) from the counts
+e.g. to backfill after migrating, or after editing counts in the admin
+Callable:
+python scripts/rebuild_daily_summaries.py --days 7
+"""
+
+import argparse
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
+django.setup()
+
+from django.utils import timezone
+
+from zoo_checks.helpers import today_time
+from zoo_checks.models import Enclosure, EnclosureDailySummary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild enclosure daily summaries")
+    parser.add_argument(
+        "--days", type=int, default=1, help="number of days to rebuild, incl. today"
+    )
+    args = parser.parse_args()
+
+    enclosures = Enclosure.objects.all()
+    for d in range(args.days):
+        day = today_time() - timezone.timedelta(days=d)
+        for enclosure in enclosures:
+            EnclosureDailySummary.refresh(enclosure, day)
+
+    print(f"Rebuilt {args.days} day(s) of summaries for {len(enclosures)} enclosures")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,25 @@ conftest.py is autodiscovered by pytest
 https://docs.pytest.org/en/stable/fixture.html#conftest-py-sharing-fixture-functions
 """
 
+import difflib
 import random
+import re
 import string
 
 import pytest
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.db import connection
 from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import datetime, localtime, timedelta
 
 from zoo_checks.models import (
     Animal,
     AnimalCount,
     Enclosure,
+    EnclosureDailySummary,
     Group,
     GroupCount,
     Role,
@@ -25,6 +31,13 @@ from zoo_checks.models import (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """cached data doesn't carry over between tests (their database is rolled back)"""
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def rf_get_factory(rf, user_base):
     """request factory factory
@@ -437,3 +450,166 @@ def create_many_counts(
         return a_cts, s_cts, g_cts, enc_list
 
     return _create_many_counts
+
+
+class GrowingZoo:
+    """
+    An enclosure (with an animal, a group and a species counted on the prior days) in
+    a zoo that grows: more enclosures, more animals/groups/species in the enclosure and
+    more days of counts of all of them
+    """
+
+    CONDITIONS = tuple(c for c, _ in AnimalCount.CONDITIONS)
+
+    def __init__(self, user, role):
+        self.user = user
+        self.role = role
+        self.size = 0
+        self.enclosures, self.animals, self.groups, self.species = [], [], [], []
+        self.enclosure = self.add_enclosure()
+        self.grow(1)
+        self.animal, self.group = self.animals[0], self.groups[0]
+
+    def add_enclosure(self):
+        enclosure = Enclosure.objects.create(name=f"zoo_enc_{len(self.enclosures)}")
+        enclosure.roles.add(self.role)
+        self.enclosures.append(enclosure)
+        return enclosure
+
+    def grow(self, n: int):
+        """adds n of everything, and n days of counts of all of it"""
+        for _ in range(n):
+            i = len(self.species)
+            species = Species.objects.create(
+                common_name=f"zoo_common_{i}",
+                class_name="class",
+                order_name="order",
+                family_name="family",
+                genus_name="genus",
+                species_name=f"zoo_species_{i}",
+            )
+            self.species.append(species)
+            enclosure = self.add_enclosure()
+            for enc in (self.enclosure, enclosure):
+                self.animals.append(
+                    Animal.objects.create(
+                        name=f"zoo_animal_{len(self.animals)}",
+                        identifier="",
+                        sex="MF"[i % 2],
+                        accession_number=str(300000 + len(self.animals)),
+                        enclosure=enc,
+                        species=species,
+                    )
+                )
+                self.groups.append(
+                    Group.objects.create(
+                        accession_number=str(400000 + len(self.groups)),
+                        enclosure=enc,
+                        species=species,
+                        population_male=1,
+                        population_female=1,
+                        population_unknown=1,
+                        population_total=3,
+                    )
+                )
+
+        # today and the days before (the prior counts shown when counting)
+        for d in range(self.size, self.size + n):
+            when = localtime() - timedelta(days=d)
+            common = {
+                "user": self.user,
+                "datetimecounted": when,
+                "datecounted": when.date(),
+            }
+            AnimalCount.objects.bulk_create(
+                AnimalCount(
+                    animal=a,
+                    enclosure_id=a.enclosure_id,
+                    condition=self.CONDITIONS[(d + j) % len(self.CONDITIONS)],
+                    **common,
+                )
+                for j, a in enumerate(self.animals)
+            )
+            GroupCount.objects.bulk_create(
+                GroupCount(
+                    group=g,
+                    enclosure_id=g.enclosure_id,
+                    count_total=3,
+                    count_seen=2,
+                    count_not_seen=1,
+                    count_bar=d % 2,
+                    **common,
+                )
+                for g in self.groups
+            )
+            SpeciesCount.objects.bulk_create(
+                SpeciesCount(
+                    species=a.species, enclosure_id=a.enclosure_id, count=d, **common
+                )
+                for a in self.animals
+            )
+        self.size += n
+
+        for enclosure in self.enclosures:
+            EnclosureDailySummary.refresh(enclosure)
+
+
+@pytest.fixture
+def growing_zoo(user_base, role_base):
+    return GrowingZoo(user_base, role_base)
+
+
+def normalize_sql(sql: str) -> str:
+    """the sql without its (id, date, etc.) values, to compare the queries' shapes"""
+    sql = re.sub(r"'[^']*'", "?", sql)
+    sql = re.sub(r"\b\d+(\.\d+)?\b", "?", sql)
+    return re.sub(r"\(\?(, \?)*\)", "(...)", sql)
+
+
+def formsets_post_data(*formsets):
+    """POST data for submitting the formsets as rendered"""
+    data = {}
+    for formset in formsets:
+        for bf in formset.management_form:
+            data[bf.html_name] = bf.value()
+        for form in formset:
+            for bf in form:
+                value = bf.field.prepare_value(bf.value())
+                value = "" if value is None else value
+                data[bf.html_name] = value
+                if bf.field.show_hidden_initial:
+                    data[bf.html_initial_name] = value
+    return data
+
+
+@pytest.fixture
+def assert_constant_queries(growing_zoo):
+    """
+    Checks the number of queries a request (or any function) runs doesn't grow with
+    the size of the zoo, fails with a diff of the (normalized) sql if it does
+    Returns the queries with the larger zoo
+    """
+
+    def _assert_constant_queries(request, grow=9):
+        captured = []
+        for grow_by in (0, grow):
+            if grow_by:
+                growing_zoo.grow(grow_by)
+            # once to fill any caches (e.g. sessions)
+            request()
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            captured.append([normalize_sql(q["sql"]) for q in queries])
+
+        small, large = captured
+        if len(small) != len(large):
+            diff = difflib.unified_diff(
+                small, large, "smaller zoo", "larger zoo", lineterm=""
+            )
+            pytest.fail(
+                f"{len(small)} queries with the smaller zoo, {len(large)} with the "
+                "larger zoo:\n" + "\n".join(diff)
+            )
+        return large
+
+    return _assert_constant_queries
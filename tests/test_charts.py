@@ -0,0 +1,68 @@
+"""test chart data"""
+
+import datetime as dt
+
+from django.utils import timezone
+
+from zoo_checks import charts
+from zoo_checks.models import SpeciesCount
+
+
+def test_line_series(species_count_factory, django_assert_num_queries):
+    now = timezone.localtime()
+    for d, count in enumerate([5, 6, 7]):
+        species_count_factory(count, datetimecounted=now - dt.timedelta(days=d))
+    counts = SpeciesCount.objects.order_by("-datetimecounted")
+
+    with django_assert_num_queries(1):
+        series = charts.line_series(counts, ["datecounted", "count"], limit=2)
+    assert series == {
+        "datecounted": [now.date(), (now - dt.timedelta(days=1)).date()],
+        "count": [5, 6],
+    }
+
+    assert charts.line_series(counts.none(), ["count"]) == {"count": []}
+
+
+def test_histogram(species_count_factory, django_assert_num_queries):
+    now = timezone.localtime()
+    for d, count in enumerate([5, 2, 5, 2, 9]):
+        species_count_factory(count, datetimecounted=now - dt.timedelta(days=d))
+    counts = SpeciesCount.objects.order_by("-datetimecounted")
+
+    with django_assert_num_queries(1):
+        assert charts.histogram(counts, "count") == {2: 2, 5: 2, 9: 1}
+
+    # only the latest
+    with django_assert_num_queries(1):
+        assert charts.histogram(counts, "count", limit=3) == {2: 1, 5: 2}
+
+
+def test_histogram_by_period(species_count_factory, django_assert_num_queries):
+    for day, count in [(1, 5), (15, 5), (28, 2)]:
+        species_count_factory(
+            count, datetimecounted=timezone.make_aware(dt.datetime(2024, 1, day))
+        )
+    species_count_factory(
+        7, datetimecounted=timezone.make_aware(dt.datetime(2024, 3, 2))
+    )
+    species_count_factory(
+        7, datetimecounted=timezone.make_aware(dt.datetime(2023, 12, 31))
+    )
+
+    with django_assert_num_queries(1):
+        histograms = charts.histogram_by_period(
+            SpeciesCount.objects.all(), "count", since=dt.date(2024, 1, 1)
+        )
+    assert histograms == {
+        dt.date(2024, 1, 1): {2: 1, 5: 2},
+        dt.date(2024, 3, 1): {7: 1},
+    }
+
+
+def test_month_starts():
+    assert charts.month_starts(3, dt.date(2024, 2, 10)) == [
+        dt.date(2023, 12, 1),
+        dt.date(2024, 1, 1),
+        dt.date(2024, 2, 1),
+    ]
@@ -0,0 +1,156 @@
+import datetime as dt
+from io import BytesIO
+
+import pyarrow.parquet as pq
+import pytest
+from django.utils import timezone
+from django.utils.timezone import localtime
+from openpyxl import load_workbook
+
+from zoo_checks.export import (
+    COLUMNS,
+    COUNT_COLS,
+    SORT_COLS,
+    SPECIES_COLS,
+    csv_lines,
+    export_queryset,
+    export_rows,
+    write_csv,
+    write_parquet,
+    write_xlsx,
+)
+from zoo_checks.models import AnimalCount, Enclosure, GroupCount, SpeciesCount
+
+
+def expected_rows(enclosures, start_date, end_date):
+    """the export's rows, built from the first count of each subject on each day"""
+    rows = []
+    for model, subject in (
+        (AnimalCount, "animal"),
+        (GroupCount, "group"),
+        (SpeciesCount, "species"),
+    ):
+        counts = model.objects.filter(
+            enclosure__in=enclosures,
+            datecounted__gte=start_date,
+            datecounted__lte=end_date,
+        ).order_by("datetimecounted")
+        first_counts = {}
+        for count in counts:
+            first_counts.setdefault((count.datecounted, getattr(count, subject)), count)
+
+        model_fields = {f.name for f in model._meta.fields}
+        for (day, obj), count in first_counts.items():
+            species = obj if subject == "species" else obj.species
+            row = {
+                "enclosure": count.enclosure.name,
+                "date_counted": day,
+                "time_counted": localtime(count.datetimecounted).strftime("%H:%M:%S"),
+                **{col: getattr(species, col) or "" for col in SPECIES_COLS},
+                "user": count.user.username if count.user else None,
+                **{
+                    col: getattr(count, col) if col in model_fields else None
+                    for col in COUNT_COLS
+                },
+                "accession_number": getattr(obj, "accession_number", ""),
+            }
+            rows.append(tuple(row[col] for col in COLUMNS))
+
+    return rows
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_export_rows(create_many_counts, django_assert_num_queries, chunk_size):
+    create_many_counts(num_enc=3, num_anim=4, num_species=3)
+    enclosures = Enclosure.objects.all()
+    end_date = timezone.localdate()
+    start_date = end_date - timezone.timedelta(days=7)
+
+    expected = expected_rows(enclosures, start_date, end_date)
+
+    # one query, streamed
+    with django_assert_num_queries(1):
+        columns, rows = export_rows(
+            export_queryset(enclosures, start_date, end_date), chunk_size=chunk_size
+        )
+        exported = list(rows)
+
+    assert columns == COLUMNS
+    # in sort order (rows that tie can be in any order)
+    sort_cols = [COLUMNS.index(col) for col in SORT_COLS]
+    sort_values = [tuple(row[i] for i in sort_cols) for row in exported]
+    assert sort_values == sorted(sort_values)
+
+    # the same rows
+    assert sorted(exported, key=repr) == sorted(expected, key=repr)
+
+
+@pytest.mark.django_db
+def test_export_rows_no_counts(enclosure_base):
+    today = timezone.localdate()
+    columns, rows = export_rows(export_queryset([enclosure_base], today, today))
+    assert columns is None
+    assert rows is None
+
+
+def test_write_xlsx():
+    columns = ["enclosure", "date_counted", "count"]
+    rows = [("enc", timezone.localdate(), 3), ("enc", timezone.localdate(), None)]
+
+    f = BytesIO()
+    write_xlsx(columns, iter(rows), f)
+    worksheet = load_workbook(f).active
+
+    values = list(worksheet.values)
+    assert values[0] == tuple(columns)
+    assert [v[0] for v in values[1:]] == ["enc", "enc"]
+    assert [v[2] for v in values[1:]] == [3, None]
+
+
+def test_write_csv():
+    columns = ["enclosure", "comment"]
+    rows = [("enc", "ünïcode")]
+
+    f = BytesIO()
+    write_csv(columns, iter(rows), f)
+    assert not f.closed
+    assert f.getvalue().decode() == "enclosure,comment\r\nenc,ünïcode\r\n"
+
+
+def test_csv_lines():
+    columns = ["enclosure", "date_counted", "comment", "count"]
+    rows = [
+        ("enc", dt.date(2024, 1, 2), "needs, a quote", 3),
+        ("enc", dt.date(2024, 1, 2), "", None),
+    ]
+
+    assert list(csv_lines(columns, iter(rows))) == [
+        "enclosure,date_counted,comment,count\r\n",
+        'enc,2024-01-02,"needs, a quote",3\r\n',
+        "enc,2024-01-02,,\r\n",
+    ]
+
+
+@pytest.mark.django_db
+def test_write_parquet(create_many_counts):
+    create_many_counts(num_enc=2, num_anim=3, num_species=2)
+    enclosures = Enclosure.objects.all()
+    end_date = timezone.localdate()
+    start_date = end_date - timezone.timedelta(days=7)
+
+    columns, rows = export_rows(export_queryset(enclosures, start_date, end_date))
+    rows = list(rows)
+
+    f = BytesIO()
+    write_parquet(columns, iter(rows), f, row_group_size=5)
+    parquet_file = pq.ParquetFile(f)
+
+    assert parquet_file.schema_arrow.names == COLUMNS
+    assert parquet_file.metadata.num_rows == len(rows)
+    assert parquet_file.metadata.num_row_groups == -(len(rows) // -5)
+    table = parquet_file.read()
+    assert list(zip(*(table[c].to_pylist() for c in COLUMNS))) == rows
+
+    with pytest.raises(ValueError, match="Columns don't match"):
+        write_parquet(columns[:-1], iter(rows), BytesIO())
@@ -0,0 +1,32 @@
+import pytest
+from django.core.management import CommandError, call_command
+
+from zoo_checks.models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    EnclosureDailySummary,
+    GroupCount,
+    SpeciesCount,
+)
+
+
+@pytest.mark.django_db
+def test_generate_zoo():
+    options = {"enclosures": 3, "animals": 10, "groups": 2, "species": 4}
+    call_command("generate_zoo", years=7 / 365, batch_size=20, **options)
+
+    assert Enclosure.objects.count() == 3
+    assert Animal.objects.count() == 10
+    # every animal and group counted every day
+    assert AnimalCount.objects.count() == 10 * 7
+    assert GroupCount.objects.count() == 2 * 7
+    assert SpeciesCount.objects.exists()
+    assert EnclosureDailySummary.objects.count() == 3
+
+    # the counts are by the generated user, who can see all the enclosures
+    count = AnimalCount.objects.select_related("user").first()
+    assert set(count.user.roles.get().enclosures.all()) == set(Enclosure.objects.all())
+
+    with pytest.raises(CommandError):
+        call_command("generate_zoo", **options)
@@ -9,8 +9,9 @@ from zoo_checks.ingest import (
     create_groups,
     create_species,
     find_animals_groups,
-    get_animal_attributes,
+    get_animal_set_attributes,
     get_changesets,
+    get_sex_col,
     handle_upload,
     ingest_changesets,
     read_xlsx_data,
@@ -109,7 +110,7 @@ def test_create_animals():
             Animal.objects.get(accession_number=acc_num)
 
 
-def test_get_animal_attributes(enclosure_base, species_base):
+def test_get_animal_set_attributes(enclosure_base, species_base):
     data = {
         "Accession": "211111",
         "Internal  House  Name": "Doug",  # name
@@ -123,16 +124,17 @@ def test_get_animal_attributes(enclosure_base, species_base):
     }
 
     df = pd.DataFrame(data, index=[0])
-    row = df.iloc[0]
-    attributes = get_animal_attributes(row)
+    attributes = get_animal_set_attributes(df).iloc[0]
 
     assert attributes["accession_number"] == "211111"
-    assert attributes["name"] == "Doug"
-    assert attributes["identifier"] == "Yellow"
-    assert attributes["active"] is True
-    assert attributes["sex"] == "M"
-    assert attributes["enclosure"] == enclosure_base
-    assert attributes["species"] == species_base
+    assert attributes["active"]
+    assert attributes["enclosure_id"] == enclosure_base.id
+    assert attributes["species_id"] == species_base.id
+    assert get_sex_col(df).to_list() == ["M"]
+
+    df["Common"] = "not a species"
+    with pytest.raises(Species.DoesNotExist):
+        get_animal_set_attributes(df)
 
 
 def test_find_animals_groups():
@@ -208,6 +210,35 @@ def test_get_changesets():
     assert ["111112"] == gp_add_accession
 
 
+@pytest.mark.django_db
+def test_get_changesets_unchanged(django_assert_num_queries):
+    df = read_xlsx_data(INPUT_EXAMPLE)
+    ingest_changesets(get_changesets(df))
+
+    # the same file again changes nothing
+    with django_assert_num_queries(4):
+        ch_s = get_changesets(df)
+    assert {ch["action"] for ch in ch_s["animals"] + ch_s["groups"]} == {"unchanged"}
+
+    # only the rows that differ are updates
+    df.loc[df["Accession"] == "111111", "Internal  House  Name"] = "new name"
+    df.loc[df["Accession"] == "111112", "Population _Unknown"] += 1
+    Animal.objects.filter(accession_number="111113").update(active=False)
+
+    with django_assert_num_queries(4):
+        ch_s = get_changesets(df)
+    updated = [
+        ch["object_kwargs"]["Accession"]
+        for ch in ch_s["animals"] + ch_s["groups"]
+        if ch["action"] == "update"
+    ]
+    assert sorted(updated) == ["111111", "111112", "111113"]
+
+    ingest_changesets(ch_s)
+    assert Animal.objects.get(accession_number="111111").name == "new name"
+    assert Animal.objects.get(accession_number="111113").active
+
+
 def test_handle_upload(animal_B_enc):
     anim = animal_B_enc("enc1")  # enc in xlsx file
 
@@ -351,3 +382,27 @@ def test_individual_becomes_group():
         if ch_a["action"] == "del"
     ]
     assert accession in del_accession
+
+
+@pytest.mark.django_db
+def test_create_animals_num_queries(django_assert_num_queries):
+    """animals are created/updated with the same number of queries however many rows"""
+    df = read_xlsx_data(INPUT_EXAMPLE)
+    create_enclosures(df)
+    create_species(df)
+    animals, _ = find_animals_groups(df)
+
+    with django_assert_num_queries(7):
+        created_animals = create_animals(animals)
+    assert [a.accession_number for a in created_animals] == list(animals["Accession"])
+    assert all(a.slug == a.accession_number for a in created_animals)
+
+    animals = animals.assign(**{"Internal  House  Name": "new name"})
+    with django_assert_num_queries(6):
+        updated_animals = create_animals(animals)
+    assert updated_animals == created_animals
+    assert Animal.objects.filter(name="new name").count() == len(animals.index)
+
+    # nothing changed, nothing to write
+    with django_assert_num_queries(5):
+        create_animals(animals)
@@ -0,0 +1,130 @@
+import time
+from io import BytesIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from zoo_checks.jobs import JOB_FAILED_MESSAGE, heartbeat, run_next_job
+from zoo_checks.models import Job
+
+
+@pytest.mark.django_db
+def test_claim_next(user_base):
+    assert Job.claim_next() is None
+
+    first = Job.enqueue(user_base, Job.UPLOAD, pending_upload=1)
+    second = Job.enqueue(user_base, Job.UPLOAD, pending_upload=2)
+
+    # oldest first, and only once
+    job = Job.claim_next()
+    assert job == first
+    assert job.status == Job.RUNNING
+    assert job.started is not None
+    assert Job.claim_next() == second
+    assert Job.claim_next() is None
+    assert job.attempts == 1
+
+
+@pytest.mark.django_db
+def test_recover_stale(user_base):
+    job = Job.enqueue(user_base, Job.UPLOAD, pending_upload=1)
+    running = Job.enqueue(user_base, Job.UPLOAD, pending_upload=2)
+    Job.claim_next()
+    Job.claim_next()
+    # the worker running the first job died
+    Job.objects.filter(id=job.id).update(
+        heartbeat=timezone.now() - Job.HEARTBEAT_TIMEOUT - timezone.timedelta(minutes=1)
+    )
+
+    assert Job.recover_stale() == (1, 0)
+    job.refresh_from_db()
+    assert job.status == Job.QUEUED
+    assert job.started is None
+    assert job.heartbeat is None
+    running.refresh_from_db()
+    assert running.status == Job.RUNNING
+
+    # until it's had all its attempts
+    assert Job.claim_next() == job
+    Job.objects.filter(id=job.id).update(
+        heartbeat=timezone.now() - Job.HEARTBEAT_TIMEOUT - timezone.timedelta(minutes=1)
+    )
+    assert Job.recover_stale() == (0, 1)
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert job.attempts == Job.MAX_ATTEMPTS
+    assert job.finished is not None
+
+
+# the heartbeat's updated w/ another connection
+@pytest.mark.django_db(transaction=True)
+def test_heartbeat(user_base, monkeypatch):
+    Job.enqueue(user_base, Job.UPLOAD, pending_upload=1)
+    job = Job.claim_next()
+    claimed = job.heartbeat
+
+    monkeypatch.setattr(Job, "HEARTBEAT_INTERVAL", timezone.timedelta(seconds=0.01))
+    with heartbeat(job):
+        time.sleep(0.1)
+    # a job that's run for longer than the timeout isn't stale while it beats
+    job.refresh_from_db()
+    assert job.heartbeat > claimed
+    Job.objects.filter(id=job.id).update(
+        started=timezone.now() - Job.HEARTBEAT_TIMEOUT - timezone.timedelta(minutes=1)
+    )
+    assert Job.recover_stale() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_run_next_job_fails(user_base, caplog):
+    # the upload doesn't exist (e.g. expired)
+    job = Job.enqueue(user_base, Job.UPLOAD, pending_upload=1)
+    assert run_next_job() == job
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert job.finished is not None
+    assert "expired" in job.message
+
+    # unexpected errors are logged
+    job = Job.enqueue(user_base, Job.EXPORT, enclosures=[], file_format="xlsx")
+    run_next_job()
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert job.message == JOB_FAILED_MESSAGE
+    assert "start_date" not in job.message
+    assert caplog.records[-1].message == "error running export job"
+    assert isinstance(caplog.records[-1].exc_info[1], KeyError)
+
+
+# the worker closes stale connections, like between requests
+@pytest.mark.django_db(transaction=True)
+def test_run_jobs(user_base):
+    jobs = [Job.enqueue(user_base, Job.UPLOAD, pending_upload=i) for i in range(3)]
+
+    call_command("run_jobs", "--once")
+
+    assert not Job.objects.filter(status=Job.QUEUED).exists()
+    assert Job.objects.count() == len(jobs)
+
+
+@pytest.mark.django_db
+def test_purge_expired(user_base):
+    job = Job.enqueue(user_base, Job.UPLOAD, pending_upload=1)
+    job.fail("failed")
+    export = Job.enqueue(user_base, Job.EXPORT)
+    export.finish(result=BytesIO(b"counts"), filename="export.csv")
+    export_name = export.result.name
+    assert export.result.storage.exists(export_name)
+    queued = Job.enqueue(user_base, Job.UPLOAD, pending_upload=2)
+    Job.objects.update(created=timezone.now() - Job.EXPIRY * 2)
+    Job.objects.filter(id__in=[job.id, export.id]).update(
+        finished=timezone.now() - Job.EXPIRY - timezone.timedelta(minutes=1)
+    )
+
+    # finished jobs are purged when the next one is queued, queued ones are kept
+    Job.enqueue(user_base, Job.UPLOAD, pending_upload=3)
+    assert not Job.objects.filter(id__in=[job.id, export.id]).exists()
+    # along with their files
+    assert not export.result.storage.exists(export_name)
+    assert Job.objects.filter(id=queued.id).exists()
@@ -0,0 +1,68 @@
+import logging
+
+import pytest
+from django.urls import reverse
+
+
+@pytest.fixture
+def timing_log(caplog):
+    caplog.set_level(logging.INFO, logger="zootable")
+    return lambda: [
+        r for r in caplog.records if r.name == "zootable.zoo_checks.middleware"
+    ]
+
+
+def test_server_timing(client, user_super, enclosure_base, timing_log):
+    client.force_login(user_super)
+    resp = client.get(reverse("home"))
+
+    db, slowest, app = resp["Server-Timing"].split(", ")
+    assert db.startswith("db;dur=")
+    assert db.endswith(' queries"')
+    assert int(db.split('desc="')[1].split()[0]) > 0
+    # the slowest query
+    assert slowest.startswith("slowest;dur=")
+    db_ms = float(db.split(";")[1].removeprefix("dur="))
+    assert 0 <= float(slowest.removeprefix("slowest;dur=")) <= db_ms
+    assert app.startswith("app;dur=")
+
+    # not slow, not sampled
+    assert timing_log() == []
+
+
+def test_server_timing_not_staff(client, user_base, enclosure_base, settings):
+    # only the total time
+    client.force_login(user_base)
+    (app,) = client.get(reverse("home"))["Server-Timing"].split(", ")
+    assert app.startswith("app;dur=")
+    client.logout()
+    (app,) = client.get(reverse("home"))["Server-Timing"].split(", ")
+    assert app.startswith("app;dur=")
+
+    settings.DEBUG = True
+    client.force_login(user_base)
+    assert client.get(reverse("home"))["Server-Timing"].startswith("db;dur=")
+
+
+def test_query_timing_log(client, user_base, enclosure_base, settings, timing_log):
+    client.force_login(user_base)
+
+    settings.QUERY_TIMING_LOG_SAMPLE_RATE = 1
+    client.get(reverse("count", args=[enclosure_base.slug]))
+    (record,) = timing_log()
+    assert record.levelno == logging.INFO
+    assert record.view == "count"
+    assert record.status_code == 200
+    assert record.queries > 0
+    assert record.db_ms <= record.total_ms
+    assert record.slowest_query_ms <= record.db_ms
+    assert record.slowest_query.startswith("SELECT")
+
+    # slow requests are always logged
+    settings.QUERY_TIMING_LOG_SAMPLE_RATE = 0
+    settings.QUERY_TIMING_SLOW_MS = 0
+    client.get(reverse("home"))
+    record = timing_log()[-1]
+    assert record.levelno == logging.WARNING
+    assert record.message.startswith("slow request GET /")
+    assert record.view == "home"
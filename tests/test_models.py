@@ -1,8 +1,25 @@
 """test models"""
 
+import threading
+
 import pytest
+from django.db import connection, transaction
+from django.utils import timezone
 from django.utils.timezone import localtime
-from zoo_checks.models import Animal, AnimalCount, Enclosure, Group, GroupCount, Species
+
+from zoo_checks.ingest import create_changeset_action
+from zoo_checks.models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    EnclosureDailySummary,
+    EnclosureSpecies,
+    Group,
+    GroupCount,
+    PendingUpload,
+    Species,
+    SpeciesCount,
+)
 
 
 def test_animal_instance(animal_A):
@@ -106,3 +123,253 @@ def test_enclosure_all_counts(create_many_counts, user_base, django_assert_num_q
 
     assert all(c.user == user_base for c in group_counts)
     assert all(c.count_total == 6 for c in group_counts)
+
+
+@pytest.mark.django_db
+def test_prior_counts(create_many_counts, django_assert_num_queries):
+    """prior counts for a whole enclosure are fetched with one query per count type"""
+    num_enc = 2
+    num_anim = 3
+    num_species = 2
+
+    _, _, _, enc_list = create_many_counts(
+        num_enc=num_enc, num_anim=num_anim, num_species=num_species
+    )
+    enc = enc_list[0]
+    animals = list(enc.animals.all())
+    groups = list(enc.groups.all())
+    species = list(Species.objects.filter(group__in=groups))
+
+    with django_assert_num_queries(3):
+        anim_prior = AnimalCount.prior_counts(animals)
+        group_prior = GroupCount.prior_counts(groups)
+        spec_prior = SpeciesCount.prior_counts(species, enc)
+
+    assert set(anim_prior.keys()) == {a.id for a in animals}
+    assert set(group_prior.keys()) == {g.id for g in groups}
+    assert set(spec_prior.keys()) == {s.id for s in species}
+
+    # counts on each of the 3 prior days were created by create_many_counts
+    for conds in anim_prior.values():
+        assert len(conds) == 3
+        assert all(c["count"].condition == "NA" for c in conds)
+    for counts in group_prior.values():
+        assert all(c["count"].needs_attn for c in counts)
+    for counts in spec_prior.values():
+        assert [c["count"] for c in counts] == [100] * 3
+
+    # single object methods give the same results
+    assert animals[0].prior_conditions() == anim_prior[animals[0].id]
+    assert groups[0].prior_counts() == group_prior[groups[0].id]
+    assert species[0].prior_counts(enc) == spec_prior[species[0].id]
+
+
+def test_prior_counts_no_counts(animal_A, species_base, enclosure_base):
+    prior = AnimalCount.prior_counts([animal_A], prior_days=2)
+    assert [c["count"] for c in prior[animal_A.id]] == [None, None]
+
+    prior = SpeciesCount.prior_counts([species_base], enclosure_base, prior_days=2)
+    assert [c["count"] for c in prior[species_base.id]] == [0, 0]
+
+
+def test_enclosure_daily_summary_refresh(
+    enclosure_base, animal_count_A_BAR, group_B_count, django_assert_max_num_queries
+):
+    # the lock, 4 reads and the upsert (incl. its savepoints), regardless of size
+    with django_assert_max_num_queries(11):
+        summary = EnclosureDailySummary.refresh(enclosure_base)
+
+    assert summary.datecounted == localtime().date()
+    assert summary.animals_bar == 1
+    assert summary.animals_observed == 1
+    assert summary.condition_totals()["BAR"] == 1
+    assert summary.groups_seen == group_B_count.count_seen
+    assert summary.groups_bar == group_B_count.count_bar
+    assert summary.groups_needs_attn == 0
+
+    # refreshing again updates the same row
+    EnclosureDailySummary.refresh(enclosure_base)
+    assert EnclosureDailySummary.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_enclosure_daily_summary_concurrent_writers(
+    enclosure_base, animal_factory, user_base
+):
+    """two writers counting (and refreshing) the same enclosure at the same time"""
+    animals = [
+        animal_factory(f"{a}_name", f"{a}_id", "F", f"40000{a}") for a in range(2)
+    ]
+    first_refreshed, first_commit = threading.Event(), threading.Event()
+
+    def write(animal, before_commit=None):
+        try:
+            with transaction.atomic():
+                AnimalCount.objects.create(
+                    animal=animal,
+                    condition=AnimalCount.SEEN,
+                    user=user_base,
+                    enclosure=enclosure_base,
+                )
+                EnclosureDailySummary.refresh(enclosure_base)
+                if before_commit is not None:
+                    before_commit()
+        finally:
+            connection.close()
+
+    def wait_to_commit():
+        first_refreshed.set()
+        first_commit.wait(5)
+
+    first = threading.Thread(target=write, args=(animals[0], wait_to_commit))
+    first.start()
+    first_refreshed.wait(5)
+    # refreshes while the first writer's count isn't committed yet
+    second = threading.Thread(target=write, args=(animals[1],))
+    second.start()
+    second.join(0.5)
+    first_commit.set()
+    first.join()
+    second.join()
+
+    summary = EnclosureDailySummary.objects.get(enclosure=enclosure_base)
+    assert summary.animals_seen == 2
+
+
+def test_enclosure_daily_summary_roster_changes(
+    enclosure_base, enclosure_factory, group_factory, animal_count_A_BAR, group_B_count
+):
+    """counts of animals/groups that are deactivated drop out of today's summary"""
+    EnclosureDailySummary.refresh(enclosure_base)
+    animal = animal_count_A_BAR.animal
+
+    animal.active = False
+    animal.save()
+    summary = EnclosureDailySummary.objects.get(enclosure=enclosure_base)
+    assert summary.animals_observed == 0
+
+    animal.active = True
+    animal.save()
+    summary.refresh_from_db()
+    assert summary.animals_observed == 1
+
+    group_B_count.group.delete()
+    summary.refresh_from_db()
+    assert summary.groups_seen == 0
+
+    # only enclosures w/ a summary are refreshed
+    group = group_factory("654322", 1, 0, 0, 1, enclosure=enclosure_factory("b"))
+    group.active = False
+    group.save()
+    assert EnclosureDailySummary.objects.count() == 1
+
+
+def test_enclosure_species(
+    enclosure_base, enclosure_factory, animal_A, group_B, species_base
+):
+    # kept current as the animals/groups are saved
+    member = EnclosureSpecies.objects.get(enclosure=enclosure_base)
+    assert member.species == species_base
+    assert member.num_animals == 1
+    assert member.num_groups == 1
+    assert list(enclosure_base.species()) == [species_base]
+
+    # moving to another enclosure refreshes both
+    other_enc = enclosure_factory("other_enc")
+    animal_A.enclosure = other_enc
+    animal_A.save()
+    # (updated in place)
+    assert enclosure_base.enclosure_species.get().id == member.id
+    assert enclosure_base.enclosure_species.get().num_animals == 0
+    assert other_enc.enclosure_species.get().num_animals == 1
+
+    group_B.active = False
+    group_B.save()
+    assert list(enclosure_base.species()) == []
+    assert list(other_enc.species()) == [species_base]
+
+    # refreshing them all only changes what's gone
+    EnclosureSpecies.refresh()
+    assert list(EnclosureSpecies.objects.values_list("enclosure", "num_animals")) == [
+        (other_enc.id, 1)
+    ]
+
+    # written in bulk, without the signals
+    Animal.objects.filter(id=animal_A.id).update(enclosure=enclosure_base)
+    EnclosureSpecies.refresh()
+    assert list(enclosure_base.species()) == [species_base]
+    assert list(other_enc.species()) == []
+
+
+def test_update_or_create_from_form_refreshes_summary(
+    enclosure_base, animal_A, group_B, user_base
+):
+    AnimalCount(
+        animal=animal_A, enclosure=enclosure_base, user=user_base, condition="NA"
+    ).update_or_create_from_form()
+
+    summary = EnclosureDailySummary.objects.get(
+        enclosure=enclosure_base, datecounted=localtime().date()
+    )
+    assert summary.animals_attn == 1
+    assert summary.groups_seen == 0
+
+    GroupCount(
+        group=group_B,
+        enclosure=enclosure_base,
+        user=user_base,
+        count_total=6,
+        count_seen=4,
+        count_bar=2,
+        needs_attn=True,
+    ).update_or_create_from_form()
+
+    summary.refresh_from_db()
+    assert summary.animals_attn == 1
+    assert summary.groups_seen == 4
+    assert summary.groups_bar == 2
+    assert summary.groups_needs_attn == 1
+
+
+@pytest.mark.django_db
+def test_pending_upload(user_base):
+    changesets = {
+        "enclosures": ["enc1"],
+        "animals": [
+            create_changeset_action(
+                "add",
+                object_kwargs={"Accession": "111111", "Sex": float("nan")},
+                enclosure="enc1",
+            ),
+            create_changeset_action(
+                "unchanged",
+                object_kwargs={"Accession": "111113", "Sex": "F"},
+                enclosure="enc1",
+            ),
+            create_changeset_action(
+                "del",
+                object_kwargs={"accession_number": "222222", "active": True},
+                enclosure="enc1",
+            ),
+        ],
+        "groups": [],
+    }
+
+    pending_upload = PendingUpload.create_from_changesets(
+        changesets, user_base, "example.xlsx"
+    )
+    # a block per run of changes with the same keys
+    assert len(pending_upload.changes["animals"]) == 2
+
+    pending_upload = PendingUpload.objects.get(id=pending_upload.id)
+    # blank cells come back as None
+    changesets["animals"][0]["object_kwargs"]["Sex"] = None
+    assert pending_upload.changesets == changesets
+
+    # expired uploads are purged when the next one is stored
+    PendingUpload.objects.update(
+        created=timezone.now() - PendingUpload.EXPIRY - timezone.timedelta(minutes=1)
+    )
+    assert not PendingUpload.unexpired().exists()
+    PendingUpload.create_from_changesets(changesets, user_base, "example.xlsx")
+    assert PendingUpload.objects.count() == 1
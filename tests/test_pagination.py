@@ -0,0 +1,74 @@
+"""test keyset pagination"""
+
+import datetime as dt
+
+from django.utils import timezone
+
+from zoo_checks.models import SpeciesCount
+from zoo_checks.pagination import (
+    NEWER,
+    OLDER,
+    KeysetPaginator,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def test_cursor(species_count_factory):
+    count = species_count_factory(5)
+    direction, key = decode_cursor(encode_cursor(NEWER, count))
+    assert direction == NEWER
+    assert key == (count.datetimecounted, count.id)
+
+    # missing or tampered with: the first page
+    for cursor in [None, "", "garbage", encode_cursor("sideways")]:
+        assert decode_cursor(cursor) == (OLDER, None)
+
+
+def test_keyset_paginator(
+    species_count_factory, user_factory, django_assert_num_queries
+):
+    now = timezone.localtime()
+    # counts at the same time (by different users) are ordered by id
+    counts = [
+        species_count_factory(
+            c,
+            user=user_factory(f"user_{c}"),
+            datetimecounted=now - dt.timedelta(days=c // 2),
+        )
+        for c in range(7)
+    ]
+    newest_first = sorted(counts, key=lambda c: (c.datetimecounted, c.id), reverse=True)
+    paginator = KeysetPaginator(SpeciesCount.objects.all(), 3)
+
+    with django_assert_num_queries(1):
+        page = paginator.get_page()
+    assert list(page) == newest_first[:3]
+    assert not page.has_previous()
+
+    pages = [list(page)]
+    while page.has_next():
+        page = paginator.get_page(page.next_cursor)
+        pages.append(list(page))
+    assert pages == [newest_first[:3], newest_first[3:6], newest_first[6:]]
+
+    # back from the last page
+    page = paginator.get_page(page.previous_cursor)
+    assert list(page) == newest_first[3:6]
+
+    # the last page is full
+    page = paginator.get_page(page.last_cursor)
+    assert list(page) == newest_first[-3:]
+    assert not page.has_next()
+    assert page.has_previous()
+
+
+def test_estimated_count(species_count_factory, django_assert_num_queries):
+    species_count_factory(5)
+    paginator = KeysetPaginator(SpeciesCount.objects.all(), 3, estimate_count=True)
+
+    # the page and the estimate
+    with django_assert_num_queries(2):
+        page = paginator.get_page()
+    assert isinstance(page.estimated_count, int)
+    assert not page.has_other_pages()
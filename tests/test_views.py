@@ -1,21 +1,43 @@
 import datetime as dt
+from io import BytesIO
+from itertools import count
 from random import randint
+from urllib.parse import urlencode
 
+import pandas as pd
+import pytest
+from conftest import formsets_post_data
+from django.core.cache import cache as django_cache
 from django.test import SimpleTestCase
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import escape
 from freezegun import freeze_time
 
+from zoo_checks import cache
 from zoo_checks.ingest import TRACKS_REQ_COLS
-from zoo_checks.models import AnimalCount, Enclosure
+from zoo_checks.jobs import run_next_job
+from zoo_checks.models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    EnclosureDailySummary,
+    Group,
+    GroupCount,
+    Job,
+    PendingUpload,
+    SpeciesCount,
+)
 from zoo_checks.views import (
     enclosure_counts_to_dict,
     get_accessible_enclosures,
+    get_enclosure_ids,
     get_selected_role,
     redirect_if_not_permitted,
 )
 
 DST_DATETIME = dt.datetime(2021, 3, 14, 12, 0, 0)
+INPUT_EXAMPLE = "test_data/example.xlsx"
 
 
 def test_home(client, user_base):
@@ -53,6 +75,73 @@ def test_home_counts(client, create_many_counts, user_base):
     assert "Individuals" in resp.content.decode()
 
 
+@pytest.mark.parametrize("num_enc", [1, 6])
+def test_home_num_queries(
+    client, create_many_counts, user_base, num_enc, django_assert_num_queries
+):
+    """the home page costs the same number of queries regardless of the number of
+    enclosures on the page
+    """
+    _, _, _, enc_list = create_many_counts(num_enc=num_enc, num_anim=2, num_species=2)
+    for enc in enc_list:
+        EnclosureDailySummary.refresh(enc)
+    client.force_login(user_base)
+    # the first request keeps the user's enclosure ids in their session
+    client.get(reverse("home"))
+    cache.invalidate_all_cards()
+
+    # session, user, page count, enclosures (w/ totals), summaries, roles
+    with django_assert_num_queries(6):
+        resp = client.get(reverse("home"))
+    assert resp.status_code == 200
+
+    cts_dict = resp.context["cts_dict"]
+    for enc in enc_list:
+        enc_dict = cts_dict[enc]
+        assert enc_dict["total_animals"] == 2
+        assert enc_dict["animal_count_total"] == 2
+        assert enc_dict["total_groups"] == 2 * 30
+
+
+def test_home_cached_cards(
+    client,
+    user_base,
+    enclosure_base,
+    animal_A,
+    animal_factory,
+    animal_count_factory,
+    django_assert_num_queries,
+):
+    client.force_login(user_base)
+    url = reverse("home")
+    resp = client.get(url)
+    card = resp.context["cts_dict"][enclosure_base]
+    assert card["animal_count_total"] == 0
+    assert card["total_animals"] == 1
+
+    # the cached card replaces the summaries query
+    with django_assert_num_queries(5):
+        resp = client.get(url)
+    assert resp.context["cts_dict"][enclosure_base] == card
+
+    # a new animal drops the card
+    animal_factory("C_name", "C_id", "F", "222333")
+    card = client.get(url).context["cts_dict"][enclosure_base]
+    assert card["total_animals"] == 2
+
+    # as does saving a count, which refreshes the summary
+    animal_count_factory("BA")
+    EnclosureDailySummary.refresh(enclosure_base)
+    card = client.get(url).context["cts_dict"][enclosure_base]
+    assert card["animal_count_total"] == 1
+
+    # the totals are of the animals now, not when the summary was refreshed
+    animal_factory("D_name", "D_id", "F", "222444")
+    card = client.get(url).context["cts_dict"][enclosure_base]
+    assert card["animal_count_total"] == 1
+    assert card["total_animals"] == 3
+
+
 def test_count(
     client, user_base, enclosure_base, animal_A, animal_count_A_BAR, group_B
 ):
@@ -81,6 +170,168 @@ def test_count(
     # POST
 
 
+def test_count_post(client, user_base, enclosure_base, animal_A, group_B):
+    client.force_login(user_base)
+    url = f"/count/{enclosure_base.slug}/"
+
+    resp = client.get(url)
+    formsets = [resp.context[f"{f}_formset"] for f in ("species", "groups", "animals")]
+    data = formsets_post_data(*formsets)
+    data["animals_formset-0-condition"] = "BA"
+    data["groups_formset-0-count_seen"] = 2
+
+    resp = client.post(url, data)
+    assert resp.status_code == 302
+
+    # unchanged species form isn't saved
+    assert not SpeciesCount.objects.exists()
+    assert AnimalCount.objects.get(animal=animal_A).condition == "BA"
+    group_count = GroupCount.objects.get(group=group_B)
+    assert group_count.count_seen == 2
+    assert group_count.count_not_seen == 4
+    summary = EnclosureDailySummary.objects.get(enclosure=enclosure_base)
+    assert summary.animals_bar == 1
+    assert summary.groups_seen == 2
+
+    # saving again on the same day updates the user's counts in place
+    data["animals_formset-0-condition"] = "SE"
+    data["groups_formset-0-count_seen"] = 5
+    client.post(url, data)
+
+    assert AnimalCount.objects.get(animal=animal_A).condition == "SE"
+    group_count = GroupCount.objects.get(group=group_B)
+    assert group_count.count_seen == 5
+    assert group_count.count_not_seen == 1
+    summary.refresh_from_db()
+    assert summary.animals_bar == 0
+    assert summary.animals_seen == 1
+
+
+def row_post_data(form):
+    """POST data for saving a single row of the tally page"""
+    data = {"prefix": form.prefix}
+    for bf in form:
+        value = bf.field.prepare_value(bf.value())
+        data[bf.html_name] = "" if value is None else value
+        if bf.field.show_hidden_initial:
+            data[bf.html_initial_name] = data[bf.html_name]
+    return data
+
+
+def test_count_row(client, user_base, enclosure_base, animal_A, group_B):
+    client.force_login(user_base)
+    today = timezone.localdate()
+    day_url = f"/count/{enclosure_base.slug}/{today.year}/{today.month}/{today.day}"
+
+    resp = client.get(f"/count/{enclosure_base.slug}/")
+    animal_form = resp.context["animals_formset"][0]
+    group_form = resp.context["groups_formset"][0]
+
+    # unchanged rows aren't saved
+    resp = client.post(f"{day_url}/animal/{animal_A.pk}/", row_post_data(animal_form))
+    assert resp.status_code == 200
+    assert not AnimalCount.objects.exists()
+
+    data = row_post_data(animal_form)
+    data[f"{animal_form.prefix}-condition"] = "BA"
+    resp = client.post(f"{day_url}/animal/{animal_A.pk}/", data)
+    assert resp.status_code == 200
+    assert AnimalCount.objects.get(animal=animal_A).condition == "BA"
+    # only the other rows aren't saved
+    assert not GroupCount.objects.exists()
+    assert EnclosureDailySummary.objects.get(enclosure=enclosure_base).animals_bar == 1
+    # responds with the saved row, to swap in
+    content = resp.content.decode()
+    assert content.lstrip().startswith("<tr")
+    assert f'data-row-url="{day_url}/animal/{animal_A.pk}/"' in content
+    assert f'data-row-prefix="{animal_form.prefix}"' in content
+    assert resp.context["form"].initial["condition"] == "BA"
+
+    # invalid rows are rendered with their errors
+    data = row_post_data(group_form)
+    data[f"{group_form.prefix}-count_seen"] = 1
+    data[f"{group_form.prefix}-count_bar"] = 3
+    resp = client.post(f"{day_url}/group/{group_B.pk}/", data)
+    assert resp.status_code == 422
+    assert resp.context["form"].errors
+    assert not GroupCount.objects.exists()
+
+
+def test_count_row_rejected(
+    client,
+    user_base,
+    user_factory,
+    enclosure_base,
+    animal_A,
+    animal_B_enc,
+    animal_factory,
+):
+    client.force_login(user_base)
+    today = timezone.localdate()
+    day_url = f"/count/{enclosure_base.slug}/{today.year}/{today.month}/{today.day}"
+
+    resp = client.get(f"/count/{enclosure_base.slug}/")
+    animal_form = resp.context["animals_formset"][0]
+    data = row_post_data(animal_form)
+    data[f"{animal_form.prefix}-condition"] = "BA"
+    url = f"{day_url}/animal/{animal_A.pk}/"
+
+    assert client.get(url).status_code == 405
+    assert client.post(url, {**data, "prefix": "groups_formset-0"}).status_code == 400
+    assert client.post(f"{day_url}/cat/{animal_A.pk}/", data).status_code == 404
+
+    # rows are of the enclosure's animals/groups
+    animal_B = animal_B_enc("other_enclosure")
+    assert client.post(f"{day_url}/animal/{animal_B.pk}/", data).status_code == 404
+    # and only of the row's animal, in the enclosure
+    animal_C = animal_factory("C_name", "C_id", "F", "777888")
+    resp = client.post(f"{day_url}/animal/{animal_C.pk}/", data)
+    assert resp.status_code == 422
+    assert "animal" in resp.context["form"].errors
+    foreign = {**data, f"{animal_form.prefix}-animal": animal_B.pk}
+    resp = client.post(url, foreign)
+    assert resp.status_code == 422
+    assert "animal" in resp.context["form"].errors
+    foreign = {**data, f"{animal_form.prefix}-enclosure": animal_B.enclosure.pk}
+    resp = client.post(url, foreign)
+    assert resp.status_code == 422
+    assert "enclosure" in resp.context["form"].errors
+
+    client.force_login(user_factory("no_roles"))
+    assert client.post(url, data).status_code == 403
+
+    assert not AnimalCount.objects.exists()
+
+
+@pytest.mark.parametrize("num_species", [1, 4])
+def test_count_num_queries(
+    client, create_many_counts, user_base, num_species, django_assert_num_queries
+):
+    """rendering the tally page costs the same number of queries regardless of the
+    number of species/animals/groups in the enclosure
+    """
+    _, _, _, enc_list = create_many_counts(
+        num_enc=1, num_anim=num_species, num_species=num_species
+    )
+    enclosure = enc_list[0]
+    client.force_login(user_base)
+    # the first request keeps the user's enclosure ids in their session
+    client.get(f"/count/{enclosure.slug}/")
+
+    with django_assert_num_queries(12):
+        resp = client.get(f"/count/{enclosure.slug}/")
+    assert resp.status_code == 200
+
+    # every row is paired with the form for that animal/group
+    for spec_dict in resp.context["formset_order"].values():
+        for group_dict in spec_dict["group_forms"]:
+            assert group_dict["form"].initial["group"] == group_dict["group"]
+            assert group_dict["group"].species == spec_dict["species"]
+        for anim_dict in spec_dict["animals_form_dict_list"]:
+            assert anim_dict["form"].initial["animal"] == anim_dict["animal"]
+            assert anim_dict["animal"].species == spec_dict["species"]
+
+
 def test_count_todays_date(
     client, user_base, enclosure_base, animal_A, animal_count_A_BAR, group_B
 ):
@@ -403,20 +654,61 @@ def test_animal_counts(
     assert resp.context["animal"] == animal_A
     assert resp.context["enclosure"] == enclosure_base
     assert list(resp.context["animal_counts"]) == counts[:10]
-    assert resp.context["page_range"][0] == 1
-    assert resp.context["page_range"][-1] == 1 + 5
-    # chart_data
-    # chart_labels
+    assert not resp.context["animal_counts"].has_previous()
+    assert resp.context["animal_counts"].has_next()
+
+    # charts, all BAR
+    assert resp.context["chart_labels"] == [c[1] for c in AnimalCount.CONDITIONS]
+    assert resp.context["chart_data"] == [num_counts, 0, 0, 0, 0]
+    assert len(resp.context["chart_labels_month"]) == 12
+    assert resp.context["chart_labels_month"][-1] == timezone.localdate().strftime(
+        "%b %Y"
+    )
+    month_data = dict(resp.context["chart_data_month"])
+    assert sum(month_data["BAR"]) == num_counts
+    assert sum(month_data["Seen"]) == 0
 
-    # test pagination
-    url = "{}{}".format(
-        reverse("animal_counts", args=[animal_A.accession_number]), f"?page={2}"
+    # the conditions chart can be limited to a range
+    start_date = timezone.localdate() - dt.timedelta(days=9)
+    resp = client.get(url, {"start_date": start_date.strftime("%m/%d/%Y")})
+    assert resp.context["chart_data"] == [10, 0, 0, 0, 0]
+    month_data = dict(resp.context["chart_data_month"])
+    assert sum(month_data["BAR"]) == num_counts
+
+    resp = client.get(
+        url,
+        {
+            "start_date": start_date.strftime("%m/%d/%Y"),
+            "end_date": (start_date - dt.timedelta(days=1)).strftime("%m/%d/%Y"),
+        },
     )
+    assert not resp.context["range_form"].is_valid()
+    assert resp.context["chart_data"] == [num_counts, 0, 0, 0, 0]
+
+    # test pagination
     resp = client.get(url)
+    page = resp.context["animal_counts"]
+    resp = client.get(url, {"cursor": page.next_cursor})
     assert resp.status_code == 200
-    assert list(resp.context["animal_counts"]) == counts[10:20]
-    assert resp.context["page_range"][0] == 1
-    assert resp.context["page_range"][-1] == 2 + 5
+    page = resp.context["animal_counts"]
+    assert list(page) == counts[10:20]
+    assert page.has_previous()
+    assert page.has_next()
+
+    resp = client.get(url, {"cursor": page.last_cursor})
+    assert list(resp.context["animal_counts"]) == counts[-10:]
+    assert not resp.context["animal_counts"].has_next()
+
+    # the pager keeps the chart's date range
+    start = start_date.strftime("%m/%d/%Y")
+    resp = client.get(url, {"start_date": start, "cursor": page.next_cursor})
+    page = resp.context["animal_counts"]
+    assert page.estimated_count is None
+    html = resp.content.decode()
+    next_query = urlencode({"start_date": start, "cursor": page.next_cursor})
+    assert f'href="?{escape(next_query)}"' in html
+    # the first page
+    assert f'href="?{urlencode({"start_date": start})}"' in html
 
 
 def test_group_counts(
@@ -455,18 +747,28 @@ def test_group_counts(
     assert resp.context["group"] == group_B
     assert resp.context["enclosure"] == enclosure_base
     assert list(resp.context["counts"]) == counts[:10]
-    assert resp.context["page_range"][0] == 1
-    assert resp.context["page_range"][-1] == 1 + 5
+    assert not resp.context["counts"].has_previous()
+    assert resp.context["counts"].has_next()
 
-    # test pagination
-    url = "{}{}".format(
-        reverse("group_counts", args=[group_B.accession_number]), f"?page={2}"
+    # charts of the last 100, newest first
+    assert resp.context["chart_labels_line"][0] == counts[0].datecounted.strftime(
+        "%m-%d-%Y"
     )
-    resp = client.get(url)
+    assert resp.context["chart_data_line_total"] == [6] * 100
+    assert resp.context["chart_data_line_seen"] == [3] * 100
+    assert resp.context["chart_data_line_bar"] == [1] * 100
+    assert resp.context["chart_labels_pie"] == [3]
+    assert resp.context["chart_data_pie"] == [100]
+
+    # test pagination
+    resp = client.get(url, {"cursor": resp.context["counts"].next_cursor})
     assert resp.status_code == 200
     assert list(resp.context["counts"]) == counts[10:20]
-    assert resp.context["page_range"][0] == 1
-    assert resp.context["page_range"][-1] == 2 + 5
+
+    # and back
+    resp = client.get(url, {"cursor": resp.context["counts"].previous_cursor})
+    assert list(resp.context["counts"]) == counts[:10]
+    assert not resp.context["counts"].has_previous()
 
 
 def test_species_counts(
@@ -504,12 +806,15 @@ def test_species_counts(
     assert resp.context["obj"] == species_base
     assert resp.context["enclosure"] == enclosure_base
     assert list(resp.context["counts"]) == counts[:10]
-    assert resp.context["page_range"][0] == 1
-    assert resp.context["page_range"][-1] == 3
-    # "chart_data_line_total"
-    # "chart_labels_line"
-    # "chart_data_pie"
-    # "chart_labels_pie"
+    assert resp.context["counts"].has_next()
+
+    # charts of the last 100, oldest first
+    assert resp.context["chart_labels_line"] == [
+        c.datecounted.strftime("%m-%d-%Y") for c in reversed(counts)
+    ]
+    assert resp.context["chart_data_line_total"] == [50] * num_counts
+    assert resp.context["chart_labels_pie"] == [50]
+    assert resp.context["chart_data_pie"] == [num_counts]
 
 
 def test_ingest_form(client, user_base, user_super):
@@ -525,23 +830,70 @@ def test_ingest_form(client, user_base, user_super):
     assert resp.status_code == 200
     assert resp.context["req_cols"] == TRACKS_REQ_COLS
 
-    # todo: test session data manipulation (changesets/upload_file)
+    # POST: the changesets are stored server side, only their id in the session
+    with open(INPUT_EXAMPLE, "rb") as f:
+        resp = client.post(url, {"file": f})
+    SimpleTestCase().assertRedirects(resp, reverse("confirm_upload"))
 
-    # TODO: POST
+    pending_upload = PendingUpload.objects.get(user=user_super)
+    assert pending_upload.upload_file == "example.xlsx"
+    assert client.session["pending_upload"] == pending_upload.id
+    assert "changesets" not in client.session
 
+    # starting over forgets the upload
+    client.get(url)
+    assert "pending_upload" not in client.session
 
-def test_confirm_upload():
-    # /confirm_upload
 
-    # changesets and upload_file in session
+def test_confirm_upload(client, user_super):
+    url = reverse("confirm_upload")
+    client.force_login(user_super)
 
-    # test GET
+    # nothing uploaded
+    resp = client.get(url)
+    SimpleTestCase().assertRedirects(resp, reverse("ingest_form"))
 
-    # test POST (writes changes to db)
-    pass
+    with open(INPUT_EXAMPLE, "rb") as f:
+        client.post(reverse("ingest_form"), {"file": f})
+
+    # test GET
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.context["upload_file"] == "example.xlsx"
+    assert len(resp.context["changesets"]["animals"]) == 4
+    assert len(resp.context["changesets"]["groups"]) == 1
+
+    # test POST (queues the changes to write to the db)
+    resp = client.post(url)
+    job = Job.objects.get()
+    SimpleTestCase().assertRedirects(resp, reverse("job", args=[job.id]))
+    assert job.kind == Job.UPLOAD
+    assert "pending_upload" not in client.session
+    assert not Animal.objects.exists()
+
+    # a worker writes them
+    assert run_next_job() == job
+    job.refresh_from_db()
+    assert job.status == Job.DONE
+    assert "Saved" in client.get(reverse("job", args=[job.id])).content.decode()
+    assert Animal.objects.count() == 4
+    assert Group.objects.count() == 1
+    assert not PendingUpload.objects.exists()
+    assert "pending_upload" not in client.session
+
+    # an expired upload has to be uploaded again
+    with open(INPUT_EXAMPLE, "rb") as f:
+        client.post(reverse("ingest_form"), {"file": f})
+    PendingUpload.objects.update(
+        created=timezone.now() - PendingUpload.EXPIRY - timezone.timedelta(minutes=1)
+    )
+    resp = client.get(url)
+    SimpleTestCase().assertRedirects(resp, reverse("ingest_form"))
 
 
-def test_export(client, user_base, enclosure_base, user_factory, caplog):
+def test_export(
+    client, user_base, enclosure_base, animal_A, user_factory, caplog, settings
+):
     # GET
 
     # user w/ no enclosures empty list of enclosures
@@ -566,18 +918,36 @@ def test_export(client, user_base, enclosure_base, user_factory, caplog):
     # still with user_base logged in
     yesterday = dt.date.today() - dt.timedelta(days=1)
 
+    def post_export(file_format="xlsx"):
+        return client.post(
+            "/export/",
+            {
+                "start_date": yesterday.strftime("%m/%d/%Y"),
+                "end_date": dt.date.today().strftime("%m/%d/%Y"),
+                "selected_enclosures": enclosure_base.id,
+                "file_format": file_format,
+            },
+        )
+
+    def export_job(file_format="xlsx"):
+        """posts the export form, runs the export job and returns it"""
+        resp = post_export(file_format)
+        job = Job.objects.latest("created")
+        SimpleTestCase().assertRedirects(resp, reverse("job", args=[job.id]))
+        assert job.kind == Job.EXPORT
+        assert job.status == Job.QUEUED
+
+        assert run_next_job() == job
+        job.refresh_from_db()
+        return job
+
     caplog.clear()
     # w/ no counts
-    resp = client.post(
-        "/export/",
-        {
-            "start_date": yesterday.strftime("%m/%d/%Y"),
-            "end_date": dt.date.today().strftime("%m/%d/%Y"),
-            "selected_enclosures": enclosure_base.id,
-        },
-    )
+    resp = post_export()
     assert resp.status_code == 200
-    record = caplog.records[0]
+    assert "No data in range" in resp.content.decode()
+    assert not Job.objects.exists()
+    record = caplog.records[-1]
 
     assert record.message == "no data to export for enclosures"
     assert record.enclosures[0]["name"] == enclosure_base.name
@@ -585,14 +955,82 @@ def test_export(client, user_base, enclosure_base, user_factory, caplog):
     assert record.end_date == dt.date.today().strftime("%m/%d/%Y")
 
     # create some counts
-    # assert 201 status code
+    animal_count_A_BAR = AnimalCount.objects.create(
+        animal=animal_A, enclosure=enclosure_base, user=user_base, condition="BA"
+    )
+
+    # small exports are sent in the response
+    resp = post_export()
+    assert resp.status_code == 200
+    assert resp["Content-Disposition"].startswith(
+        'attachment; filename="zootable_export_base_enc_'
+    )
+
     # load in excel data, convert to dataframe and check the counts
+    df = pd.read_excel(BytesIO(b"".join(resp.streaming_content)))
+    assert len(df.index) == 1
+    assert df.loc[0, "enclosure"] == enclosure_base.name
+    assert df.loc[0, "accession_number"] == int(animal_A.accession_number)
+    assert df.loc[0, "condition"] == animal_count_A_BAR.condition
+
+    # csv
+    resp = post_export("csv")
+    assert resp["Content-Type"] == "text/csv"
+    assert resp["Content-Disposition"].endswith('.csv"')
+    df_csv = pd.read_csv(BytesIO(b"".join(resp.streaming_content)))
+    assert df_csv.loc[0, "enclosure"] == enclosure_base.name
+    assert df_csv.loc[0, "accession_number"] == int(animal_A.accession_number)
+    assert df_csv.loc[0, "condition"] == animal_count_A_BAR.condition
+
+    # parquet
+    resp = post_export("parquet")
+    assert resp["Content-Disposition"].endswith('.parquet"')
+    df_parquet = pd.read_parquet(BytesIO(b"".join(resp.streaming_content)))
+    assert df_parquet.loc[0, "enclosure"] == enclosure_base.name
+    assert df_parquet.loc[0, "accession_number"] == animal_A.accession_number
+    assert df_parquet.loc[0, "condition"] == animal_count_A_BAR.condition
+    assert not Job.objects.exists()
+
+    # bigger ones are written by a job
+    settings.EXPORT_SYNC_MAX_DAYS = 1
+    job = export_job()
+    assert job.status == Job.DONE
+    assert job.filename.startswith("zootable_export_base_enc_")
+
+    resp = client.get(reverse("job", args=[job.id]))
+    assert reverse("job_download", args=[job.id]) in resp.content.decode()
+
+    resp = client.get(reverse("job_download", args=[job.id]))
+    assert resp.status_code == 200
+    assert resp["Content-Disposition"].startswith(
+        'attachment; filename="zootable_export_base_enc_'
+    )
+    assert pd.read_excel(BytesIO(b"".join(resp.streaming_content))).equals(df)
+
+    job = export_job("csv")
+    resp = client.get(reverse("job_download", args=[job.id]))
+    assert resp["Content-Type"] == "text/csv"
+    assert pd.read_csv(BytesIO(b"".join(resp.streaming_content))).equals(df_csv)
+
+    AnimalCount.objects.all().delete()
+    job = export_job()
+    assert job.status == Job.FAILED
+    assert job.message == "No data in range"
+    resp = client.get(reverse("job", args=[job.id]))
+    assert "No data in range" in resp.content.decode()
+    resp = client.get(reverse("job_download", args=[job.id]))
+    assert resp.status_code == 404
+
+    # other users can't see the export
+    client.force_login(rando_user)
+    assert client.get(reverse("job", args=[job.id])).status_code == 404
+    assert client.get(reverse("job_download", args=[job.id])).status_code == 404
 
 
 def test_get_accessible_enclosures(
-    user_base, enclosure_base, enclosure_factory, user_super
+    rf_get_factory, user_base, enclosure_base, enclosure_factory, user_super
 ):
-    enclosures = get_accessible_enclosures(user_base)
+    enclosures = get_accessible_enclosures(rf_get_factory("/", user_base))
     assert list(enclosures) == [enclosure_base]
 
     # create a bunch of enclosures, but don't assign to role
@@ -601,14 +1039,64 @@ def test_get_accessible_enclosures(
         enc_set.add(enclosure_factory(str(i), role=None))
 
     # super user should get all the enclosures
-    enclosures_super = get_accessible_enclosures(user_super)
+    enclosures_super = get_accessible_enclosures(rf_get_factory("/", user_super))
     assert set(enclosures_super) == enc_set
 
     # regular user should still have the same single enclosure
-    enclosures = get_accessible_enclosures(user_base)
+    enclosures = get_accessible_enclosures(rf_get_factory("/", user_base))
     assert list(enclosures) == [enclosure_base]
 
 
+def test_get_enclosure_ids(
+    rf_get_factory,
+    user_base,
+    role_base,
+    enclosure_base,
+    enclosure_factory,
+    django_assert_num_queries,
+):
+    session = rf_get_factory("/").session
+
+    def new_request():
+        """another request of the same user's session"""
+        request = rf_get_factory("/")
+        request.session = session
+        return request
+
+    request = new_request()
+    assert get_enclosure_ids(request) == {enclosure_base.id}
+    # memoized for the rest of the request
+    with django_assert_num_queries(0):
+        assert get_enclosure_ids(request) == {enclosure_base.id}
+    # and kept in the session for the next ones
+    request = new_request()
+    with django_assert_num_queries(0):
+        assert get_enclosure_ids(request) == {enclosure_base.id}
+    assert session[cache.ENCLOSURE_IDS_SESSION_KEY]["ids"] == [enclosure_base.id]
+
+    # changing a role's enclosures or users drops the kept ids
+    enc = enclosure_factory("new_enc")
+    assert get_enclosure_ids(new_request()) == {enclosure_base.id, enc.id}
+
+    role_base.enclosures.remove(enclosure_base)
+    assert get_enclosure_ids(new_request()) == {enc.id}
+
+    role_base.users.clear()
+    assert get_enclosure_ids(new_request()) == set()
+
+    role_base.users.add(user_base)
+    assert get_enclosure_ids(new_request()) == {enc.id}
+
+    # as does the roles' version being evicted from the cache
+    django_cache.delete(cache.PERMISSIONS_VERSION_KEY)
+    request = new_request()
+    with django_assert_num_queries(1):
+        assert get_enclosure_ids(request) == {enc.id}
+
+    role_base.delete()
+    assert get_enclosure_ids(new_request()) == set()
+
+
 def test_redirect_if_not_permitted(
     rf_get_factory, enclosure_factory, enclosure_base, user_super
 ):
@@ -668,7 +1156,7 @@ def test_selected_role(rf_get_factory, role_base):
 
 def test_enclosure_counts_to_dict(create_many_counts, django_assert_num_queries):
     """
-    Tests the dictionary creation from list of counts
+    Tests the dictionary creation from the enclosure daily summaries
     Tests the structure of the dict
     """
     num_enc = 7
@@ -680,17 +1168,20 @@ def test_enclosure_counts_to_dict(create_many_counts, django_assert_num_queries)
         num_anim=num_anim,
         num_species=num_species,
     )
+    # counts from the factories don't go through update_or_create_from_form
+    for enc in enc_list:
+        EnclosureDailySummary.refresh(enc)
 
     # create a query similar to how we build it in the view
-    encl_q = Enclosure.objects.filter(name__in=enc_list).prefetch_related(
-        "animals", "groups"
-    )
-    with django_assert_num_queries(5):
-        # 3 for enclosures, groups, animals (w/ prefetch related)
-        # 2 for animal_counts and group_counts
+    encl_q = Enclosure.annotate_totals(Enclosure.objects.filter(name__in=enc_list))
+    with django_assert_num_queries(2):
+        # 1 for enclosures (w/ their totals annotated)
+        # 1 for the summaries
 
-        animal_counts, group_counts = Enclosure.all_counts(encl_q)
-        all_counts_dict = enclosure_counts_to_dict(encl_q, animal_counts, group_counts)
+        summaries = EnclosureDailySummary.objects.filter(
+            enclosure__in=encl_q, datecounted=timezone.localdate()
+        )
+        all_counts_dict = enclosure_counts_to_dict(encl_q, summaries)
 
     # assert dict keys present in original query
     assert list(encl_q) == list(all_counts_dict.keys())
@@ -721,15 +1212,311 @@ def test_enclosure_counts_to_dict(create_many_counts, django_assert_num_queries)
         assert list(enc_dict["animal_conditions"].keys()) == [
             c[1] for c in AnimalCount.CONDITIONS
         ]
-        assert all(
-            [
-                all([isinstance(c, AnimalCount) for c in c_l])
-                for c_l in enc_dict["animal_conditions"].values()
-            ]
-        )
+        # all the animal counts today are BAR
+        assert enc_dict["animal_conditions"]["BAR"] == num_anim
+        assert sum(enc_dict["animal_conditions"].values()) == num_anim
 
         assert list(enc_dict["group_counts"].keys()) == ["Seen", "BAR", "Needs Attn"]
         # These values come from the factory inputs to create group_counts
         assert enc_dict["group_counts"]["Seen"] == num_groups
         assert enc_dict["group_counts"]["BAR"] == num_groups * 3
         assert enc_dict["group_counts"]["Needs Attn"] == 0
+
+
+def test_enclosure_counts_to_dict_not_counted(enclosure_base, animal_A, group_B):
+    """enclosures w/o a summary today haven't been counted"""
+    encl_q = Enclosure.annotate_totals(Enclosure.objects.filter(id=enclosure_base.id))
+    all_counts_dict = enclosure_counts_to_dict(encl_q, [])
+
+    enc_dict = all_counts_dict[enclosure_base]
+    assert enc_dict["animal_count_total"] == 0
+    assert enc_dict["group_count_total"] == 0
+    assert enc_dict["total_animals"] == 1
+    assert enc_dict["total_groups"] == group_B.population_total
+    assert set(enc_dict["animal_conditions"].values()) == {0}
+
+
+# the number of queries each view runs doesn't grow with the amount of data
+# (see assert_constant_queries)
+
+
+def test_home_queries(client, user_base, assert_constant_queries):
+    client.force_login(user_base)
+    assert_constant_queries(lambda: client.get(reverse("home")))
+
+
+def test_count_queries(client, user_base, growing_zoo, assert_constant_queries):
+    client.force_login(user_base)
+    url = reverse("count", args=[growing_zoo.enclosure.slug])
+    assert_constant_queries(lambda: client.get(url))
+
+
+def test_count_post_queries(client, user_base, growing_zoo, assert_constant_queries):
+    client.force_login(user_base)
+    url = reverse("count", args=[growing_zoo.enclosure.slug])
+    submits = count(1)
+
+    def submit():
+        """the tally page, submitted w/ every row changed"""
+        resp = client.get(url)
+        data = formsets_post_data(
+            *[resp.context[f"{f}_formset"] for f in ("species", "groups", "animals")]
+        )
+        n = next(submits)
+        for name in data:
+            if name.endswith("-comment"):
+                data[name] = f"submit {n}"
+            elif name.startswith("species_formset-") and name.endswith("-count"):
+                data[name] = n
+        resp = client.post(url, data)
+        assert resp.status_code == 302
+        return resp
+
+    assert_constant_queries(submit)
+
+
+def test_animal_counts_queries(client, user_base, growing_zoo, assert_constant_queries):
+    client.force_login(user_base)
+    url = reverse("animal_counts", args=[growing_zoo.animal.accession_number])
+    assert_constant_queries(lambda: client.get(url))
+
+
+def test_group_counts_queries(client, user_base, growing_zoo, assert_constant_queries):
+    client.force_login(user_base)
+    url = reverse("group_counts", args=[growing_zoo.group.accession_number])
+    assert_constant_queries(lambda: client.get(url))
+
+
+def test_species_counts_queries(
+    client, user_base, growing_zoo, assert_constant_queries
+):
+    client.force_login(user_base)
+    species = growing_zoo.animal.species
+    url = reverse("species_counts", args=[species.slug, growing_zoo.enclosure.slug])
+    assert_constant_queries(lambda: client.get(url))
+
+
+@pytest.mark.parametrize("queued", [False, True])
+def test_export_queries(
+    client, user_base, growing_zoo, assert_constant_queries, settings, queued
+):
+    client.force_login(user_base)
+    assert_constant_queries(lambda: client.get(reverse("export")))
+
+    # however many enclosures the zoo grows to
+    settings.EXPORT_SYNC_MAX_DAYS = 0 if queued else 10**6
+
+    def export():
+        resp = client.post(
+            reverse("export"),
+            {
+                "start_date": (dt.date.today() - dt.timedelta(days=30)).strftime(
+                    "%m/%d/%Y"
+                ),
+                "end_date": dt.date.today().strftime("%m/%d/%Y"),
+                "selected_enclosures": [enc.id for enc in growing_zoo.enclosures],
+            },
+        )
+        if queued:
+            assert resp.status_code == 302
+            return run_next_job()
+        assert resp.status_code == 200
+        return b"".join(resp.streaming_content)
+
+    assert_constant_queries(export)
+
+
+def test_assert_constant_queries(growing_zoo, assert_constant_queries):
+    def n_plus_1():
+        for animal in Animal.objects.all():
+            assert animal.species.common_name
+
+    with pytest.raises(pytest.fail.Exception) as e:
+        assert_constant_queries(n_plus_1)
+
+    message = str(e.value)
+    assert message.startswith("3 queries with the smaller zoo, 21 with the larger zoo")
+    assert "+SELECT" in message
+    assert '"zoo_checks_species"."id" = ?' in message
+
+
+def test_api_roster(client, user_base, enclosure_base, animal_A, group_B):
+    client.force_login(user_base)
+    url = reverse("api_roster", args=[enclosure_base.slug])
+
+    resp = client.get(url)
+    assert resp.status_code == 200
+    roster = resp.json()
+    assert roster["enclosure"]["slug"] == enclosure_base.slug
+    assert [s["id"] for s in roster["species"]] == [animal_A.species_id]
+    assert [g["id"] for g in roster["groups"]] == [group_B.id]
+    assert roster["groups"][0]["population_total"] == group_B.population_total
+    assert [a["accession_number"] for a in roster["animals"]] == ["123456"]
+
+    # unchanged since the client's copy
+    etag = resp.headers["ETag"]
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == etag
+    resp = client.get(url, HTTP_IF_MODIFIED_SINCE=resp.headers["Last-Modified"])
+    assert resp.status_code == 304
+    # from the roster itself, not anything cached (e.g. by another process)
+    django_cache.clear()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    animal_A.name = "renamed"
+    animal_A.save()
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.json()["animals"][0]["name"] == "renamed"
+
+
+def test_api_counts(
+    client, user_base, enclosure_base, animal_A, animal_count_A_BAR, group_B
+):
+    client.force_login(user_base)
+    url = reverse("api_counts", args=[enclosure_base.slug])
+
+    resp = client.get(url)
+    assert resp.status_code == 200
+    counts = resp.json()
+    assert counts["date"] == timezone.localdate().isoformat()
+    assert len(counts["prior_dates"]) == 3
+    assert counts["animals"] == [
+        {
+            "id": animal_A.id,
+            "count": {"condition": "BA", "comment": ""},
+            "prior": [None, None, None],
+        }
+    ]
+    # not counted yet
+    assert counts["groups"][0]["count"] is None
+    assert counts["species"][0]["prior"] == [{"count": 0}] * 3
+
+    assert len(client.get(url, {"prior_days": 7}).json()["prior_dates"]) == 7
+    assert client.get(url, {"prior_days": 1000}).status_code == 400
+
+    # counting (on the tally page) changes the counts' ETag
+    etag = resp.headers["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    resp = client.get(f"/count/{enclosure_base.slug}/")
+    data = formsets_post_data(
+        *[resp.context[f"{f}_formset"] for f in ("species", "groups", "animals")]
+    )
+    data["species_formset-0-count"] = 2
+    client.post(f"/count/{enclosure_base.slug}/", data)
+    resp = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp.json()["species"][0]["count"] == {"count": 2}
+
+
+def test_api_counts_post(client, user_base, enclosure_base, animal_A, group_B):
+    client.force_login(user_base)
+    url = reverse("api_counts", args=[enclosure_base.slug])
+    etag = client.get(url).headers["ETag"]
+
+    counts = {
+        "animals": [{"animal": animal_A.id, "condition": "BA"}],
+        "groups": [{"group": group_B.id, "count_seen": 3, "count_bar": 1}],
+    }
+    resp = client.post(url, counts, content_type="application/json", HTTP_IF_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp.json()["animals"][0]["count"]["condition"] == "BA"
+    assert resp.json()["groups"][0]["count"]["count_seen"] == 3
+    assert resp.headers["ETag"] != etag
+    assert AnimalCount.objects.get(animal=animal_A).user == user_base
+    group_count = GroupCount.objects.get(group=group_B)
+    assert group_count.count_total == group_B.population_total
+    assert group_count.count_not_seen == group_B.population_total - 3
+    summary = EnclosureDailySummary.objects.get(enclosure=enclosure_base)
+    assert summary.animals_bar == 1
+
+    # someone counted since the client's copy
+    counts["animals"][0]["condition"] = "SE"
+    resp = client.post(url, counts, content_type="application/json", HTTP_IF_MATCH=etag)
+    assert resp.status_code == 412
+    assert AnimalCount.objects.get(animal=animal_A).condition == "BA"
+
+    # a count of a past day
+    day = timezone.localdate() - dt.timedelta(days=1)
+    resp = client.post(
+        reverse("api_counts", args=[enclosure_base.slug, day.year, day.month, day.day]),
+        counts,
+        content_type="application/json",
+    )
+    assert resp.status_code == 200
+    assert AnimalCount.objects.get(animal=animal_A, datecounted=day).condition == "SE"
+
+    # editing the past day's count keeps when it was counted, but not its ETag
+    url = reverse(
+        "api_counts", args=[enclosure_base.slug, day.year, day.month, day.day]
+    )
+    etag = client.get(url).headers["ETag"]
+    count = AnimalCount.objects.get(animal=animal_A, datecounted=day)
+    count.condition = "BA"
+    count.save()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+def test_api_counts_post_invalid(
+    client, user_base, enclosure_base, animal_A, animal_B_enc, group_B
+):
+    client.force_login(user_base)
+    url = reverse("api_counts", args=[enclosure_base.slug])
+    animal_B = animal_B_enc("other_enclosure")
+
+    resp = client.post(url, "not json", content_type="application/json")
+    assert resp.status_code == 400
+
+    resp = client.post(
+        url,
+        {
+            "animals": [
+                {"animal": animal_A.id, "condition": "BA"},
+                # not in the enclosure
+                {"animal": animal_B.id, "condition": "BA"},
+                # counted twice
+                {"animal": animal_A.id, "condition": "SE"},
+            ],
+            "groups": [{"group": group_B.id, "count_seen": 1, "count_bar": 2}],
+            "species": "not a list",
+        },
+        content_type="application/json",
+    )
+    assert resp.status_code == 422
+    errors = resp.json()["errors"]
+    assert set(errors["animals"]) == {"1", "2"}
+    assert "count_bar" in errors["groups"]["0"]
+    assert "__all__" in errors["species"]
+    # nothing's saved unless everything is valid
+    assert not AnimalCount.objects.exists()
+    assert not GroupCount.objects.exists()
+
+
+def test_api_not_permitted(client, user_factory, enclosure_base):
+    roster_url = reverse("api_roster", args=[enclosure_base.slug])
+    url = reverse("api_counts", args=[enclosure_base.slug])
+
+    # JSON errors, rather than the login page
+    resp = client.get(roster_url)
+    assert resp.status_code == 401
+    assert resp.json() == {"error": "Not logged in"}
+    assert client.post(url, {}, content_type="application/json").status_code == 401
+
+    client.force_login(user_factory("no_roles"))
+    resp = client.get(roster_url)
+    assert resp.status_code == 403
+    assert resp.json() == {"error": "Not permitted"}
+    assert client.get(url).status_code == 403
+    assert client.post(url, {}, content_type="application/json").status_code == 403
+
+    # w/o an error message waiting for the next page the user sees
+    resp = client.get(reverse("home"))
+    assert not list(resp.context["messages"])
+
+
+def test_api_counts_queries(client, user_base, growing_zoo, assert_constant_queries):
+    client.force_login(user_base)
+    url = reverse("api_counts", args=[growing_zoo.enclosure.slug])
+    assert_constant_queries(lambda: client.get(url))
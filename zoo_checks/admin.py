@@ -5,6 +5,8 @@ from zoo_checks.models import (
     Animal,
     AnimalCount,
     Enclosure,
+    EnclosureDailySummary,
+    EnclosureSpecies,
     Group,
     GroupCount,
     Role,
@@ -29,6 +31,19 @@ class SpeciesCountAdmin(admin.ModelAdmin):
     readonly_fields = ("datetimecounted", "datecounted")
 
 
+@admin.register(EnclosureDailySummary)
+class EnclosureDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ("enclosure", "datecounted", "updated")
+    list_filter = ("enclosure",)
+    readonly_fields = ("updated",)
+
+
+@admin.register(EnclosureSpecies)
+class EnclosureSpeciesAdmin(admin.ModelAdmin):
+    list_display = ("enclosure", "species", "num_animals", "num_groups")
+    list_filter = ("enclosure",)
+
+
 @admin.register(Role)
 class RoleAdmin(admin.ModelAdmin):
     fields = ("name", "slug", "enclosures", "users")
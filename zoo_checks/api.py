@@ -0,0 +1,174 @@
+"""
+JSON payloads of an enclosure's tally data (see the api_* views): compact versions of
+what the tally page renders, for clients that don't need its forms and templates
+
+- the roster: the enclosure's species, and its active groups and animals
+- counts: the latest count of each of them on a day, and on the prior days
+
+Their ETag/Last-Modified headers come from the rows they're built from (see changes)
+"""
+
+import hashlib
+
+from django.db.models import Count, Max, Subquery, Value
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from .models import AnimalCount, Enclosure, GroupCount, SpeciesCount
+
+# payload key -> the kind of row on the tally page (see views.TALLY_ROWS), which is
+# also the name of the counted field in a count's JSON
+KINDS = {"species": "species", "groups": "group", "animals": "animal"}
+
+# the most prior days of counts in a payload
+MAX_PRIOR_DAYS = 31
+
+ROSTER_FIELDS = {
+    "species": ["id", "common_name", "genus_name", "species_name"],
+    "groups": [
+        "id",
+        "accession_number",
+        "species_id",
+        "population_male",
+        "population_female",
+        "population_unknown",
+        "population_total",
+    ],
+    "animals": ["id", "accession_number", "name", "identifier", "sex", "species_id"],
+}
+
+COUNT_FIELDS = {
+    "species": ["count"],
+    "groups": ["count_seen", "count_bar", "needs_attn", "comment"],
+    "animals": ["condition", "comment"],
+}
+
+
+def get_roster(enclosure) -> dict:
+    """the enclosure's species, and active groups and animals, in tally page order"""
+    return {
+        "species": enclosure.species().order_by("common_name"),
+        "groups": enclosure.groups.filter(active=True)
+        .order_by("species__common_name", "accession_number")
+        .select_related("species"),
+        "animals": enclosure.animals.filter(active=True)
+        .order_by("species__common_name", "name", "accession_number")
+        .select_related("species"),
+    }
+
+
+def count_querysets(enclosure, roster: dict, dateday, prior_days=3) -> dict:
+    """all the counts (not just the latest) counts_payload reads from"""
+    days = {
+        "datetimecounted__gte": dateday - timezone.timedelta(days=prior_days),
+        "datetimecounted__lt": dateday + timezone.timedelta(days=1),
+    }
+    return {
+        "species_counts": SpeciesCount.objects.filter(
+            species__in=roster["species"], enclosure=enclosure, **days
+        ),
+        "group_counts": GroupCount.objects.filter(group__in=roster["groups"], **days),
+        "animal_counts": AnimalCount.objects.filter(
+            animal__in=roster["animals"], **days
+        ),
+    }
+
+
+def changes(enclosure, querysets: dict) -> tuple[list, timezone.datetime | None]:
+    """
+    How many rows each queryset has and when the latest of them was updated, in one
+    query, for an ETag that changes whenever any of the rows is added, removed or
+    updated, and when the latest was updated (None if there are no rows)
+    """
+    annotations = {}
+    for key, qs in querysets.items():
+        # a constant to "group" by aggregates all the rows
+        rows = qs.order_by().values(all_rows=Value(1))
+        annotations[f"{key}_rows"] = Subquery(rows.annotate(n=Count("id")).values("n"))
+        annotations[f"{key}_updated"] = Subquery(
+            rows.annotate(updated=Max("updated")).values("updated")
+        )
+
+    values = Enclosure.objects.filter(id=enclosure.id).values(**annotations).get()
+    updated = [values[f"{key}_updated"] for key in querysets]
+    return list(values.values()), max(filter(None, updated), default=None)
+
+
+def etag(*parts) -> str:
+    """a (strong) ETag of whatever the parts identify, e.g. a payload's modified times"""
+    digest = hashlib.md5(":".join(map(str, parts)).encode(), usedforsecurity=False)
+    return quote_etag(digest.hexdigest())
+
+
+def _values(obj, fields: list[str]):
+    return None if obj is None else {field: getattr(obj, field) for field in fields}
+
+
+def roster_payload(enclosure, roster: dict) -> dict:
+    return {
+        "enclosure": {
+            "id": enclosure.id,
+            "name": enclosure.name,
+            "slug": enclosure.slug,
+        },
+        **{
+            key: [_values(obj, ROSTER_FIELDS[key]) for obj in objs]
+            for key, objs in roster.items()
+        },
+    }
+
+
+def counts_payload(enclosure, roster: dict, dateday, prior_days=3) -> dict:
+    """
+    The latest count of each row of the tally page on the day (null if not counted)
+    and on each of the prior days (most recent first, dates in "prior_dates")
+    Three queries for the day's counts and three for the prior days', however many
+    species, groups and animals the enclosure has
+    """
+    species, groups, animals = roster["species"], roster["groups"], roster["animals"]
+
+    on_day = {
+        "species": {
+            c.species_id: c
+            for c in SpeciesCount.counts_on_day(species, enclosure, day=dateday)
+        },
+        "groups": {
+            c.group_id: c for c in GroupCount.counts_on_day(groups, day=dateday)
+        },
+        "animals": {
+            c.animal_id: c for c in AnimalCount.counts_on_day(animals, day=dateday)
+        },
+    }
+    prior = {
+        "species": SpeciesCount.prior_counts(
+            species, enclosure, prior_days, ref_date=dateday
+        ),
+        "groups": GroupCount.prior_counts(groups, prior_days, ref_date=dateday),
+        "animals": AnimalCount.prior_counts(animals, prior_days, ref_date=dateday),
+    }
+
+    payload = {
+        "enclosure": enclosure.slug,
+        "date": dateday.date(),
+        "prior_dates": [
+            dateday.date() - timezone.timedelta(days=p + 1) for p in range(prior_days)
+        ],
+    }
+    for key, objs in roster.items():
+        fields = COUNT_FIELDS[key]
+        payload[key] = [
+            {
+                "id": obj.id,
+                "count": _values(on_day[key].get(obj.id), fields),
+                # prior species counts are already just the count (0 if not counted)
+                "prior": [
+                    {"count": c["count"]}
+                    if key == "species"
+                    else _values(c["count"], fields)
+                    for c in prior[key][obj.id]
+                ],
+            }
+            for obj in objs
+        ]
+
+    return payload
@@ -0,0 +1,94 @@
+"""
+Cached data, dropped whenever what it's computed from is saved (see signals.py), or by
+calling the invalidate functions after bulk writes, which don't send signals
+
+- the home page enclosure cards, one entry per enclosure per day
+- the ids of the enclosures each user's roles give them access to (in their session,
+  w/ the version of the roles they're from)
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+# cards are only shown for today, they don't need to outlive it
+CARD_TIMEOUT = 60 * 60 * 24
+
+# part of every card's key (and stamped on every session's enclosure ids), replaced
+# to drop all of them at once
+CARD_VERSION_KEY = "home-card-version"
+PERMISSIONS_VERSION_KEY = "permissions-version"
+
+ENCLOSURE_IDS_SESSION_KEY = "enclosure_ids"
+
+
+def version(key: str) -> str:
+    """a new version whenever it isn't cached (yet, or evicted), so data cached under
+    an older one is never taken to be current"""
+    return cache.get_or_set(key, lambda: uuid.uuid4().hex, timeout=None)
+
+
+def _now_and_on_commit(func):
+    """a request could cache the old data between now and the transaction committing,
+    so invalidate both times"""
+    func()
+    transaction.on_commit(func)
+
+
+def _new_version(key: str):
+    _now_and_on_commit(lambda: cache.set(key, uuid.uuid4().hex, timeout=None))
+
+
+def card_key(card_version: int, enclosure_id: int, day) -> str:
+    return f"home-card:{card_version}:{enclosure_id}:{day.isoformat()}"
+
+
+def get_cards(enclosure_ids, day) -> dict:
+    """cached cards of the enclosures on the day, keyed by enclosure id
+    enclosures without a cached card are left out"""
+    card_version = version(CARD_VERSION_KEY)
+    keys = {card_key(card_version, enc_id, day): enc_id for enc_id in enclosure_ids}
+    return {keys[key]: card for key, card in cache.get_many(keys).items()}
+
+
+def set_cards(cards: dict, day):
+    """caches cards on the day, keyed by enclosure id"""
+    card_version = version(CARD_VERSION_KEY)
+    cache.set_many(
+        {card_key(card_version, enc_id, day): card for enc_id, card in cards.items()},
+        timeout=CARD_TIMEOUT,
+    )
+
+
+def invalidate_card(enclosure_id: int, day):
+    _now_and_on_commit(
+        lambda: cache.delete(card_key(version(CARD_VERSION_KEY), enclosure_id, day))
+    )
+
+
+def invalidate_all_cards():
+    """for changes to animals/groups, which can move between enclosures"""
+    _new_version(CARD_VERSION_KEY)
+
+
+def get_enclosure_ids(session, compute) -> set[int]:
+    """the ids of the enclosures a user can access, kept in their session w/ the version
+    of the roles they're from, so checking them costs one cache lookup
+    computed (and kept) by calling compute if the roles have changed since"""
+    permissions_version = version(PERMISSIONS_VERSION_KEY)
+    stamped = session.get(ENCLOSURE_IDS_SESSION_KEY)
+    if stamped is not None and stamped["version"] == permissions_version:
+        return set(stamped["ids"])
+
+    ids = compute()
+    session[ENCLOSURE_IDS_SESSION_KEY] = {
+        "version": permissions_version,
+        "ids": sorted(ids),
+    }
+    return ids
+
+
+def invalidate_permissions():
+    """for changes to roles, each of which can change the access of many users"""
+    _new_version(PERMISSIONS_VERSION_KEY)
@@ -0,0 +1,52 @@
+"""Chart data of a subject's counts (the animal, group and species counts pages)"""
+
+import datetime
+
+from django.db.models import Count
+from django.db.models.functions import Trunc
+
+# charts show the most recent counts
+CHART_LIMIT = 100
+# and months of them
+CHART_MONTHS = 12
+
+
+def line_series(counts, fields: list[str], limit=CHART_LIMIT) -> dict[str, list]:
+    """values of each field over the first (ordered) counts, in one query"""
+    rows = list(counts.values_list(*fields)[:limit])
+    return {field: [row[i] for row in rows] for i, field in enumerate(fields)}
+
+
+def histogram(counts, field: str, limit=None) -> dict:
+    """number of counts with each value of the field, sorted by value
+    limited to the first (ordered) counts, grouped in the db"""
+    if limit is not None:
+        counts = counts.model.objects.filter(id__in=counts.values("id")[:limit])
+    totals = counts.values(field).order_by(field).annotate(num=Count("id"))
+    return {total[field]: total["num"] for total in totals}
+
+
+def histogram_by_period(counts, field: str, kind="month", since=None) -> dict:
+    """histogram of the field in each period (e.g. month) of the counts since a date,
+    in one query, keyed by the first day of the period in date order"""
+    if since is not None:
+        counts = counts.filter(datecounted__gte=since)
+    totals = (
+        counts.annotate(period=Trunc("datecounted", kind))
+        .values("period", field)
+        .order_by("period", field)
+        .annotate(num=Count("id"))
+    )
+    histograms = {}
+    for total in totals:
+        histograms.setdefault(total["period"], {})[total[field]] = total["num"]
+    return histograms
+
+
+def month_starts(num_months: int, day: datetime.date) -> list[datetime.date]:
+    """first days of the months up to (and including) the day's month, oldest first"""
+    months = day.year * 12 + day.month - 1
+    return [
+        datetime.date(m // 12, m % 12 + 1, 1)
+        for m in range(months - num_months + 1, months + 1)
+    ]
@@ -0,0 +1,260 @@
+"""Exports counts to a spreadsheet (xlsx), csv or parquet file
+
+All three types of count are projected into the same columns (see COLUMNS) and sorted
+in the database, so the export is one query that's streamed into the file as it's read
+and memory is bounded by the chunk size
+"""
+
+import csv
+import io
+import logging
+from itertools import chain, islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db.models import (
+    BooleanField,
+    CharField,
+    F,
+    Func,
+    PositiveSmallIntegerField,
+    TextField,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Collate
+from openpyxl import Workbook
+
+from .models import AnimalCount, GroupCount, SpeciesCount
+
+baselogger = logging.getLogger("zootable")
+LOGGER = baselogger.getChild(__name__)
+
+# counts read from the database at a time
+CHUNK_SIZE = 2000
+
+# rows in each parquet row group
+ROW_GROUP_SIZE = 20000
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv"
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+SPECIES_COLS = [
+    "class_name",
+    "order_name",
+    "family_name",
+    "genus_name",
+    "species_name",
+    "common_name",
+]
+
+# columns of one type of count that the others don't have (null for them, typed so
+# the union of the counts' columns matches)
+COUNT_COLS = {
+    "condition": CharField(),
+    "comment": TextField(),
+    "count_total": PositiveSmallIntegerField(),
+    "count_seen": PositiveSmallIntegerField(),
+    "count_not_seen": PositiveSmallIntegerField(),
+    "count_bar": PositiveSmallIntegerField(),
+    "needs_attn": BooleanField(),
+    "count": PositiveSmallIntegerField(),
+}
+
+# every type of count's columns, w/ the taxonomy and accession number of its subject
+COLUMNS = [
+    "enclosure",
+    "date_counted",
+    "time_counted",
+    *SPECIES_COLS,
+    "user",
+    *COUNT_COLS,
+    "accession_number",
+]
+
+PARQUET_SCHEMA = pa.schema(
+    [
+        ("enclosure", pa.string()),
+        ("date_counted", pa.date32()),
+        ("time_counted", pa.string()),
+        *((col, pa.string()) for col in SPECIES_COLS),
+        ("user", pa.string()),
+        ("condition", pa.string()),
+        ("comment", pa.string()),
+        ("count_total", pa.uint16()),
+        ("count_seen", pa.uint16()),
+        ("count_not_seen", pa.uint16()),
+        ("count_bar", pa.uint16()),
+        ("needs_attn", pa.bool_()),
+        ("count", pa.uint16()),
+        ("accession_number", pa.string()),
+    ]
+)
+
+# rows are sorted by these columns
+SORT_COLS = ["enclosure", "date_counted", "time_counted", "species_name"]
+
+
+class LocalTime(Func):
+    """The time of a datetime in the app's timezone, as a HH:MM:SS string"""
+
+    template = "TO_CHAR(%(expressions)s, 'HH24:MI:SS')"
+    arg_joiner = " AT TIME ZONE "
+    output_field = CharField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value(settings.TIME_ZONE), **extra)
+
+
+def export_queryset(enclosures, start_date, end_date):
+    """
+    The first count of each animal/group/species on each day in the date range,
+    as rows of the export's COLUMNS in the export's order
+    """
+
+    querysets = []
+    for model, subject, species in (
+        (AnimalCount, "animal", "animal__species"),
+        (GroupCount, "group", "group__species"),
+        (SpeciesCount, "species", "species"),
+    ):
+        first_counts = (
+            model.objects.filter(
+                enclosure__in=enclosures,
+                datecounted__gte=start_date,
+                datecounted__lte=end_date,
+            )
+            .order_by("datecounted", f"{subject}_id", "datetimecounted")
+            .distinct("datecounted", f"{subject}_id")
+        )
+
+        model_fields = {f.name for f in model._meta.fields}
+        if subject == "species":
+            accession_number = Value("")
+        else:
+            accession_number = Coalesce(f"{subject}__accession_number", Value(""))
+        # "C" collation sorts the names the same as python does
+        columns = {
+            "enclosure": Collate("enclosure__name", "C"),
+            "date_counted": F("datecounted"),
+            "time_counted": LocalTime("datetimecounted"),
+            **{col: Coalesce(f"{species}__{col}", Value("")) for col in SPECIES_COLS},
+            "user": F("user__username"),
+            **{
+                col: F(col) if col in model_fields else Cast(None, field)
+                for col, field in COUNT_COLS.items()
+            },
+            "accession_number": accession_number,
+        }
+        columns["species_name"] = Collate(columns["species_name"], "C")
+
+        # the names of the columns can clash with the model's fields
+        querysets.append(
+            model.objects.filter(id__in=first_counts.values("id"))
+            .annotate(**{f"export_{col}": expr for col, expr in columns.items()})
+            .values_list(*(f"export_{col}" for col in COLUMNS))
+        )
+
+    first, *rest = querysets
+    return first.union(*rest, all=True).order_by(
+        *(f"export_{col}" for col in SORT_COLS)
+    )
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    The columns and rows of the export, read from the database chunk_size rows at a time
+
+    Returns (None, None) if there are no counts
+    """
+
+    rows = queryset.iterator(chunk_size=chunk_size)
+    first_row = next(rows, None)
+    if first_row is None:
+        return None, None
+
+    return COLUMNS, chain([first_row], rows)
+
+
+def log_no_data(enclosures, start_date, end_date):
+    extra = {
+        "enclosures": list(enclosures.values("id", "name")),
+        "start_date": start_date.strftime("%m/%d/%Y"),
+        "end_date": end_date.strftime("%m/%d/%Y"),
+    }
+    LOGGER.error("no data to export for enclosures", extra=extra)
+
+
+def export_filename(enclosures, start_date, end_date, file_format):
+    enclosure_names = "_".join(enc.slug for enc in enclosures)
+    start_date_str = start_date.strftime("%Y%m%d")
+    end_date_str = end_date.strftime("%Y%m%d")
+    return (
+        f"zootable_export_{enclosure_names}_{start_date_str}_"
+        f"{end_date_str}.{file_format}"
+    )
+
+
+def write_xlsx(columns, rows, f):
+    """Writes rows to an xlsx workbook in a (binary) file"""
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Sheet1")
+    worksheet.append(columns)
+    for row in rows:
+        worksheet.append(row)
+
+    workbook.save(f)
+
+
+class _Echo:
+    """A file that returns what's written to it instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    """The lines of a csv of the rows, as they're read (e.g. to stream in a response)"""
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_csv(columns, rows, f):
+    """Writes rows to a csv in a (binary) file, a line at a time"""
+
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+    text.writelines(csv_lines(columns, rows))
+    # leave the file open for the caller
+    text.flush()
+    text.detach()
+
+
+def write_parquet(columns, rows, f, row_group_size=ROW_GROUP_SIZE):
+    """
+    Writes rows (of the export's COLUMNS) to a parquet file in a (binary) file,
+    a row group at a time
+    """
+
+    if columns != PARQUET_SCHEMA.names:
+        raise ValueError(f"Columns don't match the parquet schema: {columns}")
+
+    with pq.ParquetWriter(f, PARQUET_SCHEMA) as writer:
+        while chunk := list(islice(rows, row_group_size)):
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*chunk), PARQUET_SCHEMA)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=PARQUET_SCHEMA))
+
+
+# file format -> (writer, content type)
+EXPORT_WRITERS = {
+    "xlsx": (write_xlsx, XLSX_CONTENT_TYPE),
+    "csv": (write_csv, CSV_CONTENT_TYPE),
+    "parquet": (write_parquet, PARQUET_CONTENT_TYPE),
+}
@@ -1,12 +1,60 @@
 import datetime
 
 from django import forms
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from .api import MAX_PRIOR_DAYS
 from .models import AnimalCount, Enclosure, GroupCount, SpeciesCount
 
 
-class AnimalCountForm(forms.ModelForm):
+class RosterChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField of objects that are already loaded (by id), so cleaning it
+    doesn't query for the chosen one"""
+
+    def __init__(self, objs: dict, **kwargs):
+        self.objs = objs
+        super().__init__(**kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objs[int(getattr(value, "pk", value))]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+
+class RosterCountForm(forms.ModelForm):
+    """
+    A count form of the tally page, optionally given the objects each of its
+    foreign keys can be (by field, then id), e.g.
+    roster={"animal": {animal.id: animal}, "enclosure": {enclosure.id: enclosure}}
+    which the page already loaded, so a formset of them validates w/o a query per form
+    """
+
+    def __init__(self, *args, roster=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.roster = roster or {}
+        for name, objs in self.roster.items():
+            field = self.fields[name]
+            self.fields[name] = RosterChoiceField(
+                objs,
+                queryset=field.queryset,
+                widget=field.widget,
+                required=field.required,
+            )
+
+    def _get_validation_exclusions(self):
+        # the model would check each foreign key exists, the roster's are known to
+        return super()._get_validation_exclusions() | set(self.roster)
+
+
+class AnimalCountForm(RosterCountForm):
     class Meta:
         model = AnimalCount
         fields = ["condition", "comment", "animal", "enclosure"]
@@ -23,7 +71,7 @@ class AnimalCountForm(forms.ModelForm):
     )
 
 
-class SpeciesCountForm(forms.ModelForm):
+class SpeciesCountForm(RosterCountForm):
     class Meta:
         model = SpeciesCount
         fields = ["count", "species", "enclosure"]
@@ -41,7 +89,7 @@ class SpeciesCountForm(forms.ModelForm):
     )
 
 
-class GroupCountForm(forms.ModelForm):
+class GroupCountForm(RosterCountForm):
     class Meta:
         model = GroupCount
         fields = [
@@ -99,11 +147,16 @@ class UploadFileForm(forms.Form):
 
 
 class ExportForm(forms.Form):
+    FORMATS = (("xlsx", "Excel"), ("csv", "CSV"), ("parquet", "Parquet"))
+
     selected_enclosures = forms.ModelMultipleChoiceField(
         widget=forms.CheckboxSelectMultiple, queryset=Enclosure.objects.none()
     )
     start_date = forms.DateField(required=True)
     end_date = forms.DateField(required=True)
+    file_format = forms.TypedChoiceField(
+        choices=FORMATS, widget=forms.RadioSelect, required=False, empty_value="xlsx"
+    )
 
     def clean(self):
         cleaned_data = super().clean()
@@ -144,6 +197,35 @@ class SignupForm(forms.Form):
         user.save()
 
 
+class ChartRangeForm(forms.Form):
+    """optional range of the counts on a chart"""
+
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get("start_date")
+        end_date = cleaned_data.get("end_date")
+
+        if start_date and end_date and end_date < start_date:
+            raise forms.ValidationError("End date should be greater than start date.")
+
+        return cleaned_data
+
+
+class PriorDaysForm(forms.Form):
+    """number of prior days of counts in the tally API's counts (default 3)"""
+
+    prior_days = forms.IntegerField(
+        min_value=0, max_value=MAX_PRIOR_DAYS, required=False
+    )
+
+    def clean_prior_days(self):
+        prior_days = self.cleaned_data["prior_days"]
+        return 3 if prior_days is None else prior_days
+
+
 class TallyDateForm(forms.Form):
     tally_date = forms.DateField(required=True)
 
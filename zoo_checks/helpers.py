@@ -1,5 +1,3 @@
-import pandas as pd
-from django.conf import settings
 from django.utils import timezone
 
 
@@ -16,24 +14,48 @@ def prior_days(days=3):
     return p_days
 
 
+def prior_day_counts(counts_by_date, ref_date, prior_days=3, default=None):
+    """Lays out counts keyed by date as a list over the prior N days
+    (most recent first), each item a dict with the "count" and the "day"
+    """
+
+    counts = []
+    for p in range(prior_days):
+        daytime = ref_date - timezone.timedelta(days=p + 1)
+        day = ref_date.date() - timezone.timedelta(days=p + 1)
+        counts.append({"count": counts_by_date.get(day, default), "day": daytime})
+
+    return counts
+
+
 def set_formset_order(
-    enclosure,
     enclosure_species,
     enclosure_groups,
     enclosure_animals,
     species_formset,
     groups_formset,
     animals_formset,
-    dateday,
+    prior_counts,
 ):
-    """Creates an order to display the formsets"""
+    """Creates an order to display the formsets
+
+    prior_counts is a dict of the prior counts for "species", "groups" and "animals"
+    each keyed by object id (see: `prior_counts` on the count models)
+    """
+
+    # bucket the groups and animals by species in a single pass over each queryset
+    # keeping their index into the formsets (formsets are built in queryset order)
+    spec_groups_dict = {}
+    for group_ind, group in enumerate(enclosure_groups):
+        spec_groups_dict.setdefault(group.species_id, []).append((group_ind, group))
+
+    spec_animals_dict = {}
+    for anim_ind, anim in enumerate(enclosure_animals):
+        spec_animals_dict.setdefault(anim.species_id, []).append((anim_ind, anim))
 
     # to set the order
     formset_dict = {}
-    anim_total = 0
-    group_count = 0
     for ind, spec in enumerate(enclosure_species):
-        # TODO: separate spec/group/animals parts out into separate functions
         # each species is it's own dict, using id because that's known unique
         formset_dict[spec.id] = {}
         formset_dict[spec.id]["species"] = spec
@@ -41,50 +63,32 @@ def set_formset_order(
         # species
         # NOTE: We could avoid the following when there's group's for that species since they are hidden
         formset_dict[spec.id]["formset"] = species_formset[ind]
-        formset_dict[spec.id]["prior_counts"] = spec.prior_counts(
-            enclosure, ref_date=dateday
-        )
+        formset_dict[spec.id]["prior_counts"] = prior_counts["species"][spec.id]
 
         # groups
-        spec_groups = enclosure_groups.filter(species=spec)
-        formset_dict[spec.id]["group_forms"] = []
-        for spec_group in spec_groups:
-            group_form = groups_formset[group_count]
-            group_count += 1
-
-            formset_dict[spec.id]["group_forms"].append(
-                {
-                    "group": spec_group,
-                    "form": group_form,
-                    "prior_counts": spec_group.prior_counts(ref_date=dateday),
-                }
-            )
+        formset_dict[spec.id]["group_forms"] = [
+            {
+                "group": spec_group,
+                "form": groups_formset[group_ind],
+                "prior_counts": prior_counts["groups"][spec_group.id],
+            }
+            for group_ind, spec_group in spec_groups_dict.get(spec.id, [])
+        ]
 
         # animals
-        spec_anim_queryset = enclosure_animals.filter(species=spec)
-
-        # create an index into the animals_formset
-        spec_anim_index = list(
-            range(anim_total, spec_anim_queryset.count() + anim_total)
-        )
-
         # create a dictionary for each animal in a species with its form and prior conditions
-        animals_form_dict_list = []
-        for i, anim in enumerate(spec_anim_queryset):
-            animals_form_dict_list.append(
-                {
-                    "animal": anim,
-                    "form": animals_formset[spec_anim_index[i]],
-                    "prior_conditions": anim.prior_conditions(ref_date=dateday),
-                }
-            )
-        formset_dict[spec.id]["animals_form_dict_list"] = animals_form_dict_list
+        spec_animals = spec_animals_dict.get(spec.id, [])
+        formset_dict[spec.id]["animals_form_dict_list"] = [
+            {
+                "animal": anim,
+                "form": animals_formset[anim_ind],
+                "prior_conditions": prior_counts["animals"][anim.id],
+            }
+            for anim_ind, anim in spec_animals
+        ]
 
         # convenient to just have a list of animals in the species here
-        formset_dict[spec.id]["animals"] = spec_anim_queryset
-
-        # updating total animals
-        anim_total += spec_anim_queryset.count()
+        formset_dict[spec.id]["animals"] = [anim for _, anim in spec_animals]
 
     return formset_dict, species_formset, groups_formset, animals_formset
 
@@ -92,14 +96,14 @@ def set_formset_order(
 def get_init_spec_count_form(enclosure, enclosure_species, counts):
     # dict of counts to easily access
     if counts:
-        counts_dict = {cc.species: cc.count for cc in counts}
+        counts_dict = {cc.species_id: cc.count for cc in counts}
     else:
         counts_dict = {}
 
     # * note: this unpacks the queryset into a list and should be avoided
     init_spec = []
     for sp in enclosure_species:
-        count = counts_dict.get(sp, 0)  # default to 0 if not found
+        count = counts_dict.get(sp.id, 0)  # default to 0 if not found
         init_spec.append({"species": sp, "count": count, "enclosure": enclosure})
 
     return init_spec
@@ -107,13 +111,13 @@ def get_init_spec_count_form(enclosure, enclosure_species, counts):
 
 def get_init_group_count_form(enclosure_groups, counts):
     if counts:
-        counts_dict = {cc.group: cc for cc in counts}
+        counts_dict = {cc.group_id: cc for cc in counts}
     else:
         counts_dict = {}
 
     init_group = []
     for group in enclosure_groups:
-        count = counts_dict.get(group)
+        count = counts_dict.get(group.id)
         init_group.append(
             {
                 "group": group,
@@ -133,142 +137,22 @@ def get_init_anim_count_form(enclosure_animals, counts):
     # TODO: condition should default to median? condition (across users) for the day
 
     if counts:
-        counts_dict = {cc.animal: cc for cc in counts}
+        counts_dict = {cc.animal_id: cc for cc in counts}
     else:
         counts_dict = {}
 
     init_anim = [
         {
             "animal": anim,
-            "condition": counts_dict.get(anim).condition
-            if counts_dict.get(anim)
+            "condition": counts_dict.get(anim.id).condition
+            if counts_dict.get(anim.id)
+            else "",
+            "comment": counts_dict.get(anim.id).comment
+            if counts_dict.get(anim.id)
             else "",
-            "comment": counts_dict.get(anim).comment if counts_dict.get(anim) else "",
             "enclosure": anim.enclosure,
         }
         for anim in enclosure_animals
     ]
 
     return init_anim
-
-
-def qs_to_df(qs, fields):
-    """Takes a queryset and outputs a dataframe"""
-
-    field_names = []
-    field_name_constructor = "{}__{}"
-    for f in fields:
-        if f.is_relation:
-            if f.name == "enclosure":
-                field_names.append(field_name_constructor.format(f.name, "name"))
-            elif f.name == "user":
-                field_names.append(field_name_constructor.format(f.name, "username"))
-            elif f.name in ("animal", "group"):
-                field_names.extend(
-                    [
-                        field_name_constructor.format(f.name, "accession_number"),
-                        field_name_constructor.format(f.name, "species__class_name"),
-                        field_name_constructor.format(f.name, "species__order_name"),
-                        field_name_constructor.format(f.name, "species__family_name"),
-                        field_name_constructor.format(f.name, "species__genus_name"),
-                        field_name_constructor.format(f.name, "species__species_name"),
-                        field_name_constructor.format(f.name, "species__common_name"),
-                    ]
-                )
-            elif f.name == "species":
-                field_names.extend(
-                    [
-                        field_name_constructor.format(f.name, "class_name"),
-                        field_name_constructor.format(f.name, "order_name"),
-                        field_name_constructor.format(f.name, "family_name"),
-                        field_name_constructor.format(f.name, "genus_name"),
-                        field_name_constructor.format(f.name, "species_name"),
-                        field_name_constructor.format(f.name, "common_name"),
-                    ]
-                )
-        else:
-            field_names.append(f.name)
-
-    queryset_vals = qs.values(*field_names)
-    df = pd.DataFrame(queryset_vals)
-
-    return df
-
-
-def clean_df(df):
-    """cleans the counts dataframe for export to excel"""
-
-    if "id" in df.columns:
-        df = df.drop(columns=["id"])
-
-    # remove timezone from datetimes
-    # convert times to app's timezone
-    # get only time string
-    if "datetimecounted" in df.columns:
-        df["time_counted"] = (
-            df["datetimecounted"]
-            .dt.tz_convert(settings.TIME_ZONE)
-            .dt.tz_localize(None)
-            .dt.strftime("%H:%M:%S")
-        )
-    df = df.drop(columns=["datetimecounted"])
-
-    # combining columns for species
-    items = (
-        "common_name",
-        "class_name",
-        "order_name",
-        "family_name",
-        "genus_name",
-        "species_name",
-    )
-    for item in items:
-        cols = [
-            f"species__{item}",
-            f"animal__species__{item}",
-            f"group__species__{item}",
-        ]
-        cols = [c for c in cols if c in df.columns]
-        df[f"{item}"] = df[cols].apply(
-            lambda row: "".join(row.dropna().astype(str)), axis=1
-        )
-        df = df.drop(columns=cols)
-
-    # combining accession_number
-    cols = ["animal__accession_number", "group__accession_number"]
-    cols = [c for c in cols if c in df.columns]
-    df["accession_number"] = df[cols].apply(
-        lambda row: "".join(row.dropna().astype(str)), axis=1
-    )
-    df = df.drop(columns=cols)
-
-    # making col names prettier
-    rename_cols = {
-        "enclosure__name": "enclosure",
-        "user__username": "user",
-        "datecounted": "date_counted",
-    }
-    df = df.rename(columns=rename_cols)
-
-    # sorting the values
-    df = df.sort_values(
-        by=["enclosure", "date_counted", "time_counted", "species_name"]
-    )
-
-    # sorting the columns
-    cols = df.columns.to_list()
-    cols_front = [
-        "enclosure",
-        "date_counted",
-        "time_counted",
-        "class_name",
-        "order_name",
-        "family_name",
-        "genus_name",
-        "species_name",
-        "common_name",
-    ]
-    [cols.remove(c) for c in cols_front]
-    df = df[cols_front + cols]
-
-    return df
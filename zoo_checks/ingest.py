@@ -4,9 +4,19 @@ from itertools import compress
 from operator import itemgetter
 
 import pandas as pd
-from django.core.exceptions import ObjectDoesNotExist
-
-from zoo_checks.models import Animal, Enclosure, Group, Species
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from zoo_checks.cache import invalidate_all_cards
+from zoo_checks.models import (
+    Animal,
+    Enclosure,
+    EnclosureDailySummary,
+    EnclosureSpecies,
+    Group,
+    Species,
+)
 
 TRACKS_REQ_COLS = [
     "Enclosure",
@@ -25,6 +35,9 @@ TRACKS_REQ_COLS = [
     "Population _Unknown",
 ]
 
+# rows written per INSERT/UPDATE statement
+BATCH_SIZE = 500
+
 
 class ExcelUploadError(Exception):
     """custom exception for the excel loading"""
@@ -67,7 +80,11 @@ def get_enclosures(df: pd.DataFrame) -> set[str]:
 def create_enclosures(df: pd.DataFrame):
     """Given data in a pandas dataframe, create any missing enclosures"""
     enclosures = get_enclosures(df)
-    for enclosure in enclosures:
+    existing = set(
+        Enclosure.objects.filter(name__in=enclosures).values_list("name", flat=True)
+    )
+    # saved one by one so their slugs are made unique; new enclosures are rare
+    for enclosure in enclosures - existing:
         create_enclosure_name(enclosure)
 
 
@@ -76,67 +93,65 @@ def create_enclosure_name(enclosure_name: str) -> Enclosure:
     return encl
 
 
+SPECIES_COLS = {
+    "Common": "common_name",
+    "GSS": "genus_name",
+    "Species": "species_name",
+    "Class": "class_name",
+    "Order": "order_name",
+    "Family": "family_name",
+}
+
+
+@transaction.atomic
 def create_species(df: pd.DataFrame):
-    """Create any species that exist in the pandas dataframe but not in the database"""
-    df_species = df.drop_duplicates(
-        subset=["Common", "GSS", "Species", "Class", "Order", "Family"]
-    )
-    for _, row in df_species.iterrows():
-        common_name = row["Common"]
-        genus_name = row["GSS"]
-        species_name = row["Species"]
-        class_name = row["Class"]
-        order_name = row["Order"]
-        family_name = row["Family"]
-        Species.objects.update_or_create(
-            common_name=common_name,
-            defaults={
-                "genus_name": genus_name,
-                "species_name": species_name,
-                "class_name": class_name,
-                "order_name": order_name,
-                "family_name": family_name,
-            },
-        )
+    """Create any species that exist in the pandas dataframe but not in the database
+    and update those whose names/taxonomy changed"""
+
+    # we sometimes don't have any to add
+    if len(df.index) == 0:
+        return
 
+    # common names are unique, the last row for a species wins
+    df_species = (
+        df[list(SPECIES_COLS)]
+        .drop_duplicates(subset=["Common"], keep="last")
+        .rename(columns=SPECIES_COLS)
+    )
+    existing = Species.objects.in_bulk(
+        list(df_species["common_name"]), field_name="common_name"
+    )
 
-def get_sex(row):
-    # start with sex being unknown
-    sex = "U"
-    # use sex column as primary
-    if not pd.isna(row["Sex"]):
-        # sets sex to either M/F/U
-        sex = row["Sex"]
-    # use population values as secondary if available
-    else:
-        if row["Population _Male"] == 1:
-            sex = "M"
-        if row["Population _Female"] == 1:
-            sex = "F"
-    return sex
+    to_update, update_fields = [], set()
+    for attributes in df_species.to_dict("records"):
+        species = existing.get(attributes["common_name"])
+        if species is None:
+            # saved one by one so their slugs are made unique; new species are rare
+            Species.objects.create(**attributes)
+        elif changed := set_changed_attributes(species, attributes):
+            to_update.append(species)
+            update_fields |= changed
 
+    if to_update:
+        bulk_update(Species, to_update, update_fields)
 
-def get_group_attributes(row):
-    active, accession_number, species, enclosure = get_animal_set_info(row)
-    population_male = row["Population _Male"]
-    population_female = row["Population _Female"]
-    population_unknown = row["Population _Unknown"]
 
-    # todo: we need to make sure we grab _all_ the attributes
-    # something like Model._meta.get_fields()
+def bulk_update(model, objs, fields):
+    """bulk_update, which (unlike save) doesn't set when the objects were updated"""
+    now = timezone.now()
+    for obj in objs:
+        obj.updated = now
+    model.objects.bulk_update(objs, [*fields, "updated"], batch_size=BATCH_SIZE)
 
-    attributes = {
-        "accession_number": accession_number,
-        "active": active,
-        "enclosure": enclosure,
-        "species": species,
-        "population_male": population_male,
-        "population_female": population_female,
-        "population_unknown": population_unknown,
-        "population_total": population_male + population_female + population_unknown,
-    }
 
-    return attributes
+def set_changed_attributes(obj, attributes: dict) -> set[str]:
+    """sets attributes (by field attname) on obj, returns the names of those changed"""
+    changed = set()
+    for attname, value in attributes.items():
+        if getattr(obj, attname) != value:
+            setattr(obj, attname, value)
+            changed.add(obj._meta.get_field(attname).name)
+    return changed
 
 
 def create_groups(df: pd.DataFrame):
@@ -157,41 +172,14 @@ def create_groups(df: pd.DataFrame):
     # col names for groups:
     # active, accession_number, species, population_male, population_female,
     # population_unknown, enclosure, population_total
-    for _, row in df.iterrows():
-        attributes = get_group_attributes(row)
+    attributes = get_animal_set_attributes(df)
+    attributes["population_male"] = df["Population _Male"]
+    attributes["population_female"] = df["Population _Female"]
+    attributes["population_unknown"] = df["Population _Unknown"]
+    attributes["population_total"] = pop_sum
 
-        # * This overrides anything in the database for this accession number
-        Group.objects.update_or_create(
-            accession_number=attributes.pop("accession_number"), defaults=attributes
-        )
-
-
-def get_animal_attributes(row):
-    # zootable animal col names:
-    # name, active, accession, species, Tag /Band, Internal  House  Name, enclosure, sex
-
-    # todo: we need to always make sure we grab _all_ the attributes
-
-    active, accession_number, species, enclosure = get_animal_set_info(row)
-    name = (
-        row["Internal  House  Name"]
-        if not pd.isna(row["Internal  House  Name"])
-        else ""
-    )
-    identifier = row["Tag /Band"] if not pd.isna(row["Tag /Band"]) else ""
-    sex = get_sex(row)
-
-    attributes = {
-        "accession_number": accession_number,
-        "name": name,
-        "identifier": identifier,
-        "active": active,
-        "sex": sex,
-        "enclosure": enclosure,
-        "species": species,
-    }
-
-    return attributes
+    # * This overrides anything in the database for this accession number
+    upsert_animal_sets(Group, attributes)
 
 
 def create_animals(df: pd.DataFrame) -> list[Animal]:
@@ -209,42 +197,104 @@ def create_animals(df: pd.DataFrame) -> list[Animal]:
     except AssertionError:
         raise ValueError("Cannot create individuals. Not all have a pop. of 1")
 
-    created_animals = []
-    for _, row in df.iterrows():
-        attributes = get_animal_attributes(row)
+    # zootable animal col names:
+    # name, active, accession, species, Tag /Band, Internal  House  Name, enclosure, sex
+    attributes = get_animal_set_attributes(df)
+    attributes["name"] = df["Internal  House  Name"].fillna("")
+    attributes["identifier"] = df["Tag /Band"].fillna("")
+    attributes["sex"] = get_sex_col(df)
 
-        # * This overrides anything in the database for this accession number
-        animal, _ = Animal.objects.update_or_create(
-            accession_number=attributes.pop("accession_number"), defaults=attributes
-        )
-        created_animals.append(animal)
-    return created_animals
+    # * This overrides anything in the database for this accession number
+    return upsert_animal_sets(Animal, attributes)
 
 
-def change_obj_active_state(model, accession_number, active_state):
-    """Marks an animal/group active/inactive"""
-    obj = model.objects.get(accession_number=accession_number)
-    obj.active = active_state
-    obj.save()
+def get_sex_col(df: pd.DataFrame) -> pd.Series:
+    """the sex (M/F/U) of each animal in the dataframe"""
+    # population values are secondary, start with sex being unknown
+    sex = pd.Series("U", index=df.index)
+    sex[df["Population _Male"] == 1] = "M"
+    sex[df["Population _Female"] == 1] = "F"
+    # use sex column as primary
+    return df["Sex"].where(df["Sex"].notna(), sex)
+
+
+def get_animal_set_attributes(df: pd.DataFrame) -> pd.DataFrame:
+    """the attributes common to all animal_sets (active, accession number, species and
+    enclosure) for every row of the dataframe
+    Species and enclosures are looked up with a single query each"""
+    species = Species.objects.in_bulk(set(df["Common"]), field_name="common_name")
+    enclosures = Enclosure.objects.in_bulk(set(df["Enclosure"]), field_name="name")
+
+    missing_species = set(df["Common"]) - set(species)
+    if missing_species:
+        raise Species.DoesNotExist(f"Species not found: {', '.join(missing_species)}")
+    missing_enclosures = set(df["Enclosure"]) - set(enclosures)
+    if missing_enclosures:
+        raise Enclosure.DoesNotExist(
+            f"Enclosures not found: {', '.join(missing_enclosures)}"
+        )
+
+    return pd.DataFrame(
+        {
+            "accession_number": df["Accession"],
+            "active": True,
+            "species_id": df["Common"].map(lambda c: species[c].id),
+            "enclosure_id": df["Enclosure"].map(lambda e: enclosures[e].id),
+        },
+        index=df.index,
+    )
 
 
-def get_species_obj(row):
-    # common names are unique
-    return Species.objects.get(common_name=row["Common"])
+@transaction.atomic
+def upsert_animal_sets(model, attributes: pd.DataFrame) -> list:
+    """Creates or updates animals/groups (keyed by accession number) in bulk
+    attributes has a column per field (attname) and a row per animal/group
+    Returns the animals/groups in the order of the rows
+    """
 
+    # the last row for an accession number wins
+    attributes = attributes.drop_duplicates(subset=["accession_number"], keep="last")
+    records = attributes.to_dict("records")
 
-def get_enclosure_obj(row):
-    """Returns an Enclosure object from database given its name"""
-    return Enclosure.objects.get(name=row["Enclosure"])
+    accession_numbers = list(attributes["accession_number"])
+    existing = model.objects.in_bulk(accession_numbers, field_name="accession_number")
 
+    # slugs are made from the accession number, setting them here avoids a query per
+    # object to make them unique (unless it's somehow already taken)
+    new_slugs = [slugify(a) for a in accession_numbers if a not in existing]
+    taken_slugs = set()
+    if new_slugs:
+        taken_slugs = set(
+            model.objects.filter(slug__in=new_slugs).values_list("slug", flat=True)
+        )
 
-def get_animal_set_info(row):
-    """returns data common to all animal_sets"""
-    active = True
-    accession_number = row["Accession"]
-    species = get_species_obj(row)
-    enclosure = get_enclosure_obj(row)
-    return active, accession_number, species, enclosure
+    objs, to_create, to_update, update_fields = [], [], [], set()
+    for record in records:
+        obj = existing.get(record["accession_number"])
+        if obj is None:
+            obj = model(**record)
+            slug = slugify(obj.accession_number)
+            if slug not in taken_slugs:
+                obj.slug = slug
+            to_create.append(obj)
+        elif changed := set_changed_attributes(obj, record):
+            to_update.append(obj)
+            update_fields |= changed
+        objs.append(obj)
+
+    model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    # only the fields that changed, the update is a CASE WHEN per field and object
+    if to_update:
+        bulk_update(model, to_update, update_fields)
+
+    return objs
+
+
+def change_obj_active_state(model, accession_numbers, active_state):
+    """Marks animals/groups active/inactive"""
+    model.objects.filter(accession_number__in=accession_numbers).update(
+        active=active_state, updated=timezone.now()
+    )
 
 
 def find_animals_groups(df):
@@ -274,9 +324,11 @@ def get_objs_to_delete(df, modeltype, enclosure_names):
 
     # "active" animals/groups in included enclosures that aren't in uploaded accession
     # nums need to be deleted
-    objs_to_delete = modeltype.objects.filter(
-        active=True, enclosure__in=enclosure_objects
-    ).exclude(accession_number__in=upload_accession_numbers)
+    objs_to_delete = (
+        modeltype.objects.filter(active=True, enclosure__in=enclosure_objects)
+        .exclude(accession_number__in=upload_accession_numbers)
+        .select_related("species", "enclosure")
+    )
 
     for obj in objs_to_delete:
         obj_attrs = obj.to_dict()
@@ -292,38 +344,83 @@ def get_objs_to_delete(df, modeltype, enclosure_names):
     return changesets
 
 
+def get_upload_attributes(df: pd.DataFrame, modeltype) -> pd.DataFrame:
+    """The uploaded values (as they'd be saved) for the fields of the modeltype
+    keyed by the lookups to compare them against in the db"""
+
+    attributes = {
+        "accession_number": df["Accession"],
+        "enclosure__name": df["Enclosure"],
+    }
+    attributes.update(
+        {f"species__{field}": df[col] for col, field in SPECIES_COLS.items()}
+    )
+
+    if modeltype is Animal:
+        attributes["name"] = df["Internal  House  Name"]
+        attributes["identifier"] = df["Tag /Band"]
+        attributes["sex"] = get_sex_col(df)
+    else:
+        attributes["population_male"] = df["Population _Male"]
+        attributes["population_female"] = df["Population _Female"]
+        attributes["population_unknown"] = df["Population _Unknown"]
+
+    upload = pd.DataFrame(attributes, index=df.index)
+    # char fields are saved as strings, blanks as ""
+    text_cols = upload.columns.drop(
+        ["population_male", "population_female", "population_unknown"],
+        errors="ignore",
+    )
+    upload[text_cols] = upload[text_cols].fillna("").astype(str)
+    return upload
+
+
 def get_modeltype_changeset(df, modeltype):
     """Generic way to get list of changesets
-    Iterate over every object
-    For each object, determine if any of its attributes changed
-    Record changes as a changeset for that object
+    Compares every uploaded row with the object in the db with that accession number
+    (fetched with a single query)
+    Record changes as a changeset for that object:
+    "add" if it doesn't exist, "update" if any of its attributes changed,
+    otherwise "unchanged"
     """
 
-    add_update_changesets = []
+    if len(df.index) == 0:
+        return []
 
-    for _, row in df.iterrows():
-        try:
-            # if this doesn't fail, an entry exists for that modeltype
-            modeltype.objects.get(accession_number=row["Accession"])
+    upload = get_upload_attributes(df, modeltype)
+    compare_cols = list(upload.columns.drop("accession_number"))
 
-            # * this is not necessarily an update if there's been no change
-            # TODO: separate type added if nothing changed
-            add_update_changesets.append(
-                create_changeset_action(
-                    "update", object_kwargs=row.to_dict(), enclosure=row["Enclosure"]
-                )
-            )
-        except ObjectDoesNotExist:
-            # an addition for this modeltype
-            add_update_changesets.append(
-                create_changeset_action(
-                    "add", object_kwargs=row.to_dict(), enclosure=row["Enclosure"]
-                )
-            )
+    existing = pd.DataFrame.from_records(
+        modeltype.objects.filter(
+            accession_number__in=set(upload["accession_number"])
+        ).values("accession_number", "active", *compare_cols),
+        columns=["accession_number", "active", *compare_cols],
+    )
 
-            # todo: check to see if it's a deletion of the other model type here?
+    merged = upload.merge(
+        existing,
+        on="accession_number",
+        how="left",
+        suffixes=("", "_db"),
+        indicator=True,
+    )
 
-    add_update_changesets.sort(key=itemgetter("enclosure"))
+    # inactive ones are reactivated
+    changed = merged["active"].ne(True)
+    for col in compare_cols:
+        changed |= merged[col] != merged[f"{col}_db"]
+
+    actions = pd.Series("unchanged", index=merged.index)
+    actions[changed] = "update"
+    actions[merged["_merge"] == "left_only"] = "add"
+
+    add_update_changesets = [
+        create_changeset_action(action, object_kwargs=row, enclosure=row["Enclosure"])
+        for action, row in zip(actions, df.to_dict("records"))
+    ]
+
+    # grouped by action within an enclosure for the confirm page
+    add_update_changesets.sort(key=itemgetter("enclosure", "action"))
 
     return add_update_changesets
 
@@ -372,10 +469,10 @@ def handle_upload(f):
     return changeset
 
 
+@transaction.atomic
 def ingest_changesets(changesets):
     # create new enclosures
-    for enc_name in changesets.get("enclosures"):
-        create_enclosure_name(enc_name)
+    create_enclosures(pd.DataFrame({"Enclosure": changesets.get("enclosures")}))
 
     # create new species
     anim_add_dict = [
@@ -407,8 +504,9 @@ def ingest_changesets(changesets):
         for value in changesets.get("animals")
         if value["action"] == "del"
     ]
-    for obj in inactive_animals:
-        change_obj_active_state(Animal, obj["accession_number"], False)
+    change_obj_active_state(
+        Animal, [obj["accession_number"] for obj in inactive_animals], False
+    )
 
     # make inactive groups
     inactive_groups = [
@@ -416,5 +514,12 @@ def ingest_changesets(changesets):
         for value in changesets.get("groups")
         if value["action"] == "del"
     ]
-    for obj in inactive_groups:
-        change_obj_active_state(Group, obj["accession_number"], False)
+    change_obj_active_state(
+        Group, [obj["accession_number"] for obj in inactive_groups], False
+    )
+
+    # animals/groups were written in bulk, which doesn't send the signals
+    invalidate_all_cards()
+    EnclosureSpecies.refresh()
+    # counts of deactivated animals and groups drop out of today's summaries
+    EnclosureDailySummary.refresh_existing()
@@ -0,0 +1,120 @@
+"""Runs the queued jobs (see models.Job), from the run_jobs management command"""
+
+import datetime
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .export import (
+    EXPORT_WRITERS,
+    export_filename,
+    export_queryset,
+    export_rows,
+    log_no_data,
+)
+from .ingest import ingest_changesets
+from .models import Enclosure, Job, PendingUpload
+
+baselogger = logging.getLogger("zootable")
+LOGGER = baselogger.getChild(__name__)
+
+
+JOB_FAILED_MESSAGE = "Something went wrong, please try again or contact an admin"
+
+
+class JobError(Exception):
+    """A job that can't be done, the message is shown to the user"""
+
+
+def run_export(job: Job):
+    """writes the export to the job's result file"""
+    enclosures = Enclosure.objects.filter(id__in=job.params["enclosures"]).order_by(
+        "name"
+    )
+    start_date = datetime.date.fromisoformat(job.params["start_date"])
+    end_date = datetime.date.fromisoformat(job.params["end_date"])
+    file_format = job.params["file_format"]
+
+    columns, rows = export_rows(export_queryset(enclosures, start_date, end_date))
+    if columns is None:
+        log_no_data(enclosures, start_date, end_date)
+        raise JobError("No data in range")
+
+    write, content_type = EXPORT_WRITERS[file_format]
+    # written to disk as the counts are read, not kept in memory
+    with tempfile.TemporaryFile() as f:
+        write(columns, rows, f)
+        f.seek(0)
+        job.finish(
+            result=f,
+            filename=export_filename(enclosures, start_date, end_date, file_format),
+            content_type=content_type,
+        )
+
+
+def run_upload(job: Job):
+    """saves the changes of a confirmed upload"""
+    pending_upload = (
+        PendingUpload.unexpired()
+        .filter(id=job.params["pending_upload"], user=job.user)
+        .first()
+    )
+    if pending_upload is None:
+        raise JobError("Upload expired, please upload the file again")
+
+    ingest_changesets(pending_upload.changesets)
+    pending_upload.delete()
+
+    LOGGER.info("Uploaded data")
+    job.finish(message="Saved")
+
+
+RUNNERS = {Job.EXPORT: run_export, Job.UPLOAD: run_upload}
+
+
+@contextmanager
+def heartbeat(job: Job):
+    """
+    Updates the job's heartbeat (in a thread, w/ its own db connection) while it runs,
+    so however long it takes it's not taken to be left by a dead worker
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(Job.HEARTBEAT_INTERVAL.total_seconds()):
+                job.beat()
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job: Job):
+    try:
+        with heartbeat(job):
+            RUNNERS[job.kind](job)
+    except JobError as e:
+        job.fail(str(e))
+    except Exception:
+        # the details are in the log, not shown to the user
+        LOGGER.exception(f"error running {job.kind} job")
+        job.fail(JOB_FAILED_MESSAGE)
+
+
+def run_next_job() -> Job | None:
+    """runs the oldest queued job, returns it (None if there are no queued jobs)"""
+    Job.recover_stale()
+    job = Job.claim_next()
+    if job is not None:
+        run_job(job)
+    return job
@@ -0,0 +1,263 @@
+"""Generates a synthetic zoo (species, enclosures, animals, groups and years of daily
+counts of them all) to benchmark against, see benchmarks/
+Only run it against a scratch database!
+Callable:
+python manage.py generate_zoo --enclosures 300 --animals 5000 --groups 800 --years 3
+"""
+
+import csv
+import io
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from zoo_checks.helpers import today_time
+from zoo_checks.models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    EnclosureDailySummary,
+    EnclosureSpecies,
+    Group,
+    GroupCount,
+    Role,
+    Species,
+    SpeciesCount,
+)
+
+# names of everything generated start with this
+PREFIX = "gen"
+USERNAME = f"{PREFIX}-user"
+
+# accession numbers are 6 characters, generated ones start at
+ACCESSION_START = 700000
+
+# how often each condition is counted
+CONDITION_WEIGHTS = {
+    AnimalCount.SEEN: 80,
+    AnimalCount.BAR: 10,
+    AnimalCount.NEEDSATTENTION: 4,
+    AnimalCount.ABSENT: 2,
+    AnimalCount.NOT_OBSERVED: 4,
+}
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic zoo with years of daily counts, for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enclosures", type=int, default=300)
+        parser.add_argument("--animals", type=int, default=5000)
+        parser.add_argument("--groups", type=int, default=800)
+        parser.add_argument("--species", type=int, default=400)
+        parser.add_argument(
+            "--years", type=float, default=3, help="years of daily counts"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=100000, help="counts per COPY"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="random seed")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username=USERNAME).exists():
+            raise CommandError("There's already a generated zoo in this database")
+
+        start = time.perf_counter()
+        rng = random.Random(options["seed"])
+
+        with transaction.atomic():
+            user, enclosures, animals, groups = self.generate_zoo(rng, **options)
+            EnclosureSpecies.refresh()
+        self.stdout.write(
+            f"Generated {len(enclosures)} enclosures, {len(animals)} animals and "
+            f"{len(groups)} groups"
+        )
+
+        days = [
+            today_time() - timezone.timedelta(days=d)
+            for d in range(round(options["years"] * 365))
+        ]
+        num_counts = self.generate_counts(
+            rng, user, animals, groups, days, options["batch_size"]
+        )
+        self.stdout.write(f"Generated {num_counts} counts over {len(days)} days")
+
+        for enclosure in enclosures:
+            EnclosureDailySummary.refresh(enclosure)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        self.stdout.write(f"Done in {time.perf_counter() - start:.0f}s")
+
+    def generate_zoo(self, rng, **options):
+        user = User.objects.create_user(USERNAME, first_name="Generated")
+        role = Role.objects.create(name=f"{PREFIX} role")
+        role.users.add(user)
+
+        species = Species.objects.bulk_create(
+            Species(
+                common_name=f"{PREFIX} species {s}",
+                class_name=f"class {s % 5}",
+                order_name=f"order {s % 20}",
+                family_name=f"family {s % 60}",
+                genus_name=f"genus {s % 150}",
+                species_name=f"species {s}",
+            )
+            for s in range(options["species"])
+        )
+        enclosures = Enclosure.objects.bulk_create(
+            Enclosure(name=f"{PREFIX} enclosure {e}")
+            for e in range(options["enclosures"])
+        )
+        role.enclosures.add(*enclosures)
+
+        # each enclosure has a few species
+        enclosure_species = {
+            enclosure: rng.sample(species, min(rng.randint(1, 6), len(species)))
+            for enclosure in enclosures
+        }
+
+        accession_numbers = (str(a) for a in range(ACCESSION_START, 10**6))
+        animals = []
+        for a in range(options["animals"]):
+            enclosure = rng.choice(enclosures)
+            accession_number = next(accession_numbers)
+            animals.append(
+                Animal(
+                    accession_number=accession_number,
+                    slug=accession_number,
+                    name=f"{PREFIX} animal {a}",
+                    identifier=f"tag {a}",
+                    sex=rng.choice("MFU"),
+                    species=rng.choice(enclosure_species[enclosure]),
+                    enclosure=enclosure,
+                )
+            )
+        groups = []
+        for _ in range(options["groups"]):
+            enclosure = rng.choice(enclosures)
+            accession_number = next(accession_numbers)
+            population = [rng.randint(0, 10) for _ in range(3)]
+            population[2] += 2
+            groups.append(
+                Group(
+                    accession_number=accession_number,
+                    slug=accession_number,
+                    species=rng.choice(enclosure_species[enclosure]),
+                    enclosure=enclosure,
+                    population_male=population[0],
+                    population_female=population[1],
+                    population_unknown=population[2],
+                    population_total=sum(population),
+                )
+            )
+        Animal.objects.bulk_create(animals, batch_size=1000)
+        Group.objects.bulk_create(groups, batch_size=1000)
+
+        return user, enclosures, animals, groups
+
+    def generate_counts(self, rng, user, animals, groups, days, batch_size) -> int:
+        """a count of every animal, group and species (in each of their enclosures)
+        on each day"""
+        conditions = list(CONDITION_WEIGHTS)
+        weights = list(CONDITION_WEIGHTS.values())
+        species_enclosures = sorted(
+            {(obj.species_id, obj.enclosure_id) for obj in [*animals, *groups]}
+        )
+
+        def day_rows(day):
+            # counted during the day
+            dt = day + timezone.timedelta(hours=8, minutes=rng.randrange(9 * 60))
+            common = (dt.isoformat(), dt.isoformat(), day.date().isoformat(), user.id)
+            animal_rows = [
+                (*common, animal.enclosure_id, animal.id, condition, "")
+                for animal, condition in zip(
+                    animals, rng.choices(conditions, weights, k=len(animals))
+                )
+            ]
+            group_rows = []
+            for group in groups:
+                total = group.population_total
+                count_seen = rng.randint(0, total)
+                group_rows.append(
+                    (
+                        *common,
+                        group.enclosure_id,
+                        group.id,
+                        total,
+                        count_seen,
+                        total - count_seen,
+                        rng.randint(0, count_seen),
+                        rng.random() < 0.02,
+                        "",
+                    )
+                )
+            species_rows = [
+                (*common, enclosure_id, species_id, rng.randint(0, 20))
+                for species_id, enclosure_id in species_enclosures
+            ]
+            return animal_rows, group_rows, species_rows
+
+        count_fields = [
+            "datetimecounted",
+            "updated",
+            "datecounted",
+            "user",
+            "enclosure",
+        ]
+        models_fields = (
+            (AnimalCount, [*count_fields, "animal", "condition", "comment"]),
+            (
+                GroupCount,
+                [
+                    *count_fields,
+                    "group",
+                    "count_total",
+                    "count_seen",
+                    "count_not_seen",
+                    "count_bar",
+                    "needs_attn",
+                    "comment",
+                ],
+            ),
+            (SpeciesCount, [*count_fields, "species", "count"]),
+        )
+
+        num_counts = 0
+        batches = [[], [], []]
+        for i, day in enumerate(days):
+            for batch, rows in zip(batches, day_rows(day)):
+                batch.extend(rows)
+            if sum(map(len, batches)) >= batch_size or i == len(days) - 1:
+                for (model, fields), batch in zip(models_fields, batches):
+                    copy_rows(model, fields, batch)
+                    num_counts += len(batch)
+                    batch.clear()
+                self.stdout.write(f"{day.date()}: {num_counts} counts")
+
+        return num_counts
+
+
+def copy_rows(model, field_names, rows):
+    """inserts rows (of values of the fields) into a model's table with COPY,
+    far faster than bulk_create for millions of rows"""
+    f = io.StringIO()
+    # strings are quoted, so blanks aren't null
+    csv.writer(f, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    f.seek(0)
+
+    opts = model._meta
+    columns = ", ".join(
+        connection.ops.quote_name(opts.get_field(name).column) for name in field_names
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(opts.db_table)} ({columns}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            f,
+        )
@@ -0,0 +1,46 @@
+"""Worker that runs queued jobs (exports, uploads), next to the web server
+Callable:
+python manage.py run_jobs
+"""
+
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from zoo_checks.jobs import run_next_job
+
+
+class Command(BaseCommand):
+    help = "Runs queued jobs (exports, uploads)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="run the queued jobs, then exit"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2,
+            help="seconds to wait between checking for jobs",
+        )
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            # the cached data its jobs change would only be dropped in this process
+            self.stderr.write(
+                "the cache is per process (CACHE_BACKEND=locmem), the web server won't "
+                "see the jobs' changes until its cached data expires"
+            )
+        while True:
+            # like a request, don't hold on to a broken or stale connection
+            close_old_connections()
+            job = run_next_job()
+            if job is not None:
+                self.stdout.write(f"{job}: {job.message}")
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
@@ -0,0 +1,93 @@
+"""Middleware that times the database queries of requests"""
+
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+
+baselogger = logging.getLogger("zootable")
+LOGGER = baselogger.getChild(__name__)
+
+# longest slowest query sql that's logged
+MAX_SQL_LENGTH = 500
+
+
+class QueryTimer:
+    """execute_wrapper that counts and times the queries run through it"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_sql = ""
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration > self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+
+class QueryTimingMiddleware:
+    """
+    Records the number of queries, total db time and slowest query of requests, and
+    adds them to the response's Server-Timing header (the total time for everyone, the
+    db timings only w/ DEBUG on or for staff users)
+
+    Requests slower than QUERY_TIMING_SLOW_MS are logged to the zootable log as warnings,
+    and a sample (QUERY_TIMING_LOG_SAMPLE_RATE) of the rest as info
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = timer.duration * 1000
+
+        timings = [f"app;dur={total_ms:.1f}"]
+        user = getattr(request, "user", None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            timings[:0] = [
+                f'db;dur={db_ms:.1f};desc="{timer.count} queries"',
+                f"slowest;dur={timer.slowest_duration * 1000:.1f}",
+            ]
+        response["Server-Timing"] = ", ".join(timings)
+
+        slow = total_ms >= settings.QUERY_TIMING_SLOW_MS
+        if not slow and random.random() >= settings.QUERY_TIMING_LOG_SAMPLE_RATE:
+            return response
+
+        resolver_match = request.resolver_match
+        extra = {
+            "path": request.path,
+            "view": resolver_match.view_name if resolver_match else None,
+            "status_code": response.status_code,
+            "queries": timer.count,
+            "db_ms": round(db_ms, 1),
+            "total_ms": round(total_ms, 1),
+            "slowest_query_ms": round(timer.slowest_duration * 1000, 1),
+            "slowest_query": timer.slowest_sql[:MAX_SQL_LENGTH],
+        }
+        msg = (
+            f"{request.method} {request.path} {total_ms:.0f}ms, "
+            f"{timer.count} queries in {db_ms:.0f}ms"
+        )
+        if slow:
+            LOGGER.warning(f"slow request {msg}", extra=extra)
+        else:
+            LOGGER.info(msg, extra=extra)
+
+        return response
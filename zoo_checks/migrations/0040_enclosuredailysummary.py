@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0012_auto_20190609_0013_squashed_0039_auto_20200724_2335'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnclosureDailySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datecounted', models.DateField()),
+                ('animals_bar', models.PositiveIntegerField(default=0)),
+                ('animals_seen', models.PositiveIntegerField(default=0)),
+                ('animals_attn', models.PositiveIntegerField(default=0)),
+                ('animals_absent', models.PositiveIntegerField(default=0)),
+                ('animals_not_observed', models.PositiveIntegerField(default=0)),
+                ('groups_seen', models.PositiveIntegerField(default=0)),
+                ('groups_bar', models.PositiveIntegerField(default=0)),
+                ('groups_needs_attn', models.PositiveIntegerField(default=0)),
+                ('total_animals', models.PositiveIntegerField(default=0)),
+                ('total_groups', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('enclosure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='zoo_checks.enclosure')),
+            ],
+            options={
+                'verbose_name_plural': 'enclosure daily summaries',
+                'ordering': ('-datecounted',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='enclosuredailysummary',
+            constraint=models.UniqueConstraint(fields=('enclosure', 'datecounted'), name='unique_enclosure_daily_summary'),
+        ),
+    ]
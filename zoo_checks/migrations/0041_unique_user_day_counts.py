@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+COUNT_SUBJECTS = (
+    ("AnimalCount", "animal"),
+    ("GroupCount", "group"),
+    ("SpeciesCount", "species"),
+)
+
+
+def remove_duplicate_counts(apps, schema_editor):
+    """
+    Deletes all but the earliest count per user, day, subject and enclosure, so they
+    can be unique. The earliest is the one the export has shown for the day, and
+    later counts of a day are saved to it from now on.
+
+    The deleted counts are lost (not reversible), back up the count tables first to
+    keep them.
+    """
+    for model_name, subject in COUNT_SUBJECTS:
+        model = apps.get_model("zoo_checks", model_name)
+        key = ["user_id", "datecounted", f"{subject}_id", "enclosure_id"]
+        # nulls never conflict in the unique constraint
+        counts = model.objects.filter(user__isnull=False, enclosure__isnull=False)
+        earliest = (
+            counts.order_by(*key, "datetimecounted", "id").distinct(*key).values("id")
+        )
+        counts.exclude(id__in=earliest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0040_enclosuredailysummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_counts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='animalcount',
+            constraint=models.UniqueConstraint(fields=('user', 'datecounted', 'animal', 'enclosure'), name='unique_user_day_animal_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupcount',
+            constraint=models.UniqueConstraint(fields=('user', 'datecounted', 'group', 'enclosure'), name='unique_user_day_group_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='speciescount',
+            constraint=models.UniqueConstraint(fields=('user', 'datecounted', 'species', 'enclosure'), name='unique_user_day_species_count'),
+        ),
+    ]
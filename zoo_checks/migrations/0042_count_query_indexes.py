@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # the indexes are built w/o locking the count tables against writes, which can't
+    # be done in a transaction
+    atomic = False
+
+    dependencies = [
+        ('zoo_checks', '0041_unique_user_day_counts'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='animalcount',
+            index=models.Index(fields=['animal', 'datetimecounted', 'id'], name='animalcount_latest_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='animalcount',
+            index=models.Index(fields=['enclosure', 'datetimecounted'], name='animalcount_enc_day_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='groupcount',
+            index=models.Index(fields=['group', 'datetimecounted', 'id'], name='groupcount_latest_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='groupcount',
+            index=models.Index(fields=['enclosure', 'datetimecounted'], name='groupcount_enc_day_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='speciescount',
+            index=models.Index(fields=['enclosure', 'datetimecounted'], name='speciescount_enc_day_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_enclosure_species(apps, schema_editor):
+    """same as EnclosureSpecies.refresh, which the historical model doesn't have"""
+    EnclosureSpecies = apps.get_model("zoo_checks", "EnclosureSpecies")
+    members = {}
+    for model_name, field in (("Animal", "num_animals"), ("Group", "num_groups")):
+        model = apps.get_model("zoo_checks", model_name)
+        totals = (
+            model.objects.filter(active=True, enclosure__isnull=False)
+            .values("enclosure", "species")
+            .annotate(num=models.Count("id"))
+        )
+        for total in totals:
+            member = members.setdefault(
+                (total["enclosure"], total["species"]),
+                EnclosureSpecies(
+                    enclosure_id=total["enclosure"], species_id=total["species"]
+                ),
+            )
+            setattr(member, field, total["num"])
+    EnclosureSpecies.objects.bulk_create(members.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0044_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnclosureSpecies',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_animals', models.PositiveIntegerField(default=0)),
+                ('num_groups', models.PositiveIntegerField(default=0)),
+                ('enclosure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enclosure_species', to='zoo_checks.enclosure')),
+                ('species', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enclosure_species', to='zoo_checks.species')),
+            ],
+            options={
+                'verbose_name_plural': 'enclosure species',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='enclosurespecies',
+            constraint=models.UniqueConstraint(fields=('enclosure', 'species'), name='unique_enclosure_species'),
+        ),
+        migrations.RunPython(populate_enclosure_species, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+import zoo_checks.models
+
+
+class Migration(migrations.Migration):
+    """the job's result is a file in the exports storage, instead of its bytes
+    (finished jobs' results aren't kept, they expire in a week anyway)"""
+
+    dependencies = [
+        ("zoo_checks", "0045_enclosurespecies"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="job",
+            name="result",
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="result",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                storage=zoo_checks.models.export_storage,
+                upload_to="",
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
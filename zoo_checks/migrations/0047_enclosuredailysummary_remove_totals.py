@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 04:32
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0046_job_result_file'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='enclosuredailysummary',
+            name='total_animals',
+        ),
+        migrations.RemoveField(
+            model_name='enclosuredailysummary',
+            name='total_groups',
+        ),
+    ]
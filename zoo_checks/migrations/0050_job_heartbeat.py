@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:15
+
+from django.db import migrations, models
+
+
+def set_running_heartbeats(apps, schema_editor):
+    """jobs already running are recovered (if need be) from when they started"""
+    Job = apps.get_model("zoo_checks", "Job")
+    Job.objects.filter(status="R").update(heartbeat=models.F("started"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0049_updated_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(set_running_heartbeats, migrations.RunPython.noop),
+    ]
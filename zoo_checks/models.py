@@ -1,14 +1,19 @@
+import math
 from datetime import datetime
+from functools import cached_property
 from itertools import chain
+from typing import ClassVar
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
-from django.db.models.functions import Upper
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Upper
 from django.utils import timezone
 from django_extensions.db.fields import AutoSlugField
 
-from .helpers import today_time
+from .helpers import prior_day_counts, today_time
 
 
 class Enclosure(models.Model):
@@ -20,17 +25,10 @@ class Enclosure(models.Model):
         return self.name
 
     def species(self):
-        """Combines exhibit's animals' species and groups' species together
-        into a distinct queryset of species
+        """Species of the exhibit's active animals and groups
+        (see EnclosureSpecies)
         """
-        animals = self.animals.filter(active=True).order_by(
-            "species__common_name", "name"
-        )
-        groups = self.groups.filter(active=True).order_by("species__common_name")
-        animal_species = Species.objects.filter(animal__in=animals)
-        group_species = Species.objects.filter(group__in=groups)
-
-        return (animal_species | group_species).distinct()
+        return Species.objects.filter(enclosure_species__enclosure=self)
 
     def animals_groups(self):
         animals = self.animals.filter(active=True)
@@ -63,8 +61,8 @@ class Enclosure(models.Model):
                 datetimecounted__lt=day + timezone.timedelta(days=1),
                 enclosure=self,
             )
-            .order_by("animal__accession_number", "-datetimecounted")
-            .distinct("animal__accession_number")
+            .order_by("animal_id", "-datetimecounted", "-id")
+            .distinct("animal_id")
         )
 
     def group_counts_on_day(self, day=None):
@@ -78,8 +76,8 @@ class Enclosure(models.Model):
                 datetimecounted__lt=day + timezone.timedelta(days=1),
                 enclosure=self,
             )
-            .order_by("group__accession_number", "-datetimecounted")
-            .distinct("group__accession_number")
+            .order_by("group_id", "-datetimecounted", "-id")
+            .distinct("group_id")
         )
 
     @classmethod
@@ -105,8 +103,8 @@ class Enclosure(models.Model):
                 datetimecounted__lt=day + timezone.timedelta(days=1),
             )
             .select_related("group", "enclosure")
-            .order_by("group__accession_number", "-datetimecounted")
-            .distinct("group__accession_number")
+            .order_by("group_id", "-datetimecounted", "-id")
+            .distinct("group_id")
         )
 
         animal_counts = (
@@ -117,12 +115,45 @@ class Enclosure(models.Model):
                 datetimecounted__lt=day + timezone.timedelta(days=1),
             )
             .select_related("animal", "enclosure")
-            .order_by("animal__accession_number", "-datetimecounted")
-            .distinct("animal__accession_number")
+            .order_by("animal_id", "-datetimecounted", "-id")
+            .distinct("animal_id")
         )
 
         return animal_counts, group_counts
 
+    @classmethod
+    def annotate_totals(cls, enclosures):
+        """
+        annotates a queryset of enclosures with their number of active animals/groups
+        and the active groups' total population
+        These are subqueries so any joins in the enclosures query don't inflate them
+        """
+        animals = (
+            Animal.objects.filter(enclosure=models.OuterRef("pk"), active=True)
+            .order_by()
+            .values("enclosure")
+        )
+        groups = (
+            Group.objects.filter(enclosure=models.OuterRef("pk"), active=True)
+            .order_by()
+            .values("enclosure")
+        )
+
+        return enclosures.annotate(
+            active_animals=Coalesce(
+                models.Subquery(animals.annotate(n=models.Count("id")).values("n")), 0
+            ),
+            active_groups=Coalesce(
+                models.Subquery(groups.annotate(n=models.Count("id")).values("n")), 0
+            ),
+            active_groups_population=Coalesce(
+                models.Subquery(
+                    groups.annotate(n=models.Sum("population_total")).values("n")
+                ),
+                0,
+            ),
+        )
+
     class Meta:
         ordering = [Upper("name")]
 
@@ -157,6 +188,9 @@ class Species(models.Model):
         unique=True,
     )
 
+    # when it was last saved (see api.changes)
+    updated = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return ", ".join((self.genus_name, self.species_name))
 
@@ -194,45 +228,9 @@ class Species(models.Model):
     def prior_counts(self, enclosure, prior_days=3, ref_date=None):
         """get all the prior counts returned in a list using a single query"""
 
-        if ref_date is None:
-            ref_date = today_time()
-
-        # we get the min and max days to search over
-        min_day = ref_date - timezone.timedelta(days=prior_days)
-        max_day = ref_date
-
-        # perform the query, returning only the latest counts, and distinct on dates
-        # need to sort by id because edited counts have the same date/datetimes
-        counts_q = (
-            self.counts.filter(
-                datetimecounted__gte=min_day,
-                datetimecounted__lt=max_day,
-                enclosure=enclosure,
-            )
-            .order_by("-datecounted", "-datetimecounted", "-id")
-            .distinct("datecounted")
-        )
-
-        # create the dict to index into
-        if counts_q:
-            counts_dict = {q.datecounted: q.count for q in counts_q}
-        else:
-            counts_dict = {}
-
-        # iterate over the days and return
-        counts = [0] * prior_days
-        for p in range(prior_days):
-            daytime = ref_date - timezone.timedelta(days=p + 1)
-            day = ref_date.date() - timezone.timedelta(days=p + 1)
-            day_count = counts_dict.get(day)
-
-            counts[p] = (
-                {"count": day_count, "day": daytime}
-                if day_count
-                else {"count": 0, "day": daytime}
-            )
-
-        return counts
+        return SpeciesCount.prior_counts(
+            [self], enclosure, prior_days=prior_days, ref_date=ref_date
+        )[self.id]
 
 
 class AnimalSet(models.Model):
@@ -243,6 +241,9 @@ class AnimalSet(models.Model):
 
     species = models.ForeignKey(Species, on_delete=models.CASCADE)
 
+    # when it was last saved (see api.changes)
+    updated = models.DateTimeField(auto_now=True)
+
     class Meta:
         abstract = True
 
@@ -258,10 +259,9 @@ class AnimalSet(models.Model):
                 continue
 
             # the change from model_to_dict(obj):
+            # (uses the related object if it was already fetched, e.g. select_related)
             if f.is_relation:
-                data[f.name] = str(
-                    f.related_model.objects.get(pk=f.value_from_object(self))
-                )
+                data[f.name] = str(getattr(self, f.name))
             else:
                 data[f.name] = f.value_from_object(self)
 
@@ -277,8 +277,13 @@ class Animal(AnimalSet):
     identifier = models.CharField(max_length=200)
     sex = models.CharField(max_length=1, choices=SEX, default="U")
 
+    # the bulk ingest sets slugs up front (see ingest.upsert_animal_sets)
     slug = AutoSlugField(
-        null=True, default=None, populate_from=["accession_number"], unique=True
+        null=True,
+        default=None,
+        populate_from=["accession_number"],
+        unique=True,
+        overwrite_on_add=False,
     )
 
     enclosure = models.ForeignKey(
@@ -327,38 +332,9 @@ class Animal(AnimalSet):
     def prior_conditions(self, prior_days=3, ref_date=None):
         """Given a set of animals, returns their counts from the prior N days"""
 
-        if ref_date is None:
-            ref_date = today_time()
-
-        # we get the min and max days to search over
-        min_day = ref_date - timezone.timedelta(days=prior_days)
-        max_day = ref_date
-
-        # perform the query, returning only the latest counts, and distinct on dates
-        # need to sort by id because edited counts have the same date/datetimes
-        counts_q = (
-            self.conditions.filter(
-                datetimecounted__gte=min_day, datetimecounted__lt=max_day
-            )
-            .order_by("-datecounted", "-datetimecounted", "-id")
-            .distinct("datecounted")
-        )
-
-        # create the dict to index into
-        if counts_q:
-            counts_dict = {q.datecounted: q for q in counts_q}
-        else:
-            counts_dict = {}
-
-        conds = [""] * prior_days
-        for p in range(prior_days):
-            daytime = ref_date - timezone.timedelta(days=p + 1)
-            day = ref_date.date() - timezone.timedelta(days=p + 1)
-
-            count = counts_dict.get(day)
-            conds[p] = {"count": count, "day": daytime}
-
-        return conds
+        return AnimalCount.prior_counts(
+            [self], prior_days=prior_days, ref_date=ref_date
+        )[self.id]
 
 
 class Group(AnimalSet):
@@ -369,8 +345,13 @@ class Group(AnimalSet):
     population_unknown = models.PositiveSmallIntegerField(default=0)
     population_total = models.PositiveSmallIntegerField(default=0)
 
+    # the bulk ingest sets slugs up front (see ingest.upsert_animal_sets)
     slug = AutoSlugField(
-        null=True, default=None, populate_from="accession_number", unique=True
+        null=True,
+        default=None,
+        populate_from="accession_number",
+        unique=True,
+        overwrite_on_add=False,
     )
 
     enclosure = models.ForeignKey(
@@ -406,37 +387,87 @@ class Group(AnimalSet):
     def prior_counts(self, prior_days=3, ref_date=None):
         """Prior counts using a single query"""
 
-        if ref_date is None:
-            ref_date = today_time()
+        return GroupCount.prior_counts(
+            [self], prior_days=prior_days, ref_date=ref_date
+        )[self.id]
 
-        # we get the min and max days to search over
-        min_day = ref_date - timezone.timedelta(days=prior_days)
-        max_day = ref_date
 
-        # perform the query, returning only the latest counts, and distinct on dates
-        # need to sort by id because edited counts have the same date/datetimes
-        counts_q = (
-            self.counts.filter(
-                datetimecounted__gte=min_day, datetimecounted__lt=max_day
-            )
-            .order_by("-datecounted", "-datetimecounted", "-id")
-            .distinct("datecounted")
+class EnclosureSpecies(models.Model):
+    """
+    The species of an enclosure's active animals/groups, so the tally page can list
+    them with a join instead of combining the animals' and groups' species
+
+    Kept current by `refresh` whenever an animal/group is saved (see signals.py) and
+    after an upload is ingested
+    """
+
+    enclosure = models.ForeignKey(
+        Enclosure, on_delete=models.CASCADE, related_name="enclosure_species"
+    )
+    species = models.ForeignKey(
+        Species, on_delete=models.CASCADE, related_name="enclosure_species"
+    )
+
+    # active animals and groups of the species in the enclosure
+    num_animals = models.PositiveIntegerField(default=0)
+    num_groups = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "enclosure species"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["enclosure", "species"], name="unique_enclosure_species"
+            ),
         )
 
-        # create the dict to index into
-        if counts_q:
-            counts_dict = {q.datecounted: q for q in counts_q}
-        else:
-            counts_dict = {}
+    def __str__(self):
+        return "|".join((str(self.enclosure), str(self.species)))
 
-        counts = [0] * prior_days
-        for p in range(prior_days):
-            daytime = ref_date - timezone.timedelta(days=p + 1)
-            day = ref_date.date() - timezone.timedelta(days=p + 1)
+    @classmethod
+    @transaction.atomic
+    def refresh(cls, enclosure_ids=None):
+        """Recomputes the species of the enclosures (all of them by default) from
+        their active animals/groups
+        Upserts the current ones and deletes only those that are gone, so refreshes
+        running at the same time don't conflict
+        """
+        members = {}
+        for model, field in ((Animal, "num_animals"), (Group, "num_groups")):
+            animal_sets = model.objects.filter(active=True, enclosure__isnull=False)
+            if enclosure_ids is not None:
+                animal_sets = animal_sets.filter(enclosure__in=enclosure_ids)
+            totals = animal_sets.values("enclosure", "species").annotate(
+                num=models.Count("id")
+            )
+            for total in totals:
+                member = members.setdefault(
+                    (total["enclosure"], total["species"]),
+                    cls(enclosure_id=total["enclosure"], species_id=total["species"]),
+                )
+                setattr(member, field, total["num"])
 
-            counts[p] = {"count": counts_dict.get(day), "day": daytime}
+        refreshed = cls.objects.bulk_create(
+            members.values(),
+            update_conflicts=True,
+            unique_fields=["enclosure", "species"],
+            update_fields=["num_animals", "num_groups"],
+        )
 
-        return counts
+        gone = cls.objects.all()
+        if enclosure_ids is not None:
+            gone = gone.filter(enclosure__in=enclosure_ids)
+        for model in (Animal, Group):
+            gone = gone.exclude(
+                models.Exists(
+                    model.objects.filter(
+                        active=True,
+                        enclosure=models.OuterRef("enclosure"),
+                        species=models.OuterRef("species"),
+                    )
+                )
+            )
+        gone.delete()
+        return refreshed
 
 
 class Count(models.Model):
@@ -446,10 +477,70 @@ class Count(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     enclosure = models.ForeignKey(Enclosure, on_delete=models.SET_NULL, null=True)
 
+    # when it was last saved, unlike datetimecounted this changes when a count of a
+    # past day is edited (see api.changes)
+    updated = models.DateTimeField(auto_now=True)
+
+    # what a later count by the same user on the same day overwrites
+    UPDATE_FIELDS = ()
+
     class Meta:
         abstract = True
         ordering = ["datetimecounted"]
 
+    @classmethod
+    def bulk_update_or_create(cls, counts):
+        """
+        Saves a list of counts in a single INSERT ... ON CONFLICT statement
+        same as update_or_create_from_form, a count that already exists for that user,
+        day, subject and enclosure gets updated
+        """
+        # a user's count of a subject (animal/group/species) in an enclosure on a day
+        (unique,) = (
+            c for c in cls._meta.constraints if isinstance(c, models.UniqueConstraint)
+        )
+        return cls.objects.bulk_create(
+            counts,
+            update_conflicts=True,
+            unique_fields=unique.fields,
+            update_fields=[*cls.UPDATE_FIELDS, "updated"],
+        )
+
+    @classmethod
+    def latest_by_day(cls, subject, subjects, prior_days=3, ref_date=None, **filters):
+        """
+        Latest count per subject (animal/group/species) per day over the prior N days
+        for a whole list/queryset of subjects, using a single query
+
+        Returns a dict keyed by subject id of dicts keyed by date
+        """
+        if ref_date is None:
+            ref_date = today_time()
+
+        # we get the min and max days to search over
+        min_day = ref_date - timezone.timedelta(days=prior_days)
+        max_day = ref_date
+
+        # perform the query, returning only the latest counts, and distinct on dates
+        # need to sort by id because edited counts have the same date/datetimes
+        subject_id = f"{subject}_id"
+        counts_q = (
+            cls.objects.filter(
+                **{f"{subject}__in": subjects},
+                datetimecounted__gte=min_day,
+                datetimecounted__lt=max_day,
+                **filters,
+            )
+            .order_by(subject_id, "-datecounted", "-datetimecounted", "-id")
+            .distinct(subject_id, "datecounted")
+        )
+
+        counts_dict = {}
+        for c in counts_q:
+            counts_dict.setdefault(getattr(c, subject_id), {})[c.datecounted] = c
+
+        return counts_dict
+
 
 class AnimalCount(Count):
     SEEN = "SE"
@@ -478,6 +569,28 @@ class AnimalCount(Count):
         Animal, on_delete=models.CASCADE, related_name="conditions"
     )
 
+    UPDATE_FIELDS = ("datetimecounted", "condition", "comment")
+
+    class Meta(Count.Meta):
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "datecounted", "animal", "enclosure"],
+                name="unique_user_day_animal_count",
+            ),
+        )
+        indexes = (
+            # latest count per animal on a day or days (latest_by_day, counts_on_day)
+            models.Index(
+                fields=["animal", "datetimecounted", "id"],
+                name="animalcount_latest_idx",
+            ),
+            # all counts in an enclosure on a day (see Enclosure.all_counts)
+            models.Index(
+                fields=["enclosure", "datetimecounted"],
+                name="animalcount_enc_day_idx",
+            ),
+        )
+
     def __str__(self):
         return "|".join(
             (
@@ -501,10 +614,25 @@ class AnimalCount(Count):
                 datetimecounted__gte=day,
                 datetimecounted__lt=day + timezone.timedelta(days=1),
             )
-            .order_by("animal__accession_number", "-datetimecounted")
-            .distinct("animal__accession_number")
+            .order_by("animal_id", "-datetimecounted", "-id")
+            .distinct("animal_id")
         )
 
+    @classmethod
+    def prior_counts(cls, animals, prior_days=3, ref_date=None) -> dict:
+        """Returns the counts from the prior N days for each animal in a list of
+        animals, keyed by animal id, using a single query
+        """
+        if ref_date is None:
+            ref_date = today_time()
+
+        counts = cls.latest_by_day("animal", animals, prior_days, ref_date)
+
+        return {
+            anim.id: prior_day_counts(counts.get(anim.id, {}), ref_date, prior_days)
+            for anim in animals
+        }
+
     def update_or_create_from_form(self):
         # we want the identifier to be:
         # user, datecounted, animal, enclosure?
@@ -522,6 +650,8 @@ class AnimalCount(Count):
             },
         )
 
+        EnclosureDailySummary.refresh(self.enclosure, self.datecounted)
+
 
 class GroupCount(Count):
     count_total = models.PositiveSmallIntegerField(default=0)
@@ -533,6 +663,36 @@ class GroupCount(Count):
 
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="counts")
 
+    UPDATE_FIELDS = (
+        "datetimecounted",
+        "count_total",
+        "count_seen",
+        "count_not_seen",
+        "count_bar",
+        "needs_attn",
+        "comment",
+    )
+
+    class Meta(Count.Meta):
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "datecounted", "group", "enclosure"],
+                name="unique_user_day_group_count",
+            ),
+        )
+        indexes = (
+            # latest count per group on a day or days (latest_by_day, counts_on_day)
+            models.Index(
+                fields=["group", "datetimecounted", "id"],
+                name="groupcount_latest_idx",
+            ),
+            # all counts in an enclosure on a day (see Enclosure.all_counts)
+            models.Index(
+                fields=["enclosure", "datetimecounted"],
+                name="groupcount_enc_day_idx",
+            ),
+        )
+
     def __str__(self):
         return "|".join(
             (
@@ -557,10 +717,31 @@ class GroupCount(Count):
                 datetimecounted__gte=day,
                 datetimecounted__lt=day + timezone.timedelta(days=1),
             )
-            .order_by("group__accession_number", "-datetimecounted")
-            .distinct("group__accession_number")
+            .order_by("group_id", "-datetimecounted", "-id")
+            .distinct("group_id")
         )
 
+    @classmethod
+    def bulk_update_or_create(cls, counts):
+        for c in counts:
+            c.count_not_seen = max(0, c.count_total - c.count_seen)
+        return super().bulk_update_or_create(counts)
+
+    @classmethod
+    def prior_counts(cls, groups, prior_days=3, ref_date=None) -> dict:
+        """Returns the counts from the prior N days for each group in a list of
+        groups, keyed by group id, using a single query
+        """
+        if ref_date is None:
+            ref_date = today_time()
+
+        counts = cls.latest_by_day("group", groups, prior_days, ref_date)
+
+        return {
+            group.id: prior_day_counts(counts.get(group.id, {}), ref_date, prior_days)
+            for group in groups
+        }
+
     def update_or_create_from_form(self):
         # tries to get obj from db using kwargs, if found, updates with "defaults"
         # https://docs.djangoproject.com/en/dev/ref/models/querysets/#update-or-create
@@ -582,6 +763,8 @@ class GroupCount(Count):
             },
         )
 
+        EnclosureDailySummary.refresh(self.enclosure, self.datecounted)
+
 
 class SpeciesCount(Count):
     count = models.PositiveSmallIntegerField(default=0)
@@ -590,6 +773,24 @@ class SpeciesCount(Count):
         Species, on_delete=models.CASCADE, related_name="counts"
     )
 
+    UPDATE_FIELDS = ("datetimecounted", "count")
+
+    class Meta(Count.Meta):
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "datecounted", "species", "enclosure"],
+                name="unique_user_day_species_count",
+            ),
+        )
+        indexes = (
+            # species counts are always of an enclosure over a day or days
+            # (see latest_by_day, counts_on_day)
+            models.Index(
+                fields=["enclosure", "datetimecounted"],
+                name="speciescount_enc_day_idx",
+            ),
+        )
+
     def __str__(self):
         return "|".join(
             (
@@ -613,10 +814,31 @@ class SpeciesCount(Count):
                 datetimecounted__gte=day,
                 datetimecounted__lt=day + timezone.timedelta(days=1),
             )
-            .order_by("species__common_name", "-datetimecounted")
-            .distinct("species__common_name")
+            .order_by("species_id", "-datetimecounted", "-id")
+            .distinct("species_id")
         )
 
+    @classmethod
+    def prior_counts(cls, species, enclosure, prior_days=3, ref_date=None) -> dict:
+        """Returns the count values from the prior N days for each species in a list
+        of species for an enclosure, keyed by species id, using a single query
+        """
+        if ref_date is None:
+            ref_date = today_time()
+
+        counts = cls.latest_by_day(
+            "species", species, prior_days, ref_date, enclosure=enclosure
+        )
+
+        prior_counts = {}
+        for spec in species:
+            spec_counts = {d: c.count for d, c in counts.get(spec.id, {}).items()}
+            prior_counts[spec.id] = prior_day_counts(
+                spec_counts, ref_date, prior_days, default=0
+            )
+
+        return prior_counts
+
     def update_or_create_from_form(self):
         # we want the identifier to be:
         # user, datecounted, group, enclosure?
@@ -627,3 +849,359 @@ class SpeciesCount(Count):
             enclosure=self.enclosure,
             defaults={"datetimecounted": self.datetimecounted, "count": self.count},
         )
+
+
+class EnclosureDailySummary(models.Model):
+    """
+    Rollup of an enclosure's counts on a day, so the home page can read one row per
+    enclosure instead of computing from the counts on every request
+
+    Kept current by `refresh` whenever a count is written, and when animals/groups are
+    deactivated (their counts aren't in it anymore, see `refresh_existing`)
+    The totals (active animals, groups' population) are of the roster as it is now, so
+    they aren't kept here (see Enclosure.annotate_totals)
+    """
+
+    # condition of the latest count for each animal -> field that tallies it
+    CONDITION_FIELDS: ClassVar[dict[str, str]] = {
+        AnimalCount.BAR: "animals_bar",
+        AnimalCount.SEEN: "animals_seen",
+        AnimalCount.NEEDSATTENTION: "animals_attn",
+        AnimalCount.ABSENT: "animals_absent",
+        AnimalCount.NOT_OBSERVED: "animals_not_observed",
+    }
+
+    enclosure = models.ForeignKey(
+        Enclosure, on_delete=models.CASCADE, related_name="daily_summaries"
+    )
+    datecounted = models.DateField()
+
+    animals_bar = models.PositiveIntegerField(default=0)
+    animals_seen = models.PositiveIntegerField(default=0)
+    animals_attn = models.PositiveIntegerField(default=0)
+    animals_absent = models.PositiveIntegerField(default=0)
+    animals_not_observed = models.PositiveIntegerField(default=0)
+
+    groups_seen = models.PositiveIntegerField(default=0)
+    groups_bar = models.PositiveIntegerField(default=0)
+    groups_needs_attn = models.PositiveIntegerField(default=0)
+
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("-datecounted",)
+        verbose_name_plural = "enclosure daily summaries"
+        constraints = (
+            models.UniqueConstraint(
+                fields=["enclosure", "datecounted"],
+                name="unique_enclosure_daily_summary",
+            ),
+        )
+
+    def __str__(self):
+        return "|".join((str(self.enclosure), self.datecounted.strftime("%Y-%m-%d")))
+
+    @property
+    def animals_observed(self):
+        return self.animals_bar + self.animals_seen + self.animals_attn
+
+    def condition_totals(self) -> dict:
+        """number of animals w/ each condition, keyed by the condition's display name"""
+        return {
+            name: getattr(self, self.CONDITION_FIELDS[cond])
+            for cond, name in AnimalCount.CONDITIONS
+        }
+
+    @classmethod
+    @transaction.atomic
+    def refresh(cls, enclosure, day=None):
+        """Recomputes the summary of an enclosure on a day from the latest counts
+        for each of its animals/groups
+        Locks the enclosure until the transaction commits, so writers refreshing it at
+        the same time take turns, and each one reads the counts of those before it
+        (otherwise the last to commit could store a summary w/o the others' counts)
+        """
+        Enclosure.objects.select_for_update().values_list("pk").get(pk=enclosure.pk)
+
+        if day is None:
+            day = today_time()
+        elif isinstance(day, datetime):
+            day = timezone.localtime(day).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+        else:
+            day = timezone.make_aware(datetime(day.year, day.month, day.day))
+
+        animal_counts, group_counts = Enclosure.all_counts([enclosure], day=day)
+
+        summary = {field: 0 for field in cls.CONDITION_FIELDS.values()}
+        for c in animal_counts:
+            field = cls.CONDITION_FIELDS.get(c.condition, "animals_not_observed")
+            summary[field] += 1
+
+        summary["groups_seen"] = 0
+        summary["groups_bar"] = 0
+        summary["groups_needs_attn"] = 0
+        for c in group_counts:
+            summary["groups_seen"] += c.count_seen
+            summary["groups_bar"] += c.count_bar
+            summary["groups_needs_attn"] += c.needs_attn
+
+        obj, _ = cls.objects.update_or_create(
+            enclosure=enclosure, datecounted=day.date(), defaults=summary
+        )
+        return obj
+
+    @classmethod
+    def refresh_existing(cls, enclosure_ids=None, day=None) -> list:
+        """Refreshes the summaries there already are on a day (default today) of the
+        enclosures (default all), e.g. after animals/groups are deactivated
+        """
+        if day is None:
+            day = today_time()
+
+        summaries = cls.objects.filter(datecounted=day.date()).select_related(
+            "enclosure"
+        )
+        if enclosure_ids is not None:
+            summaries = summaries.filter(enclosure_id__in=enclosure_ids)
+
+        return [cls.refresh(summary.enclosure, day) for summary in summaries]
+
+
+class PendingUpload(models.Model):
+    """
+    Changesets of an uploaded file waiting for the user to confirm them, referenced
+    from the session by id (instead of storing every row in the session)
+
+    Each list of changes is stored by column; a run of changes with the same keys
+    (the uploaded columns, or the fields of an animal/group to remove) shares them
+    """
+
+    # unconfirmed uploads older than this are removed
+    EXPIRY = timezone.timedelta(days=1)
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="pending_uploads"
+    )
+    upload_file = models.CharField(max_length=255)
+    changes = models.JSONField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "|".join((str(self.user), self.upload_file))
+
+    @classmethod
+    def create_from_changesets(cls, changesets: dict, user, upload_file: str):
+        cls.purge_expired()
+
+        changes = {"enclosures": list(changesets["enclosures"])}
+        for key in ("animals", "groups"):
+            changes[key] = cls.compact(changesets[key])
+
+        return cls.objects.create(user=user, upload_file=upload_file, changes=changes)
+
+    @classmethod
+    def unexpired(cls):
+        return cls.objects.filter(created__gte=timezone.now() - cls.EXPIRY)
+
+    @classmethod
+    def purge_expired(cls):
+        return cls.objects.filter(created__lt=timezone.now() - cls.EXPIRY).delete()
+
+    @cached_property
+    def changesets(self) -> dict:
+        """the changesets as they were created (see ingest.get_changesets)"""
+        changesets = {"enclosures": self.changes["enclosures"]}
+        for key in ("animals", "groups"):
+            changesets[key] = self.expand(self.changes[key])
+        return changesets
+
+    @staticmethod
+    def json_value(value):
+        # numpy scalars from the dataframe and NaNs (blank cells) aren't valid json
+        if hasattr(value, "item"):
+            value = value.item()
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    @classmethod
+    def compact(cls, changeset: list) -> list:
+        blocks = []
+        for change in changeset:
+            keys = list(change["object_kwargs"])
+            if not blocks or blocks[-1]["keys"] != keys:
+                blocks.append(
+                    {
+                        "keys": keys,
+                        "action": [],
+                        "enclosure": [],
+                        "columns": [[] for _ in keys],
+                    }
+                )
+            block = blocks[-1]
+            block["action"].append(change["action"])
+            block["enclosure"].append(change["enclosure"])
+            for col, value in zip(block["columns"], change["object_kwargs"].values()):
+                col.append(cls.json_value(value))
+        return blocks
+
+    @staticmethod
+    def expand(blocks: list) -> list:
+        changeset = []
+        for block in blocks:
+            for i, (action, enclosure) in enumerate(
+                zip(block["action"], block["enclosure"])
+            ):
+                object_kwargs = {
+                    key: col[i] for key, col in zip(block["keys"], block["columns"])
+                }
+                changeset.append(
+                    {
+                        "action": action,
+                        "object_kwargs": object_kwargs,
+                        "enclosure": enclosure,
+                    }
+                )
+        return changeset
+
+
+def export_storage():
+    """where the files jobs make are kept (the "exports" storage in settings)"""
+    return storages["exports"]
+
+
+class Job(models.Model):
+    """
+    Work too long to do in a request (exports, confirmed uploads), queued here and run
+    by a worker process (`manage.py run_jobs`, see jobs.py)
+    """
+
+    EXPORT = "export"
+    UPLOAD = "upload"
+    KINDS = ((EXPORT, "Export"), (UPLOAD, "Upload"))
+
+    QUEUED = "Q"
+    RUNNING = "R"
+    DONE = "D"
+    FAILED = "F"
+    STATUSES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    # finished jobs (and their files) older than this are removed
+    EXPIRY = timezone.timedelta(days=7)
+
+    # how often the worker running a job updates its heartbeat (see jobs.heartbeat)
+    HEARTBEAT_INTERVAL = timezone.timedelta(seconds=30)
+    # a running job w/o a heartbeat for this long is taken to have died with its worker
+    HEARTBEAT_TIMEOUT = timezone.timedelta(minutes=5)
+    # runs of a job before it's failed, in case it's what's killing the worker
+    MAX_ATTEMPTS = 2
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="jobs")
+    kind = models.CharField(max_length=10, choices=KINDS)
+    status = models.CharField(max_length=1, choices=STATUSES, default=QUEUED)
+    params = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True)
+    heartbeat = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    message = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    # the file a job made, for the user to download
+    result = models.FileField(storage=export_storage, blank=True, editable=False)
+    filename = models.CharField(max_length=255, blank=True, default="")
+    content_type = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        indexes = (
+            # the next queued job (see claim_next)
+            models.Index(fields=["status", "created"], name="job_status_idx"),
+        )
+
+    def __str__(self):
+        return "|".join((str(self.user), self.kind, self.get_status_display()))
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED)
+
+    @classmethod
+    def enqueue(cls, user, kind: str, **params):
+        cls.purge_expired()
+        return cls.objects.create(user=user, kind=kind, params=params)
+
+    @classmethod
+    def purge_expired(cls):
+        expired = cls.objects.filter(
+            status__in=(cls.DONE, cls.FAILED),
+            finished__lt=timezone.now() - cls.EXPIRY,
+        )
+        for job in expired.exclude(result=""):
+            job.result.delete(save=False)
+        return expired.delete()
+
+    @classmethod
+    def recover_stale(cls):
+        """requeues the jobs left running by a worker that died
+        (fails them once they've had all their attempts)"""
+        stale = cls.objects.filter(
+            status=cls.RUNNING, heartbeat__lt=timezone.now() - cls.HEARTBEAT_TIMEOUT
+        )
+        failed = stale.filter(attempts__gte=cls.MAX_ATTEMPTS).update(
+            status=cls.FAILED,
+            finished=timezone.now(),
+            message="The job stopped before it finished",
+        )
+        requeued = stale.update(status=cls.QUEUED, started=None, heartbeat=None)
+        return requeued, failed
+
+    @classmethod
+    def claim_next(cls):
+        """marks the oldest queued job as running and returns it (None if none)
+        other workers skip it while it's being claimed"""
+        with transaction.atomic():
+            job = (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(status=cls.QUEUED)
+                .order_by("created")
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = cls.RUNNING
+            job.started = job.heartbeat = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=["status", "started", "heartbeat", "attempts"])
+        return job
+
+    def beat(self):
+        """the job's still running"""
+        self.heartbeat = timezone.now()
+        Job.objects.filter(id=self.id, status=self.RUNNING).update(
+            heartbeat=self.heartbeat
+        )
+
+    def finish(self, message="", result=None, filename="", content_type=""):
+        """result is a file (e.g. a temp file) to save as the job's result, it's copied
+        into the exports storage a chunk at a time"""
+        if result is not None:
+            self.result.save(filename, File(result), save=False)
+        self.status = self.DONE
+        self.finished = timezone.now()
+        self.message = message
+        self.filename = filename
+        self.content_type = content_type
+        self.save()
+
+    def fail(self, message: str):
+        self.status = self.FAILED
+        self.finished = timezone.now()
+        self.message = message
+        self.save()
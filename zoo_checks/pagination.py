@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination of counts, newest first
+
+A page is found from the (datetimecounted, id) of the count at its edge, instead of
+counting every count and skipping (OFFSET) the ones before it, so pages deep in years
+of history load as fast as the first one
+"""
+
+import base64
+import binascii
+import json
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# directions of a cursor, from its key
+OLDER = "older"
+NEWER = "newer"
+
+
+def encode_cursor(direction: str, count=None) -> str:
+    """an opaque token for the page of counts older/newer than a count
+    (without a count, the first/last page)"""
+    key = None if count is None else [count.datetimecounted.isoformat(), count.id]
+    return base64.urlsafe_b64encode(json.dumps([direction, key]).encode()).decode()
+
+
+def decode_cursor(cursor) -> tuple:
+    """(direction, key) of a token, that of the first page if it's missing/invalid"""
+    try:
+        direction, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if direction not in (OLDER, NEWER):
+            raise ValueError(f"unknown direction {direction}")
+        if key is not None:
+            datetimecounted, count_id = key
+            key = (parse_datetime(datetimecounted), int(count_id))
+            if key[0] is None:
+                raise ValueError(f"not a datetime {datetimecounted}")
+    except (AttributeError, TypeError, ValueError, binascii.Error):
+        return OLDER, None
+    return direction, key
+
+
+def estimate_count(queryset) -> int:
+    """the planner's estimate of the number of rows of a query, without running it"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, estimated_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = encode_cursor(NEWER)
+        self.estimated_count = estimated_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Paginates counts by cursor instead of by page number
+    estimate_count adds the (planner's) estimated number of counts to each page,
+    in place of counting them
+    """
+
+    def __init__(self, queryset, per_page, estimate_count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.estimate_count = estimate_count
+
+    def get_page(self, cursor=None) -> KeysetPage:
+        direction, key = decode_cursor(cursor)
+
+        if direction == OLDER:
+            counts = self.queryset.order_by("-datetimecounted", "-id")
+            if key is not None:
+                counts = counts.filter(
+                    Q(datetimecounted__lt=key[0])
+                    | Q(datetimecounted=key[0], id__lt=key[1])
+                )
+        else:
+            counts = self.queryset.order_by("datetimecounted", "id")
+            if key is not None:
+                counts = counts.filter(
+                    Q(datetimecounted__gt=key[0])
+                    | Q(datetimecounted=key[0], id__gt=key[1])
+                )
+
+        # one more than a page, to know if there's another
+        object_list = list(counts[: self.per_page + 1])
+        more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if direction == NEWER:
+            object_list.reverse()
+            has_older, has_newer = key is not None, more
+        else:
+            has_older, has_newer = more, key is not None
+
+        return KeysetPage(
+            object_list,
+            next_cursor=(
+                encode_cursor(OLDER, object_list[-1])
+                if has_older and object_list
+                else None
+            ),
+            previous_cursor=(
+                encode_cursor(NEWER, object_list[0])
+                if has_newer and object_list
+                else None
+            ),
+            estimated_count=(
+                estimate_count(self.queryset) if self.estimate_count else None
+            ),
+        )
@@ -0,0 +1,86 @@
+"""Keeps cached data current as the models it's computed from are saved"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_all_cards, invalidate_card, invalidate_permissions
+from .models import (
+    Animal,
+    AnimalCount,
+    EnclosureDailySummary,
+    EnclosureSpecies,
+    Group,
+    GroupCount,
+    Role,
+    SpeciesCount,
+)
+
+
+# the tally page saves counts in bulk, which doesn't send signals, but then
+# refreshes the enclosure's summary, which does
+@receiver([post_save, post_delete], sender=AnimalCount)
+@receiver([post_save, post_delete], sender=GroupCount)
+@receiver([post_save, post_delete], sender=SpeciesCount)
+@receiver([post_save, post_delete], sender=EnclosureDailySummary)
+def drop_enclosure_card(sender, instance, **kwargs):
+    invalidate_card(instance.enclosure_id, instance.datecounted)
+
+
+@receiver([post_save, post_delete], sender=Animal)
+@receiver([post_save, post_delete], sender=Group)
+def drop_all_cards(sender, instance, **kwargs):
+    invalidate_all_cards()
+
+
+@receiver(pre_save, sender=Animal)
+@receiver(pre_save, sender=Group)
+def remember_enclosure(sender, instance, **kwargs):
+    """the enclosure an animal/group is saved from, in case it's moving, and whether
+    it was active"""
+    saved = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("enclosure_id", "active")
+        .first()
+        if instance.pk is not None
+        else None
+    )
+    instance._saved_enclosure_id, instance._saved_active = saved or (None, None)
+
+
+@receiver([post_save, post_delete], sender=Animal)
+@receiver([post_save, post_delete], sender=Group)
+def refresh_enclosure_species(sender, instance, **kwargs):
+    enclosure_ids = {
+        instance.enclosure_id,
+        getattr(instance, "_saved_enclosure_id", None),
+    } - {None}
+    if enclosure_ids:
+        EnclosureSpecies.refresh(enclosure_ids)
+
+
+@receiver([post_save, post_delete], sender=Animal)
+@receiver([post_save, post_delete], sender=Group)
+def refresh_daily_summaries(sender, instance, created=False, **kwargs):
+    """counts of animals/groups that are deactivated (or deleted) drop out of today's
+    summary (new ones haven't been counted yet)"""
+    if created or (
+        kwargs["signal"] is post_save
+        and getattr(instance, "_saved_active", None) == instance.active
+    ):
+        return
+
+    if instance.enclosure_id is not None:
+        EnclosureDailySummary.refresh_existing([instance.enclosure_id])
+
+
+@receiver(m2m_changed, sender=Role.enclosures.through)
+@receiver(m2m_changed, sender=Role.users.through)
+def drop_permissions(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_permissions()
+
+
+# deleting a role deletes its enclosures and users without m2m_changed
+@receiver(post_delete, sender=Role)
+def drop_role_permissions(sender, instance, **kwargs):
+    invalidate_permissions()
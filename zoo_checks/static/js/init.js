@@ -46,11 +46,13 @@ document.addEventListener("DOMContentLoaded", function () {
 });
 
 function incrementValue(id, inc_val) {
-  var value = parseInt(document.getElementById(id).value, 10);
+  const elem = document.getElementById(id);
+  var value = parseInt(elem.value, 10);
   value = isNaN(value) ? 0 : value;
   if (value + inc_val >= 0) {
     value += inc_val;
-    document.getElementById(id).value = value;
+    elem.value = value;
+    elem.dispatchEvent(new Event("change", { bubbles: true }));
   }
 }
 
@@ -70,18 +72,19 @@ function chartVisible(id) {
   });
 }
 
-document
-  .querySelectorAll(".condition-radio input[type=radio]")
-  .forEach((elem) => {
-    elem.addEventListener("click", function (e) {
-      // needs attention causes comment field to appear
-      let comment_field =
-        elem.parentElement.parentElement.parentElement.nextElementSibling;
-      if (elem.value === "NA" || elem.value === "NS") {
-        comment_field.style.display = "block";
-      }
-    });
-  });
+// listeners on the tally rows are on the document, so they still apply to rows
+// swapped in after being saved (see save_tally_row)
+document.addEventListener("click", function (e) {
+  const elem = e.target;
+  if (elem.matches(".condition-radio input[type=radio]")) {
+    // needs attention causes comment field to appear
+    let comment_field =
+      elem.parentElement.parentElement.parentElement.nextElementSibling;
+    if (elem.value === "NA" || elem.value === "NS") {
+      comment_field.style.display = "block";
+    }
+  }
+});
 
 function update_count_bar(slider_elem) {
   const count_bar_id = slider_elem.id.replace("_slider", "");
@@ -114,32 +117,20 @@ function update_slider(slider_id, value) {
   document.getElementById(slider_id).value = value;
 }
 
-document.querySelectorAll(".count_seen_slider").forEach((elem) => {
-  elem.addEventListener("input", function (e) {
+document.addEventListener("input", function (e) {
+  const elem = e.target;
+  if (elem.matches(".count_seen_slider")) {
     update_count_seen(elem);
-  });
-});
-
-document.querySelectorAll(".count_bar_slider").forEach((elem) => {
-  elem.addEventListener("input", function (e) {
+  } else if (elem.matches(".count_bar_slider")) {
     update_count_bar(elem);
-  });
+  } else if (elem.matches(".count_seen_input,.count_bar_input")) {
+    update_slider(elem.id + "_slider", elem.value);
+    if (elem.className.includes("count_seen_input")) {
+      update_bar_elems(elem.id.replace("_seen", "_bar") + "_slider", elem.value);
+    }
+  }
 });
 
-document
-  .querySelectorAll(".count_seen_input,.count_bar_input")
-  .forEach((elem) => {
-    elem.addEventListener("input", function (e) {
-      update_slider(elem.id + "_slider", elem.value);
-      if (elem.className.includes("count_seen_input")) {
-        update_bar_elems(
-          elem.id.replace("_seen", "_bar") + "_slider",
-          elem.value
-        );
-      }
-    });
-  });
-
 function count_species_animals_conditions(condition_radio_td_id) {
   // get the number of individuals in a species
   const input_selector = "td#" + condition_radio_td_id;
@@ -182,20 +173,99 @@ function update_species_count_w_condition(elem) {
   const species_input = document.querySelector(q_sel);
 
   const current_tally = parseInt(species_input.value);
+  let tally = current_tally;
   if (current_tally > elem_total - not_seen) {
-    species_input.value = elem_total - not_seen;
+    tally = elem_total - not_seen;
   } else if (current_tally < cond_counted) {
-    species_input.value = cond_counted;
+    tally = cond_counted;
+  }
+  if (tally !== current_tally) {
+    species_input.value = tally;
+    species_input.dispatchEvent(new Event("change", { bubbles: true }));
   }
 }
 
-document
-  .querySelectorAll(".tally-table-body .condition-radio input[type=radio]")
-  .forEach((elem) => {
-    elem.addEventListener("click", function (e) {
-      update_species_count_w_condition(elem);
+document.addEventListener("click", function (e) {
+  if (e.target.matches(".tally-table-body .condition-radio input[type=radio]")) {
+    update_species_count_w_condition(e.target);
+  }
+});
+
+// pending save (timer) and in-flight request (abort controller) per tally row prefix
+const tally_row_saves = new Map();
+const TALLY_ROW_SAVE_DELAY = 400;
+
+function save_tally_row(row) {
+  // posts a tally row's form fields, and swaps in the saved row it responds with
+  const prefix = row.dataset.rowPrefix;
+  const data = new FormData();
+  data.append("prefix", prefix);
+  row.querySelectorAll("input[name], textarea[name]").forEach((input) => {
+    if (["radio", "checkbox"].includes(input.type) && !input.checked) {
+      return;
+    }
+    data.append(input.name, input.value);
+  });
+
+  const controller = new AbortController();
+  tally_row_saves.set(prefix, { controller: controller });
+
+  fetch(row.dataset.rowUrl, {
+    method: "POST",
+    body: data,
+    headers: {
+      "X-CSRFToken": document.querySelector("[name=csrfmiddlewaretoken]").value,
+    },
+    signal: controller.signal,
+  })
+    .then((response) => {
+      if (!response.ok && response.status !== 422) {
+        throw new Error(response.statusText);
+      }
+      return response.text();
+    })
+    .then((html) => {
+      // a newer edit of the row supersedes this response
+      if (controller.signal.aborted) {
+        return;
+      }
+      tally_row_saves.delete(prefix);
+      const template = document.createElement("template");
+      template.innerHTML = html.trim();
+      const saved_row = template.content.firstElementChild;
+      row.replaceWith(saved_row);
+      M.Tooltip.init(saved_row.querySelectorAll(".tooltipped"), {});
+    })
+    .catch((error) => {
+      if (error.name === "AbortError") {
+        return;
+      }
+      M.toast({ html: "Couldn't save the row, submit the tally instead" });
     });
+}
+
+function schedule_tally_row_save(row) {
+  // saves a row once its edits settle (e.g. repeated increment clicks), dropping any
+  // earlier save of it that's still in flight, so only the latest values are applied
+  const prefix = row.dataset.rowPrefix;
+  const pending = tally_row_saves.get(prefix);
+  if (pending !== undefined) {
+    clearTimeout(pending.timer);
+    if (pending.controller !== undefined) {
+      pending.controller.abort();
+    }
+  }
+  tally_row_saves.set(prefix, {
+    timer: setTimeout(() => save_tally_row(row), TALLY_ROW_SAVE_DELAY),
   });
+}
+
+document.addEventListener("change", function (e) {
+  const row = e.target.closest(".tally-table-body tr[data-row-url]");
+  if (row !== null) {
+    schedule_tally_row_save(row);
+  }
+});
 
 document.querySelectorAll(".msg").forEach((elem) => {
   elem.addEventListener("animationend", () => {
@@ -34,3 +34,14 @@ def addDays(days, start_date=None):
 @register.filter()
 def hidden_initial_field(field):
     return field.as_hidden(only_initial=True)
+
+
+@register.simple_tag(takes_context=True)
+def cursor_query(context, cursor=None):
+    """the page's query string w/ another cursor (or none, for the first page), so
+    paging keeps the rest of it (e.g. a chart's date range)"""
+    query = context["request"].GET.copy()
+    query.pop("cursor", None)
+    if cursor:
+        query["cursor"] = cursor
+    return f"?{query.urlencode()}"
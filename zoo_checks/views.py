@@ -1,64 +1,136 @@
+import json
 import logging
+import re
+import tempfile
+from functools import wraps
 
-import pandas as pd
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator
-from django.db.models import Count, Prefetch, Q
+from django.db import transaction
+from django.db.models import Q
 from django.forms import formset_factory
-from django.http import HttpRequest, HttpResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+from django.views.decorators.http import (
+    require_http_methods,
+    require_POST,
+    require_safe,
+)
 
 from zoo_checks.ingest import TRACKS_REQ_COLS
 
+from . import api, cache, charts
+from .export import (
+    CSV_CONTENT_TYPE,
+    EXPORT_WRITERS,
+    csv_lines,
+    export_filename,
+    export_queryset,
+    export_rows,
+    log_no_data,
+)
 from .forms import (
     AnimalCountForm,
+    ChartRangeForm,
     ExportForm,
     GroupCountForm,
+    PriorDaysForm,
     SpeciesCountForm,
     TallyDateForm,
     UploadFileForm,
 )
 from .helpers import (
-    clean_df,
     get_init_anim_count_form,
     get_init_group_count_form,
     get_init_spec_count_form,
-    qs_to_df,
     set_formset_order,
     today_time,
 )
-from .ingest import ExcelUploadError, handle_upload, ingest_changesets
+from .ingest import ExcelUploadError, handle_upload
 from .models import (
     Animal,
     AnimalCount,
     Enclosure,
+    EnclosureDailySummary,
+    EnclosureSpecies,
     Group,
     GroupCount,
+    Job,
+    PendingUpload,
     Role,
     Species,
     SpeciesCount,
-    User,
 )
+from .pagination import KeysetPaginator
 
 baselogger = logging.getLogger("zootable")
 LOGGER = baselogger.getChild(__name__)
 
+# rows of the tally page that can be saved on their own (see count_row)
+# kind -> count model, form, formset prefix of the row's form, row template
+TALLY_ROWS = {
+    "species": (
+        SpeciesCount,
+        SpeciesCountForm,
+        "species_formset",
+        "species_count_form_snippet.html",
+    ),
+    "group": (GroupCount, GroupCountForm, "groups_formset", "tally_group_row.html"),
+    "animal": (
+        AnimalCount,
+        AnimalCountForm,
+        "animals_formset",
+        "tally_animal_row.html",
+    ),
+}
+
+
 """ helpers that need models """
 
 
-def get_accessible_enclosures(user: User):
+def get_enclosure_ids(request: HttpRequest) -> set[int]:
+    """ids of the enclosures in the user's roles, kept in their session until any role
+    changes, and on the request for the rest of it"""
+    if not hasattr(request, "_enclosure_ids"):
+        user = request.user
+        request._enclosure_ids = cache.get_enclosure_ids(
+            request.session,
+            lambda: set(
+                Enclosure.objects.filter(roles__users=user).values_list("id", flat=True)
+            ),
+        )
+    return request._enclosure_ids
+
+
+def get_accessible_enclosures(request: HttpRequest):
     # superuser sees all enclosures
-    if not user.is_superuser:
-        enclosures = Enclosure.objects.filter(roles__in=user.roles.all()).distinct()
+    if not request.user.is_superuser:
+        enclosures = Enclosure.objects.filter(id__in=get_enclosure_ids(request))
     else:
         enclosures = Enclosure.objects.all()
 
     return enclosures
 
 
+def is_permitted(request: HttpRequest, enclosure: Enclosure) -> bool:
+    """whether the user belongs to the enclosure (or is superuser)"""
+    return request.user.is_superuser or enclosure.id in get_enclosure_ids(request)
+
+
 def redirect_if_not_permitted(request: HttpRequest, enclosure: Enclosure) -> bool:
     """
     Returns
@@ -68,7 +140,7 @@ def redirect_if_not_permitted(request: HttpRequest, enclosure: Enclosure) -> boo
 
     False if user belongs to enclosure or is superuser
     """
-    if request.user.is_superuser or request.user.roles.filter(enclosures=enclosure):
+    if is_permitted(request, enclosure):
         return False
 
     messages.error(
@@ -81,86 +153,207 @@ def redirect_if_not_permitted(request: HttpRequest, enclosure: Enclosure) -> boo
     return True
 
 
-def enclosure_counts_to_dict(enclosures, animal_counts, group_counts) -> dict:
+def enclosure_counts_to_dict(enclosures, summaries) -> dict:
     """
-    repackage enclosure counts into dict for template render
+    repackage enclosure daily summaries into dict for template render
     dict order of enclosures is same as list/query order
+    enclosures need to be annotated w/ their totals (see: Enclosure.annotate_totals)
     not using defaultdict(list) because django templates have difficulty with them
     """
 
-    def create_counts_dict(enclosures, counts) -> dict:
-        """Takes a list/queryset of counts and enclosures
-
-        Returns a dictionary
-
-        - keys: enclosures
-        - values: list of counts belonging to the enclosure
-
-        We do this (once) in order to be able to iterate over counts for each enclosure
-        """
-        counts_dict = {}
-        for enc in enclosures:
-            counts_dict[enc] = []
-        [counts_dict[c.enclosure].append(c) for c in counts]
-        return counts_dict
-
-    def separate_conditions(counts) -> dict:
-        """
-        Arguments: Animal counts
-
-        Returns: dictionary
-
-        - keys: condition names
-        - values: list of counts
-        """
-        cond_dict = {}
-        for cond in AnimalCount.CONDITIONS:
-            cond_dict[cond[1]] = []  # init to empty list
-        [cond_dict[c.get_condition_display()].append(c) for c in counts]
-        return cond_dict
-
-    def separate_group_count_attributes(counts) -> dict:
-        """
-        Arguments: Group counts (typically w/in an enclosure)
-
-        Returns: dictionary
-
-        - keys: Seen, BAR, Needs Attn
-        - values: sum of group counts within each key
-        """
-        count_dict = {}
-        count_dict["Seen"] = sum([c.count_seen for c in counts])
-        count_dict["BAR"] = sum([c.count_bar for c in counts])
-        count_dict["Needs Attn"] = sum([c.needs_attn for c in counts])
-        return count_dict
-
-    enc_anim_ct_dict = create_counts_dict(enclosures, animal_counts)
-    enc_group_ct_dict = create_counts_dict(enclosures, group_counts)
+    summaries_dict = {s.enclosure_id: s for s in summaries}
+
     counts_dict = {}
     for enc in enclosures:
-        enc_anim_counts_sum = sum(
-            [
-                c.condition in [o_c[0] for o_c in AnimalCount.OBSERVED_CONDITIONS]
-                for c in enc_anim_ct_dict[enc]
-            ]
-        )
-        enc_group_counts_sum = sum(
-            [c.count_seen + c.count_bar for c in enc_group_ct_dict[enc]]
-        )
-        total_groups = sum([g.population_total for g in enc.groups.all()])
+        summary = summaries_dict.get(enc.id)
+        if summary is None:
+            # nothing counted yet
+            summary = EnclosureDailySummary(enclosure=enc)
 
         counts_dict[enc] = {
-            "animal_count_total": enc_anim_counts_sum,
-            "animal_conditions": separate_conditions(enc_anim_ct_dict[enc]),
-            "group_counts": separate_group_count_attributes(enc_group_ct_dict[enc]),
-            "group_count_total": enc_group_counts_sum,
-            "total_animals": enc.animals.count(),
-            "total_groups": total_groups,
+            "animal_count_total": summary.animals_observed,
+            "animal_conditions": summary.condition_totals(),
+            "group_counts": {
+                "Seen": summary.groups_seen,
+                "BAR": summary.groups_bar,
+                "Needs Attn": summary.groups_needs_attn,
+            },
+            "group_count_total": summary.groups_seen + summary.groups_bar,
+            # the roster as it is now, not when the summary was refreshed
+            "total_animals": enc.active_animals,
+            "total_groups": enc.active_groups_population,
         }
 
     return counts_dict
 
 
+def get_prior_counts(
+    enclosure, enclosure_species, enclosure_groups, enclosure_animals, dateday
+) -> dict:
+    """prior counts for every row on the tally page, one query per count type"""
+    return {
+        "species": SpeciesCount.prior_counts(
+            enclosure_species, enclosure, ref_date=dateday
+        ),
+        "groups": GroupCount.prior_counts(enclosure_groups, ref_date=dateday),
+        "animals": AnimalCount.prior_counts(enclosure_animals, ref_date=dateday),
+    }
+
+
+def form_to_count(form, user, dateday):
+    """the (unsaved) count of a tally page form, counted by the user on the day"""
+    instance = form.save(commit=False)
+    instance.user = user
+
+    # if setting count for a diff day than today, set the date/datetime
+    if dateday.date() != today_time().date():
+        instance.datetimecounted = (
+            dateday + timezone.timedelta(days=1) - timezone.timedelta(seconds=1)
+        )
+        instance.datecounted = dateday.date()
+
+    return instance
+
+
+def form_roster(enclosure, kind, objs) -> dict:
+    """what a count form's foreign keys can be (see RosterCountForm): any of the
+    (loaded) objects of the kind, in the enclosure"""
+    return {kind: {obj.id: obj for obj in objs}, "enclosure": {enclosure.id: enclosure}}
+
+
+def json_to_counts(data: dict, enclosure, roster: dict, user, dateday) -> tuple:
+    """
+    The (unsaved) counts in a JSON body of the tally API, keyed by model, each
+    validated by the form of its row on the tally page
+    and the errors of the invalid ones, by payload key and index in its list
+    """
+    counts, errors = {}, {}
+    for key, kind in api.KINDS.items():
+        model, form_class, _, _ = TALLY_ROWS[kind]
+        form_kwargs = {"roster": form_roster(enclosure, kind, roster[key])}
+        subjects = form_kwargs["roster"][kind]
+
+        items = data.get(key, [])
+        if not isinstance(items, list):
+            errors[key] = {"__all__": [{"message": "Not a list", "code": "invalid"}]}
+            continue
+
+        counted = set()
+        for ind, item in enumerate(items):
+            subject_id = item.get(kind) if isinstance(item, dict) else None
+            # the same subject twice would be upserted twice in one statement
+            if not isinstance(subject_id, int) or subject_id in counted:
+                subject_id = None
+            if subject_id not in subjects:
+                errors.setdefault(key, {})[ind] = {
+                    kind: [
+                        {
+                            "message": f"Not one of the enclosure's {key}"
+                            " (or counted more than once)",
+                            "code": "invalid_choice",
+                        }
+                    ]
+                }
+                continue
+            counted.add(subject_id)
+
+            form_data = {**item, "enclosure": enclosure.id}
+            if kind == "group":
+                form_data["count_total"] = subjects[subject_id].population_total
+            form = form_class(form_data, **form_kwargs)
+            if form.is_valid():
+                counts.setdefault(model, []).append(form_to_count(form, user, dateday))
+            else:
+                errors.setdefault(key, {})[ind] = form.errors.get_json_data()
+
+    return counts, errors
+
+
+def api_login_required(view):
+    """login_required for the tally API, responds to anonymous clients w/ a 401
+    instead of redirecting them to the login page"""
+
+    @wraps(view)
+    def _view(request: HttpRequest, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Not logged in"}, status=401)
+        return view(request, *args, **kwargs)
+
+    return _view
+
+
+def last_modified(modified) -> int | None:
+    return None if modified is None else int(modified.timestamp())
+
+
+def conditional_headers(response, etag: str, modified):
+    """headers for clients to check their copy of a tally API payload is current
+    (ETags change with every change, Last-Modified only to the second)"""
+    response.headers["ETag"] = etag
+    if modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified(modified))
+    # clients can keep it, as long as they check it's current before using it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def get_tally_row(enclosure, kind, pk, dateday):
+    """
+    The counted object of a row of the tally page (by kind: species, group or animal)
+    the initial data of its form and the context to render the row (w/o the form)
+    """
+    if kind == "species":
+        member = get_object_or_404(
+            EnclosureSpecies.objects.select_related("species"),
+            enclosure=enclosure,
+            species_id=pk,
+        )
+        species = member.species
+        initial = get_init_spec_count_form(
+            enclosure,
+            [species],
+            SpeciesCount.counts_on_day([species], enclosure, day=dateday),
+        )[0]
+        context = {
+            "species": species,
+            "prior_counts": SpeciesCount.prior_counts(
+                [species], enclosure, ref_date=dateday
+            )[species.id],
+            # species w/ groups are counted by group
+            "group_form": member.num_groups > 0,
+        }
+        return species, initial, context
+
+    if kind == "group":
+        group = get_object_or_404(
+            enclosure.groups.filter(active=True).select_related("species"), pk=pk
+        )
+        initial = get_init_group_count_form(
+            [group], GroupCount.counts_on_day([group], day=dateday)
+        )[0]
+        context = {
+            "group": group,
+            "prior_counts": GroupCount.prior_counts([group], ref_date=dateday)[
+                group.id
+            ],
+        }
+        return group, initial, context
+
+    animal = get_object_or_404(
+        enclosure.animals.filter(active=True).select_related("species"), pk=pk
+    )
+    initial = get_init_anim_count_form(
+        [animal], AnimalCount.counts_on_day([animal], day=dateday)
+    )[0]
+    context = {
+        "anim": animal,
+        "prior_conditions": AnimalCount.prior_counts([animal], ref_date=dateday)[
+            animal.id
+        ],
+    }
+    return animal, initial, context
+
+
 def get_selected_role(request: HttpRequest):
     # user requests view all
     if request.GET.get("view_all", False):
@@ -197,7 +390,7 @@ def get_selected_role(request: HttpRequest):
 # TODO: logins may not be sufficient - user a part of a group?
 # TODO: add pagination
 def home(request: HttpRequest):
-    enclosures_query = get_accessible_enclosures(request.user)
+    enclosures_query = get_accessible_enclosures(request)
 
     # only show enclosures that have active animals/groups
     query = Q(animals__active=True) | Q(groups__active=True)
@@ -206,14 +399,9 @@ def home(request: HttpRequest):
     if selected_role is not None:
         query = query & Q(roles=selected_role)
 
-    # prefetching in order to build up the info displayed for each enclosure
-    groups_prefetch = Prefetch("groups", queryset=Group.objects.filter(active=True))
-    animals_prefetch = Prefetch("animals", queryset=Animal.objects.filter(active=True))
-
-    enclosures_query = (
-        enclosures_query.prefetch_related(groups_prefetch, animals_prefetch)
-        .filter(query)
-        .distinct()
+    # annotating the totals displayed for each enclosure
+    enclosures_query = Enclosure.annotate_totals(
+        enclosures_query.filter(query).distinct()
     )
 
     paginator = Paginator(enclosures_query, 10)
@@ -225,8 +413,21 @@ def home(request: HttpRequest):
 
     roles = request.user.roles.all()
 
-    cts = Enclosure.all_counts(enclosures)
-    enclosure_cts_dict = enclosure_counts_to_dict(enclosures, *cts)
+    # cards are cached until one of their counts, animals or groups changes
+    day = today_time().date()
+    cards = cache.get_cards([enc.id for enc in enclosures], day)
+    uncached = [enc for enc in enclosures if enc.id not in cards]
+    if uncached:
+        summaries = EnclosureDailySummary.objects.filter(
+            enclosure__in=uncached, datecounted=day
+        )
+        uncached_cards = {
+            enc.id: card
+            for enc, card in enclosure_counts_to_dict(uncached, summaries).items()
+        }
+        cache.set_cards(uncached_cards, day)
+        cards.update(uncached_cards)
+    enclosure_cts_dict = {enc: cards[enc.id] for enc in enclosures}
 
     return render(
         request,
@@ -253,11 +454,6 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
     else:
         dateday = timezone.make_aware(timezone.datetime(year, month, day))
 
-    if dateday.date() == today_time().date():
-        count_today = True
-    else:
-        count_today = False
-
     enclosure_animals = (
         enclosure.animals.filter(active=True)
         .order_by("species__common_name", "name", "accession_number")
@@ -293,12 +489,21 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
     # if this is a POST request we need to process the form data
     if request.method == "POST":
         # create a form instance and populate it with data from the request:
+        # the forms' animals/groups/species are looked up in the ones loaded above
         species_formset = SpeciesCountFormset(
-            request.POST, initial=init_spec, prefix="species_formset"
+            request.POST,
+            initial=init_spec,
+            prefix="species_formset",
+            form_kwargs={
+                "roster": form_roster(enclosure, "species", enclosure_species)
+            },
         )
 
         groups_formset = GroupCountFormset(
-            request.POST, initial=init_group, prefix="groups_formset"
+            request.POST,
+            initial=init_group,
+            prefix="groups_formset",
+            form_kwargs={"roster": form_roster(enclosure, "group", enclosure_groups)},
         )
 
         # TODO: Test to make sure we are editing the correct animal counts
@@ -306,6 +511,7 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
             request.POST,
             initial=init_anim,
             prefix="animals_formset",
+            form_kwargs={"roster": form_roster(enclosure, "animal", enclosure_animals)},
         )
 
         # check whether it's valid:
@@ -314,28 +520,25 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
             and animals_formset.is_valid()
             and groups_formset.is_valid()
         ):
-
-            def save_form_in_formset(form):
-                # TODO: move this into model/(form?) and overwrite the save method
-                if form.has_changed():
-                    instance = form.save(commit=False)
-                    instance.user = request.user
-
-                    # if setting count for a diff day than today, set the date/datetime
-                    if not count_today:
-                        instance.datetimecounted = (
-                            dateday
-                            + timezone.timedelta(days=1)
-                            - timezone.timedelta(seconds=1)
-                        )
-                        instance.datecounted = dateday.date()
-
-                    instance.update_or_create_from_form()
-
             # process the data in form.cleaned_data as required
-            for formset in (species_formset, animals_formset, groups_formset):
-                for form in formset:
-                    save_form_in_formset(form)
+            # only changed forms are saved, one upsert statement per count type
+            with transaction.atomic():
+                for model, formset in (
+                    (SpeciesCount, species_formset),
+                    (AnimalCount, animals_formset),
+                    (GroupCount, groups_formset),
+                ):
+                    model.bulk_update_or_create(
+                        [
+                            form_to_count(form, request.user, dateday)
+                            for form in formset
+                            if form.has_changed()
+                        ]
+                    )
+
+                # species counts don't feed the home page summary
+                if animals_formset.has_changed() or groups_formset.has_changed():
+                    EnclosureDailySummary.refresh(enclosure, dateday)
 
             messages.success(request, "Saved")
             LOGGER.info("Saved counts")
@@ -354,14 +557,19 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
                 groups_formset,
                 animals_formset,
             ) = set_formset_order(
-                enclosure,
                 enclosure_species,
                 enclosure_groups,
                 enclosure_animals,
                 species_formset,
                 groups_formset,
                 animals_formset,
-                dateday,
+                get_prior_counts(
+                    enclosure,
+                    enclosure_species,
+                    enclosure_groups,
+                    enclosure_animals,
+                    dateday,
+                ),
             )
 
             messages.error(request, "There was an error processing the form")
@@ -383,14 +591,19 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
             groups_formset,
             animals_formset,
         ) = set_formset_order(
-            enclosure,
             enclosure_species,
             enclosure_groups,
             enclosure_animals,
             species_formset,
             groups_formset,
             animals_formset,
-            dateday,
+            get_prior_counts(
+                enclosure,
+                enclosure_species,
+                enclosure_groups,
+                enclosure_animals,
+                dateday,
+            ),
         )
 
     dateform = TallyDateForm()
@@ -410,6 +623,154 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
     )
 
 
+@login_required
+@require_POST
+def count_row(request: HttpRequest, enclosure_slug, year, month, day, kind, pk):
+    """
+    Saves a single row of the tally page, instead of the whole enclosure's formsets
+    Takes the row's form fields (named w/ the row's formset prefix) and responds with
+    just the row, re-rendered, to swap in its place
+    """
+    enclosure = get_object_or_404(Enclosure, slug=enclosure_slug)
+
+    if redirect_if_not_permitted(request, enclosure):
+        return HttpResponseForbidden()
+
+    if kind not in TALLY_ROWS:
+        raise Http404(f"No {kind} rows")
+    model, form_class, formset_prefix, template = TALLY_ROWS[kind]
+    prefix = request.POST.get("prefix", "")
+    if not re.fullmatch(rf"{formset_prefix}-\d+", prefix):
+        return HttpResponseBadRequest(f"Not a {kind} row: {prefix}")
+
+    dateday = timezone.make_aware(timezone.datetime(year, month, day))
+    obj, initial, context = get_tally_row(enclosure, kind, pk, dateday)
+
+    # only the row's animal/group/species, in the enclosure, is a valid choice
+    roster = form_roster(enclosure, kind, [obj])
+    form = form_class(request.POST, initial=initial, prefix=prefix, roster=roster)
+    status = 200
+    if not form.is_valid():
+        status = 422
+    else:
+        if form.has_changed():
+            with transaction.atomic():
+                model.bulk_update_or_create(
+                    [form_to_count(form, request.user, dateday)]
+                )
+                # species counts don't feed the home page summary
+                if model is not SpeciesCount:
+                    EnclosureDailySummary.refresh(enclosure, dateday)
+            LOGGER.info(f"Saved {kind} count")
+
+        # the saved row
+        obj, initial, context = get_tally_row(enclosure, kind, pk, dateday)
+        form = form_class(initial=initial, prefix=prefix, roster=roster)
+
+    return render(
+        request,
+        template,
+        {**context, "form": form, "enclosure": enclosure, "dateday": dateday.date()},
+        status=status,
+    )
+
+
+@api_login_required
+@require_safe
+def api_roster(request: HttpRequest, enclosure_slug):
+    """JSON of an enclosure's species, and active groups and animals"""
+    enclosure = get_object_or_404(Enclosure, slug=enclosure_slug)
+
+    if not is_permitted(request, enclosure):
+        return JsonResponse({"error": "Not permitted"}, status=403)
+
+    roster = api.get_roster(enclosure)
+    changes, modified = api.changes(enclosure, roster)
+    etag = api.etag("roster", enclosure.id, enclosure.name, enclosure.slug, *changes)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified(modified)
+    )
+    if response is None:
+        response = JsonResponse(api.roster_payload(enclosure, roster))
+    return conditional_headers(response, etag, modified)
+
+
+@api_login_required
+@require_http_methods(["GET", "HEAD", "POST"])
+def api_counts(request: HttpRequest, enclosure_slug, year=None, month=None, day=None):
+    """
+    JSON of the counts of an enclosure's roster on a day (today by default)
+    and on the prior days (?prior_days=N, default 3)
+
+    POSTing a JSON body keyed like the payload ("species", "groups", "animals"), each a
+    list of counts w/ the fields of their row's form on the tally page
+    e.g. {"animals": [{"animal": 1, "condition": "BA", "comment": ""}]}
+    saves them as the user's counts on the day, and responds w/ the saved counts
+    send If-Match (w/ the ETag of the counts) to only save over the counts you've seen
+    """
+    enclosure = get_object_or_404(Enclosure, slug=enclosure_slug)
+
+    if not is_permitted(request, enclosure):
+        return JsonResponse({"error": "Not permitted"}, status=403)
+
+    if None in [year, month, day]:
+        dateday = today_time()
+    else:
+        dateday = timezone.make_aware(timezone.datetime(year, month, day))
+
+    prior_days_form = PriorDaysForm(request.GET)
+    if not prior_days_form.is_valid():
+        return JsonResponse(
+            {"errors": prior_days_form.errors.get_json_data()}, status=400
+        )
+    prior_days = prior_days_form.cleaned_data["prior_days"]
+
+    roster = api.get_roster(enclosure)
+
+    def version() -> tuple:
+        changes, modified = api.changes(
+            enclosure,
+            {**roster, **api.count_querysets(enclosure, roster, dateday, prior_days)},
+        )
+        etag = api.etag("counts", enclosure.id, dateday.date(), prior_days, *changes)
+        return etag, modified
+
+    etag, modified = version()
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified(modified)
+    )
+    if response is not None:
+        # 304 (Not Modified) for GETs, 412 (Precondition Failed) for POSTs
+        return conditional_headers(response, etag, modified)
+
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Not JSON"}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Not a JSON object"}, status=400)
+
+        counts, errors = json_to_counts(data, enclosure, roster, request.user, dateday)
+        if errors:
+            return JsonResponse({"errors": errors}, status=422)
+
+        with transaction.atomic():
+            for model, model_counts in counts.items():
+                model.bulk_update_or_create(model_counts)
+            # species counts don't feed the home page summary
+            if AnimalCount in counts or GroupCount in counts:
+                EnclosureDailySummary.refresh(enclosure, dateday)
+        LOGGER.info("Saved counts from the API")
+
+        etag, modified = version()
+
+    response = JsonResponse(api.counts_payload(enclosure, roster, dateday, prior_days))
+    return conditional_headers(response, etag, modified)
+
+
 @login_required
 def tally_date_handler(request: HttpRequest, enclosure_slug):
     """Called from tally page to change date tally"""
@@ -564,31 +925,41 @@ def animal_counts(request: HttpRequest, animal):
         .order_by("-datetimecounted", "-id")
     )
 
-    paginator = Paginator(animal_counts_query, 10)
-    page = request.GET.get("page", 1)
-    animal_counts_records = paginator.get_page(page)
-    page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
+    paginator = KeysetPaginator(animal_counts_query, 10)
+    animal_counts_records = paginator.get_page(request.GET.get("cursor"))
 
-    # db counts each condition type
-    query_data = (
-        animal_counts_query.values("condition")
-        .order_by("condition")
-        .annotate(num=Count("condition"))
-    )
+    # the conditions (of counts in the range, if given)
+    range_form = ChartRangeForm(request.GET)
+    range_counts = animal_counts_query
+    if range_form.is_valid():
+        if range_form.cleaned_data["start_date"]:
+            range_counts = range_counts.filter(
+                datecounted__gte=range_form.cleaned_data["start_date"]
+            )
+        if range_form.cleaned_data["end_date"]:
+            range_counts = range_counts.filter(
+                datecounted__lte=range_form.cleaned_data["end_date"]
+            )
 
     # generating the data and labels
-    cond_slugs = [count["condition"] for count in query_data]
-    chart_data = []
-    for cond_slug, _ in AnimalCount.CONDITIONS:
-        if cond_slug in cond_slugs:
-            chart_data.append(query_data.get(condition=cond_slug)["num"])
-        else:
-            chart_data.append(0)
+    cond_nums = charts.histogram(range_counts, "condition")
+    chart_data = [
+        cond_nums.get(cond_slug, 0) for cond_slug, _ in AnimalCount.CONDITIONS
+    ]
     # gets the full name of the condition (from second item in tuple)
     chart_labels = [c[1] for c in AnimalCount.CONDITIONS]
 
+    # and the conditions in each month of the last year
+    months = charts.month_starts(charts.CHART_MONTHS, today_time().date())
+    month_conds = charts.histogram_by_period(
+        animal_counts_query, "condition", "month", since=months[0]
+    )
+    chart_labels_month = [m.strftime("%b %Y") for m in months]
+    chart_data_month = [
+        (cond_name, [month_conds.get(m, {}).get(cond_slug, 0) for m in months])
+        for cond_slug, cond_name in AnimalCount.CONDITIONS
+    ]
+
     return render(
         request,
         "animal_counts.html",
@@ -598,7 +969,9 @@ def animal_counts(request: HttpRequest, animal):
             "animal_counts": animal_counts_records,
             "chart_data": chart_data,
             "chart_labels": chart_labels,
-            "page_range": page_range,
+            "chart_data_month": chart_data_month,
+            "chart_labels_month": chart_labels_month,
+            "range_form": range_form,
         },
     )
 
@@ -619,32 +992,18 @@ def group_counts(request: HttpRequest, group):
         .order_by("-datetimecounted", "-id")
     )
 
-    paginator = Paginator(group_counts_query, 10)
-    page = request.GET.get("page", 1)
-    group_counts_records = paginator.get_page(page)
-    page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
-
-    chart_labels_line = [
-        d.strftime("%m-%d-%Y")
-        for d in list(group_counts_query.values_list("datecounted", flat=True)[:100])
-    ]
-    chart_data_line_total = list(
-        group_counts_query.values_list("count_total", flat=True)[:100]
-    )
+    paginator = KeysetPaginator(group_counts_query, 10)
+    group_counts_records = paginator.get_page(request.GET.get("cursor"))
 
-    chart_data_line_seen = list(
-        group_counts_query.values_list("count_seen", flat=True)[:100]
-    )
-    chart_data_line_bar = list(
-        group_counts_query.values_list("count_bar", flat=True)[:100]
+    series = charts.line_series(
+        group_counts_query, ["datecounted", "count_total", "count_seen", "count_bar"]
     )
+    chart_labels_line = [d.strftime("%m-%d-%Y") for d in series["datecounted"]]
 
     # for the pie chart (last 100)
-    sum_counts = chart_data_line_seen
-    chart_labels_pie = sorted(set(sum_counts))
-    chart_data_pie = [sum_counts.count(s) for s in chart_labels_pie]
+    seen_totals = charts.histogram(
+        group_counts_query, "count_seen", limit=charts.CHART_LIMIT
+    )
 
     return render(
         request,
@@ -653,13 +1012,12 @@ def group_counts(request: HttpRequest, group):
             "group": group,
             "enclosure": enclosure,
             "counts": group_counts_records,
-            "chart_data_line_total": chart_data_line_total,
-            "chart_data_line_seen": chart_data_line_seen,
-            "chart_data_line_bar": chart_data_line_bar,
+            "chart_data_line_total": series["count_total"],
+            "chart_data_line_seen": series["count_seen"],
+            "chart_data_line_bar": series["count_bar"],
             "chart_labels_line": chart_labels_line,
-            "chart_data_pie": chart_data_pie,
-            "chart_labels_pie": chart_labels_pie,
-            "page_range": page_range,
+            "chart_data_pie": list(seen_totals.values()),
+            "chart_labels_pie": list(seen_totals),
         },
     )
 
@@ -678,29 +1036,17 @@ def species_counts(request: HttpRequest, species_slug, enclosure_slug):
         .order_by("-datetimecounted", "-id")
     )
 
-    paginator = Paginator(counts_query, 10)
-    page = request.GET.get("page", 1)
-    counts_records = paginator.get_page(page)
-    page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
+    paginator = KeysetPaginator(counts_query, 10)
+    counts_records = paginator.get_page(request.GET.get("cursor"))
 
+    # last 100, oldest first
+    series = charts.line_series(counts_query, ["datecounted", "count"])
     chart_labels_line = [
-        d.strftime("%m-%d-%Y")
-        for d in list(
-            counts_query.values_list("datecounted", flat=True).order_by(
-                "datetimecounted"
-            )[:100]
-        )
+        d.strftime("%m-%d-%Y") for d in reversed(series["datecounted"])
     ]
-    chart_data_line_total = list(
-        counts_query.values_list("count", flat=True).order_by("datetimecounted")[:100]
-    )
 
     # for the pie chart (last 100)
-    sum_counts = list(counts_query.values_list("count", flat=True)[:100])
-    chart_labels_pie = sorted(set(sum_counts))
-    chart_data_pie = [sum_counts.count(s) for s in chart_labels_pie]
+    totals = charts.histogram(counts_query, "count", limit=charts.CHART_LIMIT)
 
     return render(
         request,
@@ -709,11 +1055,10 @@ def species_counts(request: HttpRequest, species_slug, enclosure_slug):
             "obj": obj,
             "enclosure": enclosure,
             "counts": counts_records,
-            "chart_data_line_total": chart_data_line_total,
+            "chart_data_line_total": series["count"][::-1],
             "chart_labels_line": chart_labels_line,
-            "chart_data_pie": chart_data_pie,
-            "chart_labels_pie": chart_labels_pie,
-            "page_range": page_range,
+            "chart_data_pie": list(totals.values()),
+            "chart_labels_pie": list(totals),
         },
     )
 
@@ -787,16 +1132,18 @@ def ingest_form(request: HttpRequest):
                 LOGGER.exception("Error processing uploaded data")
                 return redirect("ingest_form")
 
-            request.session["changesets"] = changesets
-            request.session["upload_file"] = str(request.FILES["file"])
+            # only the id goes in the session, the changesets can be large
+            pending_upload = PendingUpload.create_from_changesets(
+                changesets, request.user, str(request.FILES["file"])
+            )
+            request.session["pending_upload"] = pending_upload.id
 
             # redirect to a confirmation page
             return redirect("confirm_upload")
 
     else:
         form = UploadFileForm()
-        request.session.pop("changesets", None)
-        request.session.pop("upload_file", None)
+        request.session.pop("pending_upload", None)
 
     return render(
         request, "upload_form.html", {"form": form, "req_cols": TRACKS_REQ_COLS}
@@ -806,44 +1153,38 @@ def ingest_form(request: HttpRequest):
 @user_passes_test(lambda u: u.is_staff, redirect_field_name=None)
 def confirm_upload(request: HttpRequest):
     """after ingest form submit, show confirmation page before writing to db"""
-    changesets = request.session.get("changesets")
-    upload_file = request.session.get("upload_file")
+    pending_upload = (
+        PendingUpload.unexpired()
+        .filter(id=request.session.get("pending_upload"), user=request.user)
+        .first()
+    )
 
-    if upload_file is None or changesets is None:
+    if pending_upload is None:
         return redirect("ingest_form")
+    changesets = pending_upload.changesets
 
     # TODO: create a form w/ checkboxes for each change
     if request.method == "POST":
         # user clicked submit button on confirm_upload
 
-        # call functions in ingest.py to save the changes
-        try:
-            ingest_changesets(changesets)
-        except Exception as e:
-            messages.error(request, e)
-            LOGGER.error("error during data upload")
-            return redirect("ingest_form")
-
-        # clearing the changesets
-        request.session.pop("changesets", None)
-        request.session.pop("upload_file", None)
+        # the changes are saved by a worker (see jobs.run_upload)
+        job = Job.enqueue(request.user, Job.UPLOAD, pending_upload=pending_upload.id)
+        request.session.pop("pending_upload", None)
+        LOGGER.info("Queued upload")
 
-        messages.success(request, "Saved")
-        LOGGER.info("Uploaded data")
-
-        return redirect("home")
+        return redirect("job", job_id=job.id)
 
     return render(
         request,
         "confirm_upload.html",
-        {"changesets": changesets, "upload_file": upload_file},
+        {"changesets": changesets, "upload_file": pending_upload.upload_file},
     )
 
 
 @login_required
 def export(request: HttpRequest):
-    """export counts to excel for user download w/ time range"""
-    accessible_enclosures = get_accessible_enclosures(request.user)
+    """export counts to excel, csv or parquet for user download w/ time range"""
+    accessible_enclosures = get_accessible_enclosures(request)
 
     if request.method == "POST":
         form = ExportForm(request.POST)
@@ -857,88 +1198,83 @@ def export(request: HttpRequest):
 
             start_date = form.cleaned_data["start_date"]
             end_date = form.cleaned_data["end_date"]
-
-            # TODO: abstract to a function that returns this for any model?
-            animal_counts = (
-                AnimalCount.objects.filter(
-                    enclosure__in=enclosures,
-                    datecounted__gte=start_date,
-                    datecounted__lte=end_date,
+            file_format = form.cleaned_data["file_format"]
+
+            # big exports are written by a worker (see jobs.run_export)
+            enclosure_days = len(enclosures) * ((end_date - start_date).days + 1)
+            if enclosure_days > settings.EXPORT_SYNC_MAX_DAYS:
+                job = Job.enqueue(
+                    request.user,
+                    Job.EXPORT,
+                    enclosures=[enc.id for enc in enclosures],
+                    start_date=start_date.isoformat(),
+                    end_date=end_date.isoformat(),
+                    file_format=file_format,
                 )
-                .order_by("datecounted", "animal_id", "datetimecounted")
-                .distinct("datecounted", "animal_id")
-            )
-            group_counts = (
-                GroupCount.objects.filter(
-                    enclosure__in=enclosures,
-                    datecounted__gte=start_date,
-                    datecounted__lte=end_date,
-                )
-                .order_by("datecounted", "group_id", "datetimecounted")
-                .distinct("datecounted", "group_id")
-            )
-            species_counts = (
-                SpeciesCount.objects.filter(
-                    enclosure__in=enclosures,
-                    datecounted__gte=start_date,
-                    datecounted__lte=end_date,
-                )
-                .order_by("datecounted", "species_id", "datetimecounted")
-                .distinct("datecounted", "species_id")
-            )
+                LOGGER.info("Queued export")
 
-            # convert to pandas dataframe
-            animal_counts_df = qs_to_df(animal_counts, AnimalCount._meta.fields)
-            group_counts_df = qs_to_df(group_counts, GroupCount._meta.fields)
-            species_counts_df = qs_to_df(species_counts, SpeciesCount._meta.fields)
+                return redirect("job", job_id=job.id)
 
-            # merge the dfs together
-            df_merge = pd.concat(
-                [animal_counts_df, group_counts_df, species_counts_df],
-                ignore_index=True,
-                sort=False,
+            columns, rows = export_rows(
+                export_queryset(enclosures, start_date, end_date)
             )
-
-            if df_merge.empty:
+            if columns is None:
                 form.add_error(None, "No data in range")
-                extra = {
-                    "enclosures": list(enclosures.values("id", "name")),
-                    "start_date": start_date.strftime("%m/%d/%Y"),
-                    "end_date": end_date.strftime("%m/%d/%Y"),
-                }
-                LOGGER.error("no data to export for enclosures", extra=extra)
+                log_no_data(enclosures, start_date, end_date)
                 return render(request, "export.html", {"form": form})
 
-            df_merge_clean = clean_df(df_merge)
-
-            # create response object to save the data into
-            response = HttpResponse(
-                content_type=(
-                    "application/vnd.openxmlformats-officedocument."
-                    "spreadsheetml.sheet"
+            filename = export_filename(enclosures, start_date, end_date, file_format)
+            if file_format == "csv":
+                # the rows are sent as they're read from the db
+                response = StreamingHttpResponse(
+                    csv_lines(columns, rows), content_type=CSV_CONTENT_TYPE
                 )
+                response["Content-Disposition"] = content_disposition_header(
+                    True, filename
+                )
+                return response
+
+            # the rows are written to a temp file as they're read from the db
+            write, content_type = EXPORT_WRITERS[file_format]
+            # closed (and so deleted) by the response once it's sent
+            f = tempfile.TemporaryFile()  # noqa: SIM115
+            write(columns, rows, f)
+            f.seek(0)
+            return FileResponse(
+                f, as_attachment=True, filename=filename, content_type=content_type
             )
 
-            enclosure_names = "_".join(enc.slug for enc in enclosures)
-            start_date_str = start_date.strftime("%Y%m%d")
-            end_date_str = end_date.strftime("%Y%m%d")
-            response["Content-Disposition"] = (
-                "attachment; "
-                'filename="zootable_export_'
-                f'{enclosure_names}_{start_date_str}_{end_date_str}.xlsx"'
-            )
-
-            # create xlsx object and put it into the response using pandas
-            with pd.ExcelWriter(response) as writer:
-                df_merge_clean.to_excel(writer, sheet_name="Sheet1", index=False)
-
-            # TODO: redirect to home w/ javascript serve xlsx file from that page
-            # send it to the user
-            return response
-
     else:
         form = ExportForm()
         # initialize the selected enclosures queryset to only ones accessible
         form.fields["selected_enclosures"].queryset = accessible_enclosures
 
     return render(request, "export.html", {"form": form})
+
+
+@login_required
+def job(request: HttpRequest, job_id):
+    """status of a queued export/upload, w/ a link to download the export"""
+    job = get_object_or_404(Job, id=job_id, user=request.user)
+
+    return render(request, "job.html", {"job": job})
+
+
+@login_required
+def job_download(request: HttpRequest, job_id):
+    job = get_object_or_404(
+        Job.objects.exclude(result=""), id=job_id, user=request.user, status=Job.DONE
+    )
+
+    # streamed from the file, a chunk at a time
+    try:
+        f = job.result.open("rb")
+    except FileNotFoundError:
+        raise Http404("Export file not found") from None
+
+    return FileResponse(
+        f,
+        as_attachment=True,
+        filename=job.filename,
+        content_type=job.content_type,
+    )